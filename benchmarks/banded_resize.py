@@ -0,0 +1,139 @@
+import argparse
+import json
+import os
+import random
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from resize_decode import peak_rss_kb
+
+TIFF_SHORT = 3
+TIFF_LONG = 4
+
+
+def write_tiff(path, width, height, rows_per_strip=16, tile=None, seed=0):
+    # Streams an uncompressed RGB TIFF to disk, so sources far larger than memory can be generated.
+    base = random.Random(seed).randbytes(width * 3)
+
+    def row(y):
+        shift = (y * 21) % len(base)
+        return base[shift:] + base[:shift]
+
+    offsets = []
+    lengths = []
+    with open(path, 'wb') as f:
+        f.write(b'II*\0' + struct.pack('<I', 0))
+        if tile is None:
+            for top in range(0, height, rows_per_strip):
+                offsets.append(f.tell())
+                data = b''.join(row(y) for y in range(top, min(height, top + rows_per_strip)))
+                f.write(data)
+                lengths.append(len(data))
+        else:
+            tile_width, tile_height = tile
+            for top in range(0, height, tile_height):
+                rows = [row(y) if y < height else b'' for y in range(top, top + tile_height)]
+                for left in range(0, width, tile_width):
+                    offsets.append(f.tell())
+                    data = b''.join(r[left * 3:(left + tile_width) * 3].ljust(tile_width * 3, b'\0') for r in rows)
+                    f.write(data)
+                    lengths.append(len(data))
+
+        bits_offset = f.tell()
+        f.write(struct.pack('<3H', 8, 8, 8))
+        offsets_offset = f.tell()
+        f.write(struct.pack(f'<{len(offsets)}I', *offsets))
+        lengths_offset = f.tell()
+        f.write(struct.pack(f'<{len(lengths)}I', *lengths))
+
+        entries = [(256, TIFF_LONG, 1, width), (257, TIFF_LONG, 1, height), (258, TIFF_SHORT, 3, bits_offset),
+                   (259, TIFF_SHORT, 1, 1), (262, TIFF_SHORT, 1, 2), (277, TIFF_SHORT, 1, 3), (284, TIFF_SHORT, 1, 1)]
+        if tile is None:
+            entries += [(273, TIFF_LONG, len(offsets), offsets_offset), (278, TIFF_LONG, 1, rows_per_strip),
+                        (279, TIFF_LONG, len(lengths), lengths_offset)]
+        else:
+            entries += [(322, TIFF_LONG, 1, tile[0]), (323, TIFF_LONG, 1, tile[1]),
+                        (324, TIFF_LONG, len(offsets), offsets_offset), (325, TIFF_LONG, len(lengths), lengths_offset)]
+        if len(offsets) == 1:
+            # A single value is stored in the entry itself rather than at an offset.
+            entries = [(tag, kind, count, offsets[0] if tag in (273, 324) else lengths[0] if tag in (279, 325) else value)
+                       for tag, kind, count, value in entries]
+        entries.sort()
+        ifd_offset = f.tell()
+        f.write(struct.pack('<H', len(entries)))
+        for tag, kind, count, value in entries:
+            packed = struct.pack('<H', value) + b'\0\0' if kind == TIFF_SHORT and count == 1 else struct.pack('<I', value)
+            f.write(struct.pack('<HHI', tag, kind, count) + packed)
+        f.write(struct.pack('<I', 0))
+        f.seek(4)
+        f.write(struct.pack('<I', ifd_offset))
+
+
+def run_worker(path, banded, resize, output_folder):
+    from PIL import Image
+
+    import processing
+    from engine import build_options
+
+    if not banded:
+        # The whole-image path, with Pillow's decompression-bomb guard out of the way.
+        processing.BANDED_MIN_PIXELS = float('inf')
+        Image.MAX_IMAGE_PIXELS = None
+    options = build_options(os.path.dirname(path), enable_resize=True, resize_percentage=resize, incremental=False)
+    start = time.perf_counter()
+    result = processing.process_image(path, output_folder, options)
+    elapsed = time.perf_counter() - start
+    print(json.dumps({'seconds': elapsed, 'peak_rss_mb': peak_rss_kb() / 1024, 'status': result['status'],
+                      'message': result['message']}))
+
+
+def measure(path, banded, resize, output_folder):
+    command = [sys.executable, __file__, '--worker', path, '1' if banded else '0', str(resize), output_folder]
+    process = subprocess.run(command, capture_output=True, text=True)
+    if process.returncode != 0:
+        return {'error': (process.stderr.strip().splitlines() or [f"exit code {process.returncode}"])[-1]}
+    return json.loads(process.stdout)
+
+
+def main(argv=None):
+    if argv is None and len(sys.argv) > 1 and sys.argv[1] == '--worker':
+        _, _, path, banded, resize, output_folder = sys.argv
+        run_worker(path, banded == '1', float(resize), output_folder)
+        return
+
+    parser = argparse.ArgumentParser(description="Compare whole-image and banded downscaling of a large uncompressed TIFF.")
+    parser.add_argument('--width', type=int, default=16000)
+    parser.add_argument('--height', type=int, default=12000)
+    parser.add_argument('--resize', type=float, default=90.0, help="Resize percentage (how much smaller the output is).")
+    parser.add_argument('--tile', type=int, default=0, help="Write a tiled TIFF with this tile size instead of strips.")
+    parser.add_argument('--skip-whole', action='store_true', help="Only run the banded path (for sources larger than RAM).")
+    args = parser.parse_args(argv)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as work_dir:
+        source = os.path.join(work_dir, 'source', 'large.tif')
+        os.makedirs(os.path.dirname(source))
+        start = time.perf_counter()
+        write_tiff(source, args.width, args.height, tile=(args.tile, args.tile) if args.tile else None)
+        print(f"wrote {args.width}x{args.height} ({os.path.getsize(source) / 1024 ** 2:.0f} MB)"
+              f" in {time.perf_counter() - start:.1f} s", file=sys.stderr)
+        modes = (('banded', True),) if args.skip_whole else (('whole', False), ('banded', True))
+        for label, banded in modes:
+            row = measure(source, banded, args.resize, os.path.join(work_dir, label))
+            results[label] = row
+            if 'error' in row:
+                print(f"{label:<7} failed: {row['error']}", file=sys.stderr)
+            else:
+                print(f"{label:<7} {row['seconds']:.2f} s, peak RSS {row['peak_rss_mb']:.0f} MB ({row['status']})", file=sys.stderr)
+
+    print(json.dumps({'width': args.width, 'height': args.height, 'tile': args.tile, 'resize': args.resize, 'results': results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from video import AUDIO_ENCODER_ARGS, VIDEO_ENCODER_ARGS, encode_chunked, probe_duration
+
+
+def generate_test_video(path, duration, size, rate):
+    command = [
+        'ffmpeg', '-v', 'error',
+        '-f', 'lavfi', '-i', f"testsrc2=size={size}:rate={rate}:duration={duration}",
+        '-f', 'lavfi', '-i', f"sine=frequency=440:duration={duration}",
+        '-c:v', 'libx264', '-preset', 'ultrafast', '-crf', '18', '-g', str(rate * 2),
+        '-c:a', 'aac', '-shortest', '-y', path,
+    ]
+    subprocess.run(command, check=True)
+
+
+def encode_single(source, output, threads):
+    command = ['ffmpeg', '-v', 'error', '-threads', str(threads), '-i', source, *VIDEO_ENCODER_ARGS,
+               '-threads', str(threads), *AUDIO_ENCODER_ARGS, '-f', 'mp4', '-y', output]
+    return subprocess.run(command, capture_output=True, text=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Wall-clock speedup of chunked video encoding versus segment count.")
+    parser.add_argument('--duration', type=int, default=120, help="Length of the generated test video in seconds.")
+    parser.add_argument('--size', default='1280x720', help="Frame size of the generated test video.")
+    parser.add_argument('--rate', type=int, default=30, help="Frame rate of the generated test video.")
+    parser.add_argument('--threads', type=int, default=os.cpu_count(), help="Thread budget for every encode.")
+    parser.add_argument('--segments', type=int, nargs='+', default=[2, 4, 8], help="Segment counts to measure.")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        source = os.path.join(work_dir, 'source.mkv')
+        generate_test_video(source, args.duration, args.size, args.rate)
+        duration = probe_duration(source) or args.duration
+
+        results = []
+        start = time.perf_counter()
+        process = encode_single(source, os.path.join(work_dir, 'single.mp4'), args.threads)
+        baseline = time.perf_counter() - start
+        if process.returncode != 0:
+            sys.exit(f"Single encode failed:\n{process.stderr}")
+        results.append({'segments': 1, 'seconds': baseline, 'speedup': 1.0,
+                        'output_size': os.path.getsize(os.path.join(work_dir, 'single.mp4'))})
+
+        for segments in args.segments:
+            output = os.path.join(work_dir, f"chunked_{segments}.mp4")
+            start = time.perf_counter()
+            process = encode_chunked(source, output, {}, duration, threads=args.threads, segments=segments)
+            elapsed = time.perf_counter() - start
+            if process.returncode != 0:
+                sys.exit(f"Chunked encode with {segments} segments failed:\n{process.stderr}")
+            results.append({'segments': segments, 'seconds': elapsed, 'speedup': baseline / elapsed,
+                            'output_size': os.path.getsize(output)})
+
+    for row in results:
+        print(f"segments={row['segments']:>3}  {row['seconds']:8.2f} s  speedup x{row['speedup']:.2f}  size {row['output_size']} B",
+              file=sys.stderr)
+    print(json.dumps({'duration': duration, 'threads': args.threads, 'results': results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+
+from PIL import Image, ImageDraw, ImageFilter
+
+# (count, (width, height)) of each image kind per corpus scale.
+CORPUS_SCALES = {
+    'tiny': {'photo': (4, (640, 480)), 'screenshot': (4, (800, 600)), 'palette': (4, (256, 256)),
+             'alpha': (2, (512, 512)), 'gray': (2, (640, 480)), 'thumbnail': (16, (96, 96)), 'video': (1, 2)},
+    'small': {'photo': (12, (2000, 1500)), 'screenshot': (8, (1920, 1080)), 'palette': (8, (640, 480)),
+              'alpha': (4, (1024, 1024)), 'gray': (4, (1600, 1200)), 'thumbnail': (64, (128, 128)), 'video': (2, 5)},
+    'large': {'photo': (24, (6000, 4000)), 'screenshot': (16, (2560, 1440)), 'palette': (16, (1280, 960)),
+              'alpha': (8, (2048, 2048)), 'gray': (8, (4000, 3000)), 'thumbnail': (256, (160, 160)), 'video': (4, 20)},
+}
+
+VIDEO_SOURCES = ('testsrc2', 'smptebars', 'mandelbrot')
+
+
+def _noise(rng, size, scale=4):
+    width, height = max(1, size[0] // scale), max(1, size[1] // scale)
+    return Image.frombytes('L', (width, height), rng.randbytes(width * height)).resize(size, Image.Resampling.BICUBIC)
+
+
+def make_photo(rng, size):
+    red = _noise(rng, size)
+    green = Image.linear_gradient('L').rotate(rng.randrange(360)).resize(size)
+    blue = red.filter(ImageFilter.GaussianBlur(rng.uniform(1, 4)))
+    return Image.merge('RGB', (red, green, blue))
+
+
+def make_screenshot(rng, size):
+    img = Image.new('RGB', size, (rng.randrange(200, 256),) * 3)
+    draw = ImageDraw.Draw(img)
+    for _ in range(40):
+        x, y = rng.randrange(size[0]), rng.randrange(size[1])
+        color = tuple(rng.randrange(256) for _ in range(3))
+        draw.rectangle((x, y, x + rng.randrange(20, size[0] // 3), y + rng.randrange(10, size[1] // 6)), fill=color)
+    for row in range(0, size[1], 18):
+        draw.text((10, row), "".join(rng.choice("abcdefghij klmnop") for _ in range(size[0] // 8)), fill=(20, 20, 20))
+    return img
+
+
+def make_palette(rng, size):
+    return make_screenshot(rng, size).quantize(colors=rng.choice((16, 64, 256)))
+
+
+def make_alpha(rng, size):
+    img = make_screenshot(rng, size).convert('RGBA')
+    img.putalpha(Image.radial_gradient('L').resize(size))
+    return img
+
+
+def make_gray(rng, size):
+    return make_photo(rng, size).convert('L')
+
+
+IMAGE_KINDS = {
+    'photo': (make_photo, '.jpg', {'quality': 92}),
+    'screenshot': (make_screenshot, '.png', {}),
+    'palette': (make_palette, '.png', {}),
+    'alpha': (make_alpha, '.png', {}),
+    'gray': (make_gray, '.jpg', {'quality': 90}),
+    'thumbnail': (make_photo, '.jpg', {'quality': 85}),
+}
+
+
+def make_video(path, source, duration, seed):
+    size = '640x360' if seed % 2 else '1280x720'
+    command = [
+        'ffmpeg', '-v', 'error', '-f', 'lavfi', '-i', f"{source}=size={size}:rate=25:duration={duration}",
+        '-f', 'lavfi', '-i', f"sine=frequency={220 + seed * 110}:duration={duration}",
+        '-c:v', 'mpeg4', '-q:v', '3', '-c:a', 'pcm_s16le', '-shortest', '-y', path,
+    ]
+    subprocess.run(command, check=True)
+
+
+def generate_corpus(folder, scale='small', seed=0, videos=True):
+    # Same scale and seed always produce the same files, so runs on different commits are comparable.
+    spec = CORPUS_SCALES[scale]
+    rng = random.Random(seed)
+    files = []
+    for kind, (make, ext, save_options) in IMAGE_KINDS.items():
+        count, size = spec[kind]
+        kind_folder = os.path.join(folder, kind)
+        os.makedirs(kind_folder, exist_ok=True)
+        for index in range(count):
+            path = os.path.join(kind_folder, f"{kind}_{index:04d}{ext}")
+            make(rng, size).save(path, **save_options)
+            files.append(path)
+
+    count, duration = spec['video']
+    if videos and count and shutil.which('ffmpeg'):
+        video_folder = os.path.join(folder, 'video')
+        os.makedirs(video_folder, exist_ok=True)
+        for index in range(count):
+            path = os.path.join(video_folder, f"video_{index:04d}.mkv")
+            make_video(path, VIDEO_SOURCES[index % len(VIDEO_SOURCES)], duration, index)
+            files.append(path)
+    elif videos and count:
+        print("ffmpeg not found, generating a corpus without videos.", file=sys.stderr)
+    return files
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a deterministic benchmark corpus of images and videos.")
+    parser.add_argument('folder', help="Folder to write the corpus to.")
+    parser.add_argument('--scale', choices=list(CORPUS_SCALES), default='small')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-videos', action='store_true', help="Only generate images.")
+    args = parser.parse_args(argv)
+
+    files = generate_corpus(args.folder, args.scale, args.seed, videos=not args.no_videos)
+    total_size = sum(os.path.getsize(path) for path in files)
+    print(json.dumps({'folder': args.folder, 'scale': args.scale, 'seed': args.seed, 'files': len(files), 'bytes': total_size}))
+
+
+if __name__ == "__main__":
+    main()
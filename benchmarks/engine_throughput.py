@@ -0,0 +1,146 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from corpus import CORPUS_SCALES, generate_corpus
+from resize_decode import peak_rss_kb
+
+from engine import BatchStats, FileScanner, build_options, process_files
+from scheduler import IMAGE_LANE, VIDEO_LANE
+from processing import VIDEO_EXTS
+
+# Drop in files/s, relative to the baseline, reported as a regression by --baseline.
+REGRESSION_THRESHOLD = 0.10
+
+
+def children_peak_rss_kb():
+    try:
+        import resource
+    except ImportError:
+        return 0
+    return resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+
+
+def run_worker(corpus, workers, options):
+    with tempfile.TemporaryDirectory() as output_folder:
+        options = build_options(corpus, incremental=False, **options)
+        start = time.perf_counter()
+        files = list(FileScanner(corpus, output_folder))
+        scan_seconds = time.perf_counter() - start
+
+        stats = BatchStats(total_files=len(files))
+        stage_seconds = {IMAGE_LANE: 0.0, VIDEO_LANE: 0.0}
+        stats.start()
+        for result in process_files(files, output_folder, options, max_workers=workers):
+            stats.add(result)
+            lane = VIDEO_LANE if os.path.splitext(result['file_path'])[1].lower() in VIDEO_EXTS else IMAGE_LANE
+            stage_seconds[lane] += result.get('processing_time', 0.0)
+        stats.finish()
+
+    elapsed = stats.elapsed + scan_seconds
+    megabytes = stats.total_original_size / (1024 * 1024)
+    print(json.dumps({
+        'workers': workers,
+        'files': stats.files_processed,
+        'seconds': elapsed,
+        'files_per_s': stats.files_processed / elapsed,
+        'mb_per_s': megabytes / elapsed,
+        'original_size': stats.total_original_size,
+        'compressed_size': stats.total_compressed_size,
+        'ratio': stats.total_compressed_size / stats.total_original_size if stats.total_original_size else None,
+        'status_counts': stats.status_counts,
+        'stage_seconds': {'scan': scan_seconds, 'images': stage_seconds[IMAGE_LANE], 'videos': stage_seconds[VIDEO_LANE],
+                          **{stage: hist.total for stage, hist in stats.stage_times.items()}},
+        'bytes_read': stats.bytes_read,
+        'bytes_written': stats.bytes_written,
+        'peak_rss_mb': peak_rss_kb() / 1024,
+        'peak_worker_rss_mb': children_peak_rss_kb() / 1024,
+    }))
+
+
+def measure(corpus, workers, options):
+    command = [sys.executable, __file__, '--worker', corpus, str(workers), json.dumps(options)]
+    process = subprocess.run(command, capture_output=True, text=True, check=True)
+    return json.loads(process.stdout.strip().splitlines()[-1])
+
+
+def compare(report, baseline):
+    regressions = []
+    previous = {row['workers']: row for row in baseline['results']}
+    for row in report['results']:
+        old = previous.get(row['workers'])
+        if old is None:
+            continue
+        change = row['files_per_s'] / old['files_per_s'] - 1
+        print(f"workers={row['workers']:<3} files/s {old['files_per_s']:.2f} -> {row['files_per_s']:.2f} ({change * 100:+.1f}%)"
+              f"  ratio {old['ratio']} -> {row['ratio']}", file=sys.stderr)
+        if change < -REGRESSION_THRESHOLD:
+            regressions.append(row['workers'])
+    return regressions
+
+
+def main(argv=None):
+    if argv is None and len(sys.argv) > 1 and sys.argv[1] == '--worker':
+        _, _, corpus, workers, options = sys.argv
+        run_worker(corpus, int(workers), json.loads(options))
+        return 0
+
+    parser = argparse.ArgumentParser(description="Measure engine throughput on a deterministic corpus at several worker counts.")
+    parser.add_argument('--corpus', help="Existing corpus folder (default: generate one in a temporary folder).")
+    parser.add_argument('--scale', choices=list(CORPUS_SCALES), default='small', help="Size of the generated corpus.")
+    parser.add_argument('--seed', type=int, default=0, help="Seed of the generated corpus.")
+    parser.add_argument('--no-videos', action='store_true', help="Generate a corpus without videos.")
+    parser.add_argument('--workers', type=int, nargs='+', default=sorted({1, max(1, (os.cpu_count() or 1) // 2), os.cpu_count() or 1}),
+                        help="Worker counts (CPU budgets) to measure.")
+    parser.add_argument('--repeat', type=int, default=1, help="Runs per worker count; the fastest is reported.")
+    parser.add_argument('--options', default='{}', help="JSON object of engine options to use for every run.")
+    parser.add_argument('--output', help="Write the JSON report to this file as well as stdout.")
+    parser.add_argument('--baseline', help="Earlier JSON report to compare against; exits with 1 on a throughput regression.")
+    args = parser.parse_args(argv)
+    options = json.loads(args.options)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        corpus = args.corpus
+        if corpus is None:
+            corpus = os.path.join(work_dir, 'corpus')
+            generate_corpus(corpus, args.scale, args.seed, videos=not args.no_videos)
+
+        results = []
+        for workers in args.workers:
+            runs = [measure(corpus, workers, options) for _ in range(args.repeat)]
+            row = max(runs, key=lambda run: run['files_per_s'])
+            results.append(row)
+            print(f"workers={workers:<3} {row['files']} files in {row['seconds']:.2f} s  {row['files_per_s']:.2f} files/s"
+                  f"  {row['mb_per_s']:.2f} MB/s  ratio {row['ratio']}  peak RSS {row['peak_rss_mb']:.0f} MB"
+                  f" (workers {row['peak_worker_rss_mb']:.0f} MB)", file=sys.stderr)
+
+    report = {
+        'corpus': args.corpus or {'scale': args.scale, 'seed': args.seed, 'videos': not args.no_videos},
+        'options': options,
+        'python': sys.version.split()[0],
+        'cpu_count': os.cpu_count(),
+        'results': results,
+    }
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(report, json.load(f))
+        if regressions:
+            print(f"Throughput regression of more than {REGRESSION_THRESHOLD * 100:.0f}% at workers={regressions}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
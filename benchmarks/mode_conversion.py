@@ -0,0 +1,94 @@
+import argparse
+import io
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from corpus import make_alpha, make_photo, make_screenshot
+from processing import WEBP_LOSSY_FALLBACK_QUALITY, prepare_for_webp
+
+
+def legacy_convert(img):
+    # The conversion process_image used before mode-preserving conversion.
+    if img.mode in ('RGB', 'P', 'L', 'LA'):
+        return img.convert('RGBA')
+    return img
+
+
+def make_inputs(rng, size):
+    photo = make_photo(rng, size)
+    screenshot = make_screenshot(rng, size)
+    gray16 = photo.convert('L').convert('I').point(lambda value: value * 257).convert('I;16')
+    return {
+        'photo_rgb': photo,
+        'screenshot_rgb': screenshot,
+        'palette': screenshot.quantize(colors=64),
+        'gray': photo.convert('L'),
+        'rgba_opaque': photo.convert('RGBA'),
+        'rgba_alpha': make_alpha(rng, size),
+        'cmyk': photo.convert('CMYK'),
+        'gray16': gray16,
+    }
+
+
+def encode(img, **save_options):
+    buffer = io.BytesIO()
+    start = time.perf_counter()
+    img.save(buffer, format='WEBP', **save_options)
+    return buffer.tell(), time.perf_counter() - start
+
+
+def measure(img, convert, repeat):
+    row = {}
+    for label, save_options in (('lossless', {'quality': 100, 'lossless': True}), ('lossy', {'quality': WEBP_LOSSY_FALLBACK_QUALITY})):
+        runs = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            converted = convert(img)
+            convert_time = time.perf_counter() - start
+            size, encode_time = encode(converted, **save_options)
+            runs.append((convert_time + encode_time, size))
+        row[label] = {'seconds': min(seconds for seconds, _ in runs), 'size': runs[0][1]}
+    row['mode'] = convert(img).mode
+    return row
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare the old RGBA conversion with mode-preserving conversion before WEBP encoding.")
+    parser.add_argument('--width', type=int, default=1600)
+    parser.add_argument('--height', type=int, default=1200)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    results = []
+    for kind, img in make_inputs(random.Random(args.seed), (args.width, args.height)).items():
+        try:
+            legacy = measure(img, legacy_convert, args.repeat)
+        except (OSError, ValueError) as exc:
+            # The old path handed CMYK and 16-bit images to the encoder unconverted.
+            legacy = {'error': str(exc)}
+        preserved = measure(img, prepare_for_webp, args.repeat)
+        row = {'kind': kind, 'source_mode': img.mode, 'legacy': legacy, 'preserving': preserved}
+        results.append(row)
+
+        line = f"{kind:<15} {img.mode:<5}"
+        for label in ('lossless', 'lossy'):
+            new = preserved[label]
+            if label in legacy:
+                old = legacy[label]
+                line += (f"  {label} {old['size']:>9} -> {new['size']:>9} B"
+                         f" {old['seconds'] * 1000:7.1f} -> {new['seconds'] * 1000:7.1f} ms")
+            else:
+                line += f"  {label} legacy failed -> {new['size']:>9} B {new['seconds'] * 1000:7.1f} ms"
+        print(line, file=sys.stderr)
+
+    print(json.dumps({'width': args.width, 'height': args.height, 'results': results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
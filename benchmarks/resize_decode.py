@@ -0,0 +1,104 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageFilter
+
+from processing import resize_image
+
+
+def generate_photo(path, width, height):
+    noise = Image.effect_noise((width // 4, height // 4), 60).resize((width, height), Image.Resampling.BICUBIC)
+    gradient = Image.linear_gradient('L').resize((width, height))
+    img = Image.merge('RGB', (noise, gradient, noise.filter(ImageFilter.GaussianBlur(3))))
+    img.save(path, quality=92)
+
+
+def run_worker(path, scale, fast, output):
+    start = time.perf_counter()
+    with Image.open(path) as img:
+        size = (max(1, int(img.width * scale)), max(1, int(img.height * scale)))
+        resized = resize_image(img, size, fast=fast)
+        resized.save(output, format='PNG', compress_level=0)
+    elapsed = time.perf_counter() - start
+    print(json.dumps({'seconds': elapsed, 'peak_rss_mb': peak_rss_kb() / 1024}))
+
+
+def peak_rss_kb():
+    # ru_maxrss survives exec on Linux, so prefer the per-address-space high-water mark.
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return 0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def measure(path, scale, fast, output):
+    command = [sys.executable, __file__, '--worker', path, str(scale), '1' if fast else '0', output]
+    process = subprocess.run(command, capture_output=True, text=True, check=True)
+    return json.loads(process.stdout)
+
+
+def psnr(reference_path, candidate_path):
+    try:
+        import numpy as np
+    except ImportError:
+        return None
+    with Image.open(reference_path) as reference, Image.open(candidate_path) as candidate:
+        a = np.asarray(reference, dtype=np.float64)
+        b = np.asarray(candidate, dtype=np.float64)
+    mse = np.mean((a - b) ** 2)
+    return float('inf') if mse == 0 else float(10 * np.log10(255.0 ** 2 / mse))
+
+
+def main(argv=None):
+    if argv is None and len(sys.argv) > 1 and sys.argv[1] == '--worker':
+        _, _, path, scale, fast, output = sys.argv
+        run_worker(path, float(scale), fast == '1', output)
+        return
+
+    parser = argparse.ArgumentParser(description="Compare full decode + LANCZOS resize against draft/reduce downscaling.")
+    parser.add_argument('--width', type=int, default=6000)
+    parser.add_argument('--height', type=int, default=4000)
+    parser.add_argument('--scales', type=float, nargs='+', default=[0.85, 0.5, 0.25, 0.125])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        source = os.path.join(work_dir, 'source.jpg')
+        generate_photo(source, args.width, args.height)
+        for scale in args.scales:
+            row = {'scale': scale}
+            for label, fast in (('exact', False), ('fast', True)):
+                output = os.path.join(work_dir, f"{label}_{scale}.png")
+                runs = [measure(source, scale, fast, output) for _ in range(args.repeat)]
+                row[label] = {
+                    'seconds': min(run['seconds'] for run in runs),
+                    'peak_rss_mb': max(run['peak_rss_mb'] for run in runs),
+                }
+            row['speedup'] = row['exact']['seconds'] / row['fast']['seconds']
+            row['psnr_vs_exact'] = psnr(os.path.join(work_dir, f"exact_{scale}.png"), os.path.join(work_dir, f"fast_{scale}.png"))
+            results.append(row)
+            print(f"scale={scale:<6} exact {row['exact']['seconds']:.3f} s / {row['exact']['peak_rss_mb']:.0f} MB"
+                  f"  fast {row['fast']['seconds']:.3f} s / {row['fast']['peak_rss_mb']:.0f} MB"
+                  f"  speedup x{row['speedup']:.2f}  PSNR {row['psnr_vs_exact']}", file=sys.stderr)
+
+    print(json.dumps({'width': args.width, 'height': args.height, 'results': results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
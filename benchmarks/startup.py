@@ -0,0 +1,118 @@
+import argparse
+import concurrent.futures
+import json
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from corpus import make_screenshot
+
+from engine import build_options, process_files, warm_executor
+
+IMPORT_MODULES = ('main', 'gui', 'cli', 'engine', 'processing')
+HEAVY_MODULES = ('tkinter', 'PIL.Image', 'numpy', 'asyncio')
+IMPORT_PROBE = (
+    "import sys, time, json; start = time.perf_counter(); import {module}; "
+    "print(json.dumps({{'seconds': time.perf_counter() - start, "
+    "'heavy': [name for name in {heavy!r} if name in sys.modules]}}))"
+)
+
+
+def measure_import(module, repeat):
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        process = subprocess.run([sys.executable, '-c', IMPORT_PROBE.format(module=module, heavy=HEAVY_MODULES)],
+                                 cwd=ROOT, capture_output=True, text=True)
+        wall = time.perf_counter() - start
+        if process.returncode != 0:
+            return {'error': process.stderr.strip().splitlines()[-1]}
+        row = json.loads(process.stdout)
+        runs.append(dict(row, process_seconds=wall))
+    best = min(runs, key=lambda row: row['seconds'])
+    return {'import_seconds': best['seconds'], 'process_seconds': min(row['process_seconds'] for row in runs),
+            'heavy_modules': best['heavy']}
+
+
+def first_result_seconds(folder, options, executor):
+    start = time.perf_counter()
+    for _ in process_files([os.path.join(folder, 'first.png')], os.path.join(folder, 'out'), options, executor=executor):
+        return time.perf_counter() - start
+
+
+def measure_first_file(folder, workers, start_method):
+    # Latency from Start to the first result with a pool created for the run (the old behaviour),
+    # a pool warmed in advance, and the same pool reused for a second run.
+    options = build_options(folder, incremental=False, deduplicate=False)
+    context = multiprocessing.get_context(start_method)
+
+    start = time.perf_counter()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        cold = first_result_seconds(folder, options, executor)
+    cold_total = time.perf_counter() - start
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        warm_start = time.perf_counter()
+        warm_executor(executor, workers)
+        warm_up = time.perf_counter() - warm_start
+        warm = first_result_seconds(folder, options, executor)
+        reused = first_result_seconds(folder, options, executor)
+    return {'cold_pool': cold_total, 'cold_pool_first_result': cold, 'warm_up': warm_up,
+            'warm_pool': warm, 'reused_pool': reused}
+
+
+def measure_cli(folder, workers):
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, os.path.join(ROOT, 'cli.py'), folder, '--full', '-j', str(workers),
+                                '-o', os.path.join(folder, 'cli-out')], stdout=subprocess.PIPE, text=True)
+    first = None
+    for line in process.stdout:
+        if first is None and line.startswith('['):
+            first = time.perf_counter() - start
+    process.wait()
+    return {'first_result': first, 'total': time.perf_counter() - start}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure import times, cold start and first-file latency.")
+    parser.add_argument('--repeat', type=int, default=5, help="Runs per import measurement; the fastest is reported.")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--start-method', choices=multiprocessing.get_all_start_methods(),
+                        default=multiprocessing.get_start_method())
+    args = parser.parse_args(argv)
+
+    imports = {module: measure_import(module, args.repeat) for module in IMPORT_MODULES}
+    for module, row in imports.items():
+        if 'error' in row:
+            print(f"import {module:<11} failed: {row['error']}", file=sys.stderr)
+            continue
+        print(f"import {module:<11} {row['import_seconds'] * 1000:6.0f} ms (process {row['process_seconds'] * 1000:4.0f} ms)"
+              f"  loads {', '.join(row['heavy_modules']) or 'nothing heavy'}", file=sys.stderr)
+
+    with tempfile.TemporaryDirectory() as folder:
+        make_screenshot(random.Random(0), (640, 480)).save(os.path.join(folder, 'first.png'))
+        first_file = measure_first_file(folder, args.workers, args.start_method)
+        cli = measure_cli(folder, args.workers)
+    print(f"first file: new pool {first_file['cold_pool'] * 1000:.0f} ms, warmed pool {first_file['warm_pool'] * 1000:.0f} ms"
+          f" (warm-up {first_file['warm_up'] * 1000:.0f} ms), reused pool {first_file['reused_pool'] * 1000:.0f} ms;"
+          f" cli.py {cli['first_result'] * 1000:.0f} ms to first result", file=sys.stderr)
+
+    print(json.dumps({
+        'python': sys.version.split()[0],
+        'start_method': args.start_method,
+        'workers': args.workers,
+        'imports': imports,
+        'first_file': first_file,
+        'cli': cli,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
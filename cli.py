@@ -0,0 +1,402 @@
+import argparse
+import concurrent.futures
+import json
+import os
+import signal
+import sys
+import threading
+
+from encoders import ENCODERS
+from iostage import DEFAULT_DEVICE_LIMIT, DEFAULT_IO_WRITERS, DEFAULT_PREFETCH_MAX_MB, PREFETCH_MODES
+from engine import (
+    BatchStats, FileScanner, build_options, default_output_folder, format_result, open_manifest, process_files,
+    warm_executor,
+)
+from processing import DEFAULT_RESIZE_PERCENTAGE, DEFAULT_RESIZE_THRESHOLD, WEBP_LOSSY_FALLBACK_QUALITY, format_bytes
+from quality import DEFAULT_MAX_TRIALS, quality_metrics_available
+from report import RunReport
+from scheduler import DEFAULT_MAX_VIDEO_THREADS
+from cluster import (
+    DEFAULT_LEASE_SECONDS, DEFAULT_MAX_ATTEMPTS, ClusterWorker, Coordinator, WorkerConnection, parse_address,
+)
+from video import CHUNK_MIN_DURATION
+from watcher import DEFAULT_POLL_INTERVAL, DEFAULT_SETTLE_SECONDS, FolderWatcher
+
+DEFAULT_STATUS_INTERVAL = 30.0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Batch compress images (WEBP) and videos (MP4) without the GUI.")
+    parser.add_argument('source_folder', help="Folder to scan recursively for images and videos.")
+    parser.add_argument('-o', '--output', help="Output folder (default: <source>/compressed).")
+    parser.add_argument('-j', '--workers', type=int, default=None,
+                        help="CPU thread budget shared by image workers and ffmpeg encoder threads (default: all cores).")
+    parser.add_argument('--max-video-threads', type=int, default=DEFAULT_MAX_VIDEO_THREADS,
+                        help=f"Maximum ffmpeg threads per video (default: {DEFAULT_MAX_VIDEO_THREADS}).")
+    parser.add_argument('--memory-budget', type=float, default=None, metavar='MB',
+                        help="Estimated memory that images being encoded at the same time may use; 0 disables the limit "
+                             "(default: 60%% of physical memory).")
+    parser.add_argument('--spool-max', type=float, default=None, metavar='MB',
+                        help="Encoded images larger than this are buffered in the local temp folder instead of memory; "
+                             "0 keeps every encode in memory (default: 64 MB).")
+    parser.add_argument('--io-readers', type=int, default=0, metavar='N',
+                        help="Read upcoming files on N threads ahead of the encoders, e.g. for sources on NFS (default: off).")
+    parser.add_argument('--prefetch', choices=PREFETCH_MODES, default='memory',
+                        help="With --io-readers, read files into the page cache ('memory', default) or copy them to a local "
+                             "scratch folder ('scratch').")
+    parser.add_argument('--prefetch-max', type=float, default=DEFAULT_PREFETCH_MAX_MB, metavar='MB',
+                        help=f"With --io-readers, how much of the upcoming files to read ahead (default: {DEFAULT_PREFETCH_MAX_MB}).")
+    parser.add_argument('--write-behind', action='store_true',
+                        help="Encode into a local scratch folder and copy outputs to the output folder on separate I/O threads.")
+    parser.add_argument('--io-writers', type=int, default=DEFAULT_IO_WRITERS, metavar='N',
+                        help=f"With --write-behind, number of threads copying outputs (default: {DEFAULT_IO_WRITERS}).")
+    parser.add_argument('--io-device-limit', type=int, default=DEFAULT_DEVICE_LIMIT, metavar='N',
+                        help=f"Prefetch reads and write-behind writes running at once per device/mount; 0 disables the limit "
+                             f"(default: {DEFAULT_DEVICE_LIMIT}).")
+    parser.add_argument('--scratch', metavar='DIR',
+                        help="Local folder for prefetched copies and staged outputs (default: the system temp folder).")
+    parser.add_argument('--no-images', action='store_true', help="Do not compress images.")
+    parser.add_argument('--remove-image-metadata', action='store_true', help="Remove metadata (EXIF) from images.")
+    parser.add_argument('--resize', type=float, default=None, metavar='PERCENT',
+                        help=f"Shrink large images by PERCENT (e.g. {DEFAULT_RESIZE_PERCENTAGE}).")
+    parser.add_argument('--resize-threshold', type=int, default=DEFAULT_RESIZE_THRESHOLD, metavar='PX',
+                        help=f"Only resize images whose largest dimension exceeds PX (default: {DEFAULT_RESIZE_THRESHOLD}).")
+    parser.add_argument('--sizes', type=int, nargs='+', default=None, metavar='WIDTH',
+                        help="Also write downscaled copies at these widths (e.g. --sizes 320 640 1280), named <name>-<width>w.webp.")
+    parser.add_argument('--formats', nargs='+', choices=sorted(ENCODERS), default=None, metavar='FORMAT',
+                        help=f"Also encode images as these formats ({', '.join(sorted(ENCODERS))}) and keep whichever is "
+                             "smallest; WEBP is always tried.")
+    parser.add_argument('--exact-resize', action='store_true',
+                        help="Decode images at full resolution and resize in one LANCZOS pass (slower, uses more memory).")
+    parser.add_argument('--planner', action='store_true',
+                        help="Predict the best WEBP mode from a cheap sample encode and send photographic images straight to lossy.")
+    target_group = parser.add_mutually_exclusive_group()
+    target_group.add_argument('--target-ssim', type=float, metavar='SCORE',
+                              help=f"Search the lossy WEBP quality for the smallest file with at least this SSIM (e.g. 0.95) instead of Q={WEBP_LOSSY_FALLBACK_QUALITY}.")
+    target_group.add_argument('--target-psnr', type=float, metavar='DB',
+                              help="Search the lossy WEBP quality for the smallest file with at least this PSNR in dB (e.g. 40).")
+    target_group.add_argument('--target-size', type=float, metavar='KB',
+                              help="Search the lossy WEBP quality for the best quality that fits in KB kilobytes per image.")
+    parser.add_argument('--max-trials', type=int, default=DEFAULT_MAX_TRIALS,
+                        help=f"Maximum trial encodes per image for quality/size targets (default: {DEFAULT_MAX_TRIALS}).")
+    parser.add_argument('--remove-video-audio', action='store_true', help="Remove the audio stream from videos.")
+    parser.add_argument('--remove-video-metadata', action='store_true', help="Remove metadata from videos.")
+    parser.add_argument('--no-video-analysis', action='store_true',
+                        help="Always re-encode videos instead of skipping, remuxing or stream-copying efficient H.264/AAC streams.")
+    parser.add_argument('--chunked-video', action='store_true',
+                        help="Split long videos at keyframes and encode the segments in parallel (lifts --max-video-threads).")
+    parser.add_argument('--chunk-min-duration', type=float, default=CHUNK_MIN_DURATION, metavar='SECONDS',
+                        help=f"Only split videos at least this long (default: {CHUNK_MIN_DURATION:.0f}).")
+    parser.add_argument('--video-segments', type=int, default=None, metavar='N',
+                        help="Number of segments per chunked video (default: based on the thread budget).")
+    parser.add_argument('--full', action='store_true', help="Re-encode every file, even if unchanged since the last run.")
+    parser.add_argument('--no-dedupe', action='store_true',
+                        help="Compress byte-identical files separately instead of reusing the first result.")
+    parser.add_argument('--prune', action='store_true', help="Delete outputs whose source files no longer exist.")
+    parser.add_argument('--watch', action='store_true',
+                        help="Keep running and compress new files as they appear in the source folder (stop with Ctrl+C).")
+    parser.add_argument('--settle', type=float, default=DEFAULT_SETTLE_SECONDS, metavar='SECONDS',
+                        help=f"With --watch, wait until a file has not changed for this long (default: {DEFAULT_SETTLE_SECONDS:.0f}).")
+    parser.add_argument('--poll-interval', type=float, default=DEFAULT_POLL_INTERVAL, metavar='SECONDS',
+                        help=f"With --watch, how often to look for new files when inotify is not used (default: {DEFAULT_POLL_INTERVAL:.0f}).")
+    parser.add_argument('--polling', action='store_true', help="With --watch, poll the folder even where inotify is available.")
+    parser.add_argument('--status-interval', type=float, default=DEFAULT_STATUS_INTERVAL, metavar='SECONDS',
+                        help=f"With --watch, print throughput and queue depth this often (default: {DEFAULT_STATUS_INTERVAL:.0f}, 0 disables).")
+    parser.add_argument('--status-file', metavar='PATH',
+                        help="With --watch, also write the current statistics as JSON to this file at every status interval.")
+    parser.add_argument('--serve', metavar='[HOST:]PORT',
+                        help="Coordinate workers started with --connect instead of compressing locally "
+                             "(listens on 127.0.0.1 unless a host is given).")
+    parser.add_argument('--connect', metavar='HOST:PORT',
+                        help="Run as a worker for a --serve coordinator. source_folder and --output are this host's paths "
+                             "to the same shared folders; compression options come from the coordinator.")
+    parser.add_argument('--token', default=os.environ.get('COMPRESSOR_TOKEN'),
+                        help="Shared secret that workers must present to the coordinator (default: $COMPRESSOR_TOKEN).")
+    parser.add_argument('--worker-name', help="Name of this worker in the coordinator's statistics (default: host name).")
+    parser.add_argument('--lease-seconds', type=float, default=DEFAULT_LEASE_SECONDS,
+                        help=f"With --serve, hand a file to another worker if its worker stops renewing the lease for this long "
+                             f"(default: {DEFAULT_LEASE_SECONDS:.0f}).")
+    parser.add_argument('--max-attempts', type=int, default=DEFAULT_MAX_ATTEMPTS,
+                        help=f"With --serve, give up on a file after this many lost leases (default: {DEFAULT_MAX_ATTEMPTS}).")
+    parser.add_argument('--video-progress', action='store_true', help="Print ffmpeg progress of running videos to stderr.")
+    parser.add_argument('--json', action='store_true', help="Print one JSON object per file and a final summary object.")
+    parser.add_argument('--report-json', metavar='PATH',
+                        help="Write a JSON run report (summary, stage time percentiles, slowest files, worst ratios).")
+    parser.add_argument('--report-csv', metavar='PATH', help="Write one CSV row per file with sizes and stage times.")
+    parser.add_argument('-q', '--quiet', action='store_true', help="Only print the final summary.")
+    return parser
+
+
+def io_options_from_args(args):
+    return {
+        'io_readers': args.io_readers,
+        'prefetch_mode': args.prefetch,
+        'prefetch_max_mb': args.prefetch_max,
+        'write_behind': args.write_behind,
+        'io_writers': args.io_writers,
+        'io_device_limit': args.io_device_limit,
+        'scratch_folder': args.scratch,
+    }
+
+
+def options_from_args(args):
+    options = {
+        'compress_images_webp': not args.no_images,
+        'remove_image_metadata': args.remove_image_metadata,
+        'enable_resize': args.resize is not None,
+        'fast_downscale': not args.exact_resize,
+        'resize_threshold': args.resize_threshold,
+        'size_ladder': sorted(set(args.sizes)) if args.sizes else None,
+        'output_formats': sorted(set(args.formats)) if args.formats else None,
+        'remove_video_audio': args.remove_video_audio,
+        'remove_video_metadata': args.remove_video_metadata,
+        'use_planner': args.planner,
+        'incremental': not args.full,
+        'prune_deleted': args.prune,
+        'deduplicate': not args.no_dedupe,
+        'max_video_threads': args.max_video_threads,
+        'memory_budget_mb': args.memory_budget,
+        'spool_max_mb': args.spool_max,
+        'analyze_video': not args.no_video_analysis,
+        'chunked_video': args.chunked_video,
+        'chunk_min_duration': args.chunk_min_duration,
+        'video_segments': args.video_segments,
+        **io_options_from_args(args),
+    }
+    if args.resize is not None:
+        options['resize_percentage'] = args.resize
+    for target_mode, target_value in (('ssim', args.target_ssim), ('psnr', args.target_psnr), ('size', args.target_size)):
+        if target_value is not None:
+            options['lossy_target_mode'] = target_mode
+            options['lossy_target_value'] = target_value
+            options['lossy_max_trials'] = args.max_trials
+    return options
+
+
+def validate_args(parser, args):
+    if not os.path.isdir(args.source_folder):
+        parser.error(f"Source folder does not exist: {args.source_folder}")
+    if args.memory_budget is not None and args.memory_budget < 0:
+        parser.error("Memory budget must not be negative.")
+    if args.spool_max is not None and args.spool_max < 0:
+        parser.error("Spool size must not be negative.")
+    if args.io_readers < 0 or args.io_writers <= 0 or args.io_device_limit < 0 or args.prefetch_max <= 0:
+        parser.error("I/O readers and device limit must not be negative; I/O writers and prefetch size must be positive.")
+    if args.scratch is not None and not os.path.isdir(args.scratch):
+        parser.error(f"Scratch folder does not exist: {args.scratch}")
+    if args.resize is not None and not (0 < args.resize < 100):
+        parser.error("Resize percentage must be between 0 and 100.")
+    if args.resize_threshold <= 0:
+        parser.error("Resize threshold must be a positive integer.")
+    if args.sizes is not None and any(width <= 0 for width in args.sizes):
+        parser.error("Sizes must be positive widths in pixels.")
+    if args.target_ssim is not None and not (0 < args.target_ssim <= 1):
+        parser.error("Target SSIM must be between 0 and 1.")
+    if args.target_psnr is not None and args.target_psnr <= 0:
+        parser.error("Target PSNR must be positive.")
+    if args.target_size is not None and args.target_size <= 0:
+        parser.error("Target size must be positive.")
+    if (args.target_ssim is not None or args.target_psnr is not None) and not quality_metrics_available():
+        parser.error("SSIM/PSNR targets require NumPy (pip install numpy).")
+    if args.max_trials <= 0:
+        parser.error("Maximum trials must be a positive integer.")
+    if args.workers is not None and args.workers <= 0:
+        parser.error("Number of workers must be a positive integer.")
+    if args.video_segments is not None and args.video_segments <= 0:
+        parser.error("Number of video segments must be a positive integer.")
+    if args.max_video_threads <= 0:
+        parser.error("Maximum video threads must be a positive integer.")
+    if args.settle < 0 or args.poll_interval <= 0 or args.status_interval < 0:
+        parser.error("Settle time, poll interval and status interval must not be negative.")
+    if args.serve and args.connect:
+        parser.error("--serve and --connect cannot be combined.")
+    for address in (args.serve, args.connect):
+        if address:
+            try:
+                parse_address(address)
+            except ValueError:
+                parser.error(f"Invalid address: {address}")
+    if args.lease_seconds <= 0 or args.max_attempts <= 0:
+        parser.error("Lease time and maximum attempts must be positive.")
+
+
+def print_video_progress(progress):
+    if progress['done']:
+        return
+    parts = [os.path.basename(progress['file_path'])]
+    if progress['fraction'] is not None:
+        parts.append(f"{progress['fraction'] * 100:.1f}%")
+    if progress['fps'] is not None:
+        parts.append(f"fps={progress['fps']:.1f}")
+    if progress['speed'] is not None:
+        parts.append(f"speed={progress['speed']:.2f}x")
+    print("  " + " ".join(parts), file=sys.stderr, flush=True)
+
+
+def write_status_file(path, stats):
+    temp_path = path + ".tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(stats.as_dict(), f, indent=2)
+    os.replace(temp_path, path)
+
+
+def report_status(stats, stats_lock, watcher, stop_event, args):
+    while not stop_event.wait(args.status_interval):
+        with stats_lock:
+            stats.total_files = watcher.count
+            stats.settling = watcher.settling
+            watch = stats.watch_dict()
+            if args.status_file:
+                try:
+                    write_status_file(args.status_file, stats)
+                except OSError as exc:
+                    print(f"Could not write status file: {exc}", file=sys.stderr)
+        print(f"Status: {stats.files_processed} done, {watch['queued']} queued, {watch['settling']} settling,"
+              f" {watch['files_per_minute']:.1f} files/min ({format_bytes(watch['bytes_per_second'])}/s)",
+              file=sys.stderr, flush=True)
+
+
+def run_cluster_worker(args, output_folder):
+    connection = WorkerConnection(parse_address(args.connect), name=args.worker_name, token=args.token)
+    try:
+        connection.connect()
+    except OSError as exc:
+        print(f"Could not connect to coordinator {args.connect}: {exc}", file=sys.stderr)
+        return 2
+    if not args.quiet:
+        print(f"Connected to {args.connect} as {connection.worker}.", file=sys.stderr, flush=True)
+
+    stats = BatchStats()
+    stats.start()
+    worker = ClusterWorker(connection, args.source_folder, output_folder, workers=args.workers,
+                           local_options=io_options_from_args(args))
+    results = worker.run()
+    try:
+        for result in results:
+            stats.add(result)
+            if args.quiet:
+                continue
+            if args.json:
+                print(json.dumps(result), flush=True)
+            else:
+                print(f"[{stats.files_processed}] {format_result(result)}", flush=True)
+    except KeyboardInterrupt:
+        print("Interrupted, cancelling running encodes...", file=sys.stderr)
+        results.close()
+        return 130
+    except OSError as exc:
+        print(f"Lost the coordinator: {exc}", file=sys.stderr)
+        results.close()
+        return 2
+    finally:
+        connection.close()
+
+    stats.finish()
+    stats.total_files = stats.files_processed
+    if args.json:
+        print(json.dumps({'summary': stats.as_dict()}), flush=True)
+    else:
+        print(stats.summary_text())
+    return 1 if stats.failed else 0
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    validate_args(parser, args)
+
+    source_folder = args.source_folder
+    output_folder = args.output or default_output_folder(source_folder)
+    os.makedirs(output_folder, exist_ok=True)
+    if args.connect:
+        return run_cluster_worker(args, output_folder)
+    options = build_options(source_folder, **options_from_args(args))
+
+    stats = BatchStats()
+    stats_lock = threading.Lock()
+    executor = None
+    stop_event = threading.Event()
+    if args.watch:
+        def request_stop(signum, frame):
+            if stop_event.is_set():
+                raise KeyboardInterrupt
+            stop_event.set()
+            print("Stopping: finishing files in progress (Ctrl+C again to cancel them)...", file=sys.stderr, flush=True)
+
+        files = FolderWatcher(source_folder, output_folder, settle_seconds=args.settle, poll_interval=args.poll_interval,
+                              use_inotify=not args.polling, stop_event=stop_event)
+        # One pool for the whole session, started before the first file arrives. Workers ignore Ctrl+C
+        # so that the first one only stops the watch and lets running files finish.
+        if not args.serve:
+            workers = args.workers or os.cpu_count() or 1
+            executor = concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=signal.signal,
+                                                              initargs=(signal.SIGINT, signal.SIG_IGN))
+            warm_executor(executor, workers)
+        signal.signal(signal.SIGINT, request_stop)
+        signal.signal(signal.SIGTERM, request_stop)
+        stats.watching = True
+        print(f"Watching {source_folder} for new files ({files.backend}), press Ctrl+C to stop.", file=sys.stderr, flush=True)
+        if args.status_interval:
+            threading.Thread(target=report_status, args=(stats, stats_lock, files, stop_event, args), daemon=True).start()
+    else:
+        files = FileScanner(source_folder, output_folder)
+    stats.start()
+    report = RunReport(csv_path=args.report_csv)
+
+    manifest, pruned = open_manifest(output_folder, options)
+    if pruned and not args.quiet and not args.json:
+        print(f"Pruned {len(pruned)} outputs of deleted source files.")
+    progress_callback = print_video_progress if args.video_progress else None
+    if args.serve:
+        try:
+            coordinator = Coordinator(source_folder, output_folder, options, address=parse_address(args.serve), token=args.token,
+                                      lease_seconds=args.lease_seconds, max_attempts=args.max_attempts)
+        except OSError as exc:
+            print(f"Could not listen on {args.serve}: {exc}", file=sys.stderr)
+            manifest.close()
+            report.close()
+            return 2
+        print(f"Waiting for workers on {coordinator.address[0]}:{coordinator.address[1]}.", file=sys.stderr, flush=True)
+        results = coordinator.run(files, manifest=manifest)
+    else:
+        results = process_files(files, output_folder, options, max_workers=args.workers, executor=executor, manifest=manifest,
+                                progress_callback=progress_callback)
+    try:
+        for result in results:
+            with stats_lock:
+                stats.total_files = files.count
+                stats.add(result)
+            report.add(result)
+            if args.quiet:
+                continue
+            if args.json:
+                print(json.dumps(result), flush=True)
+            else:
+                print(f"[{stats.files_processed}/{stats.total_files}] {format_result(result)}", flush=True)
+    except KeyboardInterrupt:
+        print("Interrupted, cancelling running encodes...", file=sys.stderr)
+        results.close()
+        return 130
+    finally:
+        stop_event.set()
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+        manifest.close()
+        report.close()
+
+    stats.finish()
+    stats.total_files = files.count
+    if args.watch:
+        stats.settling = files.settling
+    if args.report_json:
+        report.write_json(args.report_json, stats)
+    if args.json:
+        print(json.dumps({'summary': stats.as_dict()}), flush=True)
+    else:
+        print(stats.summary_text())
+
+    return 1 if stats.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
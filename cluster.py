@@ -0,0 +1,394 @@
+import collections
+import hmac
+import itertools
+import json
+import os
+import queue
+import socket
+import socketserver
+import threading
+import time
+
+from engine import CANCEL_POLL_INTERVAL, SCAN_WINDOW, make_result, process_files
+
+DEFAULT_PORT = 8765
+DEFAULT_LEASE_SECONDS = 60.0
+DEFAULT_MAX_ATTEMPTS = 3
+# How long a worker waits before asking again when the coordinator has no job for it.
+LEASE_RETRY_SECONDS = 0.5
+# Jobs a worker holds per local CPU slot, so its scheduler can order and batch them.
+JOBS_PER_SLOT = 2
+CONNECT_TIMEOUT = 10.0
+RECONNECT_ATTEMPTS = 5
+_END_OF_FILES = object()
+
+
+def parse_address(address, default_host='127.0.0.1'):
+    host, _, port = address.rpartition(':')
+    return host or default_host, int(port) if port else DEFAULT_PORT
+
+
+def _relative_result(result, source_folder, output_folder):
+    # Paths cross the wire relative to the source and output roots, which may be mounted differently on each host.
+    result = dict(result)
+    result['file_path'] = os.path.relpath(result['file_path'], source_folder)
+    if result.get('output_path'):
+        result['output_path'] = os.path.relpath(result['output_path'], output_folder)
+    if result.get('variants'):
+        result['variants'] = [dict(v, output_path=os.path.relpath(v['output_path'], output_folder)) for v in result['variants']]
+    return result
+
+
+def _absolute_result(result, source_folder, output_folder):
+    result = dict(result)
+    result['file_path'] = os.path.join(source_folder, result['file_path'])
+    if result.get('output_path'):
+        result['output_path'] = os.path.join(output_folder, result['output_path'])
+    if result.get('variants'):
+        result['variants'] = [dict(v, output_path=os.path.join(output_folder, v['output_path'])) for v in result['variants']]
+    return result
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    # One JSON object per line in each direction; every request gets exactly one reply.
+    def handle(self):
+        coordinator = self.server.coordinator
+        worker = None
+        try:
+            for line in self.rfile:
+                try:
+                    request = json.loads(line)
+                except ValueError:
+                    break
+                if worker is None:
+                    reply = coordinator.hello(request)
+                    if 'error' not in reply:
+                        worker = reply['worker']
+                else:
+                    reply = coordinator.handle(worker, request)
+                self.wfile.write(json.dumps(reply).encode('utf-8') + b"\n")
+                self.wfile.flush()
+                if worker is None:
+                    break
+        except OSError:
+            pass
+        finally:
+            if worker is not None:
+                coordinator.worker_gone(worker)
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class Coordinator:
+    # Scans the source tree and leases one file at a time to remote workers. A lease that is not
+    # renewed in time, or whose worker disconnects, puts the file back in the queue; after
+    # max_attempts leases the file is reported as failed. All manifest access stays in the
+    # thread that iterates run(), like process_files.
+    def __init__(self, source_folder, output_folder, options, address=('127.0.0.1', DEFAULT_PORT), token=None,
+                 lease_seconds=DEFAULT_LEASE_SECONDS, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        self.source_folder = source_folder
+        self.output_folder = output_folder
+        self.options = options
+        self.token = token
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._jobs = collections.deque()
+        self._leases = {}
+        self._results = queue.Queue()
+        self._scanning = True
+        self._job_ids = itertools.count(1)
+        self._worker_ids = itertools.count(1)
+        self._server = _Server(address, _Handler)
+        self._server.coordinator = self
+        self.address = self._server.server_address
+
+    def hello(self, request):
+        if self.token and not hmac.compare_digest(str(request.get('token') or ''), self.token):
+            return {'error': "Invalid token."}
+        with self._lock:
+            worker = f"{request.get('name') or 'worker'}#{next(self._worker_ids)}"
+        return {'worker': worker, 'options': self.options, 'lease_seconds': self.lease_seconds}
+
+    def handle(self, worker, request):
+        op = request.get('op')
+        with self._lock:
+            if op == 'lease':
+                return self._lease(worker)
+            if op == 'renew':
+                return self._renew(worker, request.get('jobs') or [])
+            if op == 'complete':
+                return self._complete(worker, request.get('job'), request.get('result') or {})
+        return {'error': f"Unknown request {op!r}."}
+
+    def _lease(self, worker):
+        if self._jobs:
+            job = self._jobs.popleft()
+            job['attempts'] += 1
+            self._leases[job['id']] = (job, worker, time.monotonic() + self.lease_seconds)
+            return {'job': job['id'], 'path': job['path']}
+        if not self._scanning and not self._leases:
+            return {'done': True}
+        return {'wait': LEASE_RETRY_SECONDS}
+
+    def _renew(self, worker, job_ids):
+        deadline = time.monotonic() + self.lease_seconds
+        lost = []
+        for job_id in job_ids:
+            lease = self._leases.get(job_id)
+            if lease is None or lease[1] != worker:
+                lost.append(job_id)
+                continue
+            self._leases[job_id] = (lease[0], worker, deadline)
+        return {'lost': lost}
+
+    def _complete(self, worker, job_id, result):
+        lease = self._leases.get(job_id)
+        if lease is None or lease[1] != worker:
+            # The lease expired and the file went to another worker; its result wins.
+            return {'accepted': False}
+        job = self._leases.pop(job_id)[0]
+        if result.get('status') == 'cancelled':
+            # The worker is shutting down; someone else can take the file.
+            job['attempts'] -= 1
+            self._jobs.appendleft(job)
+            return {'accepted': True}
+        result = _absolute_result(result, self.source_folder, self.output_folder)
+        result['file_path'] = job['file_path']
+        result['worker'] = worker
+        result['attempts'] = job['attempts']
+        self._results.put(result)
+        return {'accepted': True}
+
+    def _release(self, job, reason):
+        if job['attempts'] >= self.max_attempts:
+            file_path = job['file_path']
+            self._results.put(make_result(file_path, 'fail', f"Gave up on {os.path.basename(file_path)} after "
+                                                             f"{job['attempts']} attempts ({reason})."))
+        else:
+            self._jobs.appendleft(job)
+
+    def worker_gone(self, worker):
+        with self._lock:
+            for job_id, (job, holder, _) in list(self._leases.items()):
+                if holder == worker:
+                    del self._leases[job_id]
+                    self._release(job, f"worker {worker} disconnected")
+
+    def _expire_leases(self):
+        now = time.monotonic()
+        with self._lock:
+            for job_id, (job, worker, deadline) in list(self._leases.items()):
+                if deadline < now:
+                    del self._leases[job_id]
+                    self._release(job, f"lease held by {worker} expired")
+
+    def _finished(self):
+        with self._lock:
+            return not self._scanning and not self._jobs and not self._leases
+
+    def run(self, files, manifest=None, cancel_event=None):
+        # Yields results in the same form as process_files, with 'worker' and 'attempts' added.
+        server_thread = threading.Thread(target=self._server.serve_forever, kwargs={'poll_interval': CANCEL_POLL_INTERVAL},
+                                         daemon=True)
+        server_thread.start()
+        files = iter(files)
+        try:
+            while True:
+                if cancel_event is not None and cancel_event.is_set():
+                    with self._lock:
+                        self._scanning = False
+                        jobs = list(self._jobs) + [job for job, _, _ in self._leases.values()]
+                        self._jobs.clear()
+                        self._leases.clear()
+                    for job in jobs:
+                        yield make_result(job['file_path'], 'cancelled', f"Cancelled {os.path.basename(job['file_path'])}.")
+
+                while self._scanning and len(self._jobs) < SCAN_WINDOW:
+                    file_path = next(files, _END_OF_FILES)
+                    if file_path is _END_OF_FILES:
+                        with self._lock:
+                            self._scanning = False
+                        break
+                    if file_path is None:
+                        # A FolderWatcher with nothing ready yet.
+                        break
+                    if manifest is not None:
+                        result = manifest.check(file_path)
+                        if result is not None:
+                            yield result
+                            continue
+                    job = {'id': next(self._job_ids), 'file_path': file_path,
+                           'path': os.path.relpath(file_path, self.source_folder), 'attempts': 0}
+                    with self._lock:
+                        self._jobs.append(job)
+
+                self._expire_leases()
+                try:
+                    result = self._results.get(timeout=CANCEL_POLL_INTERVAL)
+                except queue.Empty:
+                    if self._finished():
+                        break
+                    continue
+                if manifest is not None:
+                    manifest.record(result)
+                yield result
+        finally:
+            # Keep answering 'done' briefly so idle workers exit instead of seeing a dropped connection.
+            time.sleep(LEASE_RETRY_SECONDS * 2)
+            self._server.shutdown()
+            self._server.server_close()
+
+
+class WorkerConnection:
+    def __init__(self, address, name=None, token=None):
+        self.address = address
+        self.name = name or socket.gethostname()
+        self.token = token
+        self._lock = threading.Lock()
+        self._sock = None
+        self._file = None
+        self.worker = None
+        self.options = None
+        self.lease_seconds = DEFAULT_LEASE_SECONDS
+
+    def _connect(self):
+        self._sock = socket.create_connection(self.address, timeout=CONNECT_TIMEOUT)
+        self._sock.settimeout(None)
+        self._file = self._sock.makefile('rwb')
+        reply = self._send({'name': self.name, 'token': self.token})
+        if 'error' in reply:
+            raise ConnectionError(reply['error'])
+        self.worker = reply['worker']
+        self.options = reply['options']
+        self.lease_seconds = reply['lease_seconds']
+
+    def _send(self, request):
+        self._file.write(json.dumps(request).encode('utf-8') + b"\n")
+        self._file.flush()
+        line = self._file.readline()
+        if not line:
+            raise ConnectionError("Coordinator closed the connection.")
+        return json.loads(line)
+
+    def _drop(self):
+        if self._sock is not None:
+            try:
+                self._file.close()
+                self._sock.close()
+            except OSError:
+                pass
+            self._sock = None
+
+    def request(self, request):
+        # Reconnects once after a dropped connection. The coordinator has already released the
+        # jobs of the old connection, so their completions are no longer accepted.
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    if self._sock is None:
+                        self._connect()
+                    return self._send(request)
+                except OSError:
+                    self._drop()
+                    if attempt:
+                        raise
+
+    def connect(self):
+        # Retries for a while so workers can be started before the coordinator.
+        for attempt in range(RECONNECT_ATTEMPTS):
+            try:
+                with self._lock:
+                    self._connect()
+                return
+            except ConnectionRefusedError:
+                if attempt == RECONNECT_ATTEMPTS - 1:
+                    raise
+                time.sleep(2 ** attempt)
+
+    def close(self):
+        with self._lock:
+            self._drop()
+
+
+class ClusterWorker:
+    # Pulls jobs from a Coordinator and runs them through the local engine. The lease source yields
+    # None while the worker holds enough jobs, so process_files keeps its own scheduling, memory
+    # admission and small-image batching.
+    def __init__(self, connection, source_folder, output_folder, workers=None, local_options=None):
+        self.connection = connection
+        self.source_folder = source_folder
+        self.output_folder = output_folder
+        self.workers = workers or os.cpu_count() or 1
+        # Settings that depend on this host, such as its I/O stages, override the coordinator's.
+        self.local_options = local_options or {}
+        self.held = {}
+        # Files whose lease the coordinator gave to another worker; process_files drops them.
+        self.withdrawn = set()
+        self.completed = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._next_lease = 0.0
+
+    def _leases(self):
+        capacity = self.workers * JOBS_PER_SLOT
+        while not self._stop.is_set():
+            if len(self.held) >= capacity or time.monotonic() < self._next_lease:
+                yield None
+                continue
+            reply = self.connection.request({'op': 'lease'})
+            if reply.get('done'):
+                return
+            if 'job' not in reply:
+                self._next_lease = time.monotonic() + reply.get('wait', LEASE_RETRY_SECONDS)
+                yield None
+                continue
+            file_path = os.path.join(self.source_folder, reply['path'])
+            with self._lock:
+                self.held[file_path] = reply['job']
+                self.withdrawn.discard(file_path)
+            yield file_path
+
+    def _renew_leases(self):
+        while not self._stop.wait(self.connection.lease_seconds / 3):
+            with self._lock:
+                jobs = list(self.held.values())
+            if not jobs:
+                continue
+            try:
+                reply = self.connection.request({'op': 'renew', 'jobs': jobs})
+            except (OSError, ValueError):
+                return
+            lost = set(reply.get('lost') or ())
+            if not lost:
+                continue
+            with self._lock:
+                for file_path, job_id in list(self.held.items()):
+                    if job_id in lost:
+                        # Expired here and leased to someone else: stop working on it.
+                        del self.held[file_path]
+                        self.withdrawn.add(file_path)
+
+    def run(self, cancel_event=None):
+        options = dict(self.connection.options, **self.local_options, source_folder=self.source_folder)
+        renewer = threading.Thread(target=self._renew_leases, daemon=True)
+        renewer.start()
+        try:
+            for result in process_files(self._leases(), self.output_folder, options, max_workers=self.workers,
+                                        cancel_event=cancel_event, withdrawn=self.withdrawn):
+                with self._lock:
+                    job_id = self.held.pop(result['file_path'], None)
+                    if job_id is None:
+                        self.withdrawn.discard(result['file_path'])
+                if job_id is None:
+                    continue
+                reply = self.connection.request({'op': 'complete', 'job': job_id,
+                                                 'result': _relative_result(result, self.source_folder, self.output_folder)})
+                result['accepted'] = reply.get('accepted', False)
+                self.completed += 1
+                yield result
+        finally:
+            self._stop.set()
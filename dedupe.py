@@ -0,0 +1,125 @@
+import os
+import shutil
+import hashlib
+
+HASH_CHUNK_SIZE = 1024 * 1024
+# Files remembered for matching. A watch session runs as one long batch, so beyond this the oldest
+# are forgotten; a later copy of one of them is then compressed again instead of linked.
+MAX_TRACKED_FILES = 200000
+
+# Kept per-file after the first occurrence finishes, so later copies can reuse its result.
+KEPT_RESULT_KEYS = ('status', 'message', 'output_path', 'compressed_size', 'processing_time', 'variants')
+
+
+def file_digest(file_path):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, 'rb') as f:
+        while True:
+            chunk = f.read(HASH_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def link_or_copy(source_path, target_path):
+    target_dir = os.path.dirname(target_path)
+    if target_dir:
+        os.makedirs(target_dir, exist_ok=True)
+    if os.path.lexists(target_path):
+        os.remove(target_path)
+    try:
+        os.link(source_path, target_path)
+        return 'linked'
+    except OSError:
+        shutil.copy2(source_path, target_path)
+        return 'copied'
+
+
+class DuplicateIndex:
+    # Finds byte-identical inputs within a batch. Files are grouped by size first and only
+    # hashed once a second file of the same size shows up, so unique sizes are never read.
+    def __init__(self, max_files=MAX_TRACKED_FILES):
+        self.max_files = max_files
+        self._first_by_size = {}
+        self._primary_by_digest = {}
+        self._primaries = set()
+        self._results = {}
+        self._waiting = {}
+        # file_path -> the size and digest keys it was registered under, for forget(); oldest first.
+        self._keys = {}
+        # Tracked files per size key, so the key goes away with the last of them.
+        self._size_members = {}
+
+    def _digest_key(self, key, file_path):
+        try:
+            return key + (file_digest(file_path),)
+        except OSError:
+            return None
+
+    def forget(self, file_path):
+        # Drops everything known about file_path, e.g. when it comes back rewritten in the same
+        # session (watch mode); its old content must not be matched against the new one.
+        for key in self._keys.pop(file_path, ()):
+            if len(key) == 2:
+                self._size_members[key] -= 1
+                if not self._size_members[key]:
+                    del self._size_members[key]
+                    del self._first_by_size[key]
+            elif self._primary_by_digest.get(key) == file_path:
+                del self._primary_by_digest[key]
+        self._primaries.discard(file_path)
+        self._results.pop(file_path, None)
+
+    def primary_for(self, file_path, size, group=None):
+        self.forget(file_path)
+        while self.max_files and len(self._keys) >= self.max_files:
+            self.forget(next(iter(self._keys)))
+        key = (group, size)
+        first = self._first_by_size.get(key)
+        if first is None and key not in self._first_by_size:
+            self._first_by_size[key] = file_path
+            self._size_members[key] = 1
+            self._keys[file_path] = {key}
+            self._primaries.add(file_path)
+            return None
+
+        if first is not None:
+            # Second file of this size: hash the first one now.
+            self._first_by_size[key] = None
+            first_key = self._digest_key(key, first)
+            if first_key is not None:
+                self._primary_by_digest[first_key] = first
+                self._keys.setdefault(first, set()).add(first_key)
+
+        digest_key = self._digest_key(key, file_path)
+        if digest_key is None:
+            return None
+        primary = self._primary_by_digest.get(digest_key)
+        if primary is None:
+            self._primary_by_digest[digest_key] = file_path
+            self._size_members[key] += 1
+            self._keys[file_path] = {key, digest_key}
+            self._primaries.add(file_path)
+            return None
+        return primary
+
+    def result_for(self, primary):
+        return self._results.get(primary)
+
+    def wait_for(self, primary, file_path):
+        self._waiting.setdefault(primary, []).append(file_path)
+
+    def finished(self, result):
+        file_path = result.get('file_path')
+        if result.get('status') == 'cancelled':
+            # Nothing to reuse; the next copy that comes along is compressed instead.
+            self.forget(file_path)
+        elif file_path in self._primaries:
+            self._results[file_path] = {key: result.get(key) for key in KEPT_RESULT_KEYS}
+        return self._waiting.pop(file_path, [])
+
+    def waiting(self):
+        waiting = [(primary, file_path) for primary, file_paths in self._waiting.items() for file_path in file_paths]
+        self._waiting = {}
+        return waiting
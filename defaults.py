@@ -0,0 +1,5 @@
+# Default settings shown by the GUI and CLI. Kept free of heavy imports so the window can be
+# built before Pillow and the engine are loaded.
+DEFAULT_RESIZE_PERCENTAGE = 15.0
+DEFAULT_RESIZE_THRESHOLD = 2000
+WEBP_LOSSY_FALLBACK_QUALITY = 85
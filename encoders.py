@@ -0,0 +1,92 @@
+import concurrent.futures
+
+from PIL import Image, ImageChops
+
+# Threads racing alternative encoders against the WEBP encode of the same image.
+RACE_MAX_THREADS = 2
+# Images with more distinct colors than this count as photographic. A lossless PNG of such an image
+# loses to WEBP and its optimize pass is the slowest contestant, so it is not started.
+PHOTO_MIN_COLORS = 1 << 14
+
+ENCODERS = {}
+
+
+def register_encoder(name, extension, label, encode, lossless, alpha, photographic=True):
+    # encode(img, buffer, quality) writes the encoded image to buffer. photographic=False skips the
+    # encoder for images with more than PHOTO_MIN_COLORS colors.
+    ENCODERS[name] = {
+        'extension': extension,
+        'label': label,
+        'encode': encode,
+        'lossless': lossless,
+        'alpha': alpha,
+        'photographic': photographic,
+    }
+
+
+def _encode_jpeg(img, buffer, quality):
+    img.save(buffer, format='JPEG', quality=quality, optimize=True, progressive=True)
+
+
+def _exact_palette(img):
+    # A palette PNG is only used when it reproduces every pixel, so the PNG encoder stays lossless.
+    if img.getcolors(256) is None:
+        return None
+    method = Image.Quantize.FASTOCTREE if img.mode == 'RGBA' else Image.Quantize.MEDIANCUT
+    paletted = img.quantize(colors=256, method=method)
+    if ImageChops.difference(paletted.convert(img.mode), img).getbbox() is not None:
+        return None
+    return paletted
+
+
+def _encode_png(img, buffer, quality):
+    paletted = _exact_palette(img)
+    (paletted or img).save(buffer, format='PNG', optimize=True)
+
+
+register_encoder('jpeg', '.jpg', "optimized progressive JPEG", _encode_jpeg, lossless=False, alpha=False)
+register_encoder('png', '.png', "optimized PNG", _encode_png, lossless=True, alpha=True, photographic=False)
+
+
+def race_names(options):
+    names = [name for name in options.get('output_formats') or () if name in ENCODERS]
+    if options.get('lossy_target_mode', 'fixed') != 'fixed':
+        # A fixed-quality lossy encode would bypass the quality target, so only lossless encoders race.
+        names = [name for name in names if ENCODERS[name]['lossless']]
+    return names
+
+
+def race_encoders(pool, img, names, quality, make_buffer):
+    # Starts the encoders on the pool and returns {name: future}; each future yields a buffer.
+    has_alpha = img.mode == 'RGBA'
+    photographic = None
+    futures = {}
+    for name in names:
+        encoder = ENCODERS.get(name)
+        if encoder is None or (has_alpha and not encoder['alpha']):
+            continue
+        if not encoder['photographic']:
+            if photographic is None:
+                photographic = img.getcolors(PHOTO_MIN_COLORS) is None
+            if photographic:
+                continue
+        # Image.save keeps its parameters on the image, so encoders sharing one with the WEBP encode
+        # would pick up each other's settings.
+        futures[name] = pool.submit(_run_encoder, encoder['encode'], img.copy(), quality, make_buffer)
+    return futures
+
+
+def _run_encoder(encode, img, quality, make_buffer):
+    buffer = make_buffer()
+    try:
+        encode(img, buffer, quality)
+    except BaseException:
+        buffer.close()
+        raise
+    return buffer
+
+
+def race_pool(names):
+    if not names:
+        return None
+    return concurrent.futures.ThreadPoolExecutor(max_workers=min(len(names), RACE_MAX_THREADS))
@@ -0,0 +1,781 @@
+import collections
+import os
+import pathlib
+import queue
+import time
+import concurrent.futures
+
+from dedupe import DuplicateIndex, link_or_copy
+from encoders import RACE_MAX_THREADS, race_names
+from iostage import DEFAULT_DEVICE_LIMIT, DEFAULT_IO_WRITERS, DEFAULT_PREFETCH_MAX_MB, DEFAULT_PREFETCH_MODE, DeviceLimiter, Prefetcher, WriteBehind
+from manifest import Manifest
+from processing import (
+    IMAGE_EXTS, VIDEO_EXTS, DEFAULT_RESIZE_PERCENTAGE, DEFAULT_RESIZE_THRESHOLD, LADDER_MAX_THREADS,
+    estimate_image_memory, format_bytes, process_image, process_image_batch, process_video, variant_path,
+)
+from quality import DEFAULT_MAX_TRIALS
+from report import StageHistogram, format_seconds, result_time
+from scheduler import DEFAULT_MAX_VIDEO_THREADS, IMAGE_LANE, VIDEO_LANE, LaneScheduler, default_memory_budget
+from video import CHUNK_MIN_DURATION
+
+OUTPUT_FOLDER_NAME = "compressed"
+CANCEL_POLL_INTERVAL = 0.25
+# Files pulled from the scanner ahead of the workers; largest-first ordering applies within this window.
+SCAN_WINDOW = 512
+# Images below this size are grouped so that one task (and one pickled options dict) covers many files.
+SMALL_IMAGE_BYTES = 64 * 1024
+SMALL_BATCH_FILES = 32
+# Window over which BatchStats reports recent throughput.
+THROUGHPUT_WINDOW = 60.0
+_END_OF_FILES = object()
+
+DEFAULT_OPTIONS = {
+    'compress_images_webp': True,
+    'remove_image_metadata': False,
+    'enable_resize': False,
+    'fast_downscale': True,
+    'resize_percentage': DEFAULT_RESIZE_PERCENTAGE,
+    'resize_threshold': DEFAULT_RESIZE_THRESHOLD,
+    'size_ladder': None,
+    'output_formats': None,
+    'remove_video_audio': False,
+    'remove_video_metadata': False,
+    'use_planner': False,
+    'lossy_target_mode': 'fixed',
+    'lossy_target_value': None,
+    'lossy_max_trials': DEFAULT_MAX_TRIALS,
+    'incremental': True,
+    'prune_deleted': False,
+    'deduplicate': True,
+    'cpu_budget': None,
+    'max_video_threads': DEFAULT_MAX_VIDEO_THREADS,
+    'memory_budget_mb': None,
+    'spool_max_mb': None,
+    'analyze_video': True,
+    'chunked_video': False,
+    'chunk_min_duration': CHUNK_MIN_DURATION,
+    'video_segments': None,
+    'io_readers': 0,
+    'prefetch_mode': DEFAULT_PREFETCH_MODE,
+    'prefetch_max_mb': DEFAULT_PREFETCH_MAX_MB,
+    'write_behind': False,
+    'io_writers': DEFAULT_IO_WRITERS,
+    'io_device_limit': DEFAULT_DEVICE_LIMIT,
+    'scratch_folder': None,
+}
+
+STATUS_LABELS = {
+    'success': "[SUCCESS]",
+    'success_lossy': "[SUCCESS - LOSSY]",
+    'skipped_size_increase': "[SKIPPED]",
+    'skipped': "[SKIPPED]",
+    'fail': "[FAILED]",
+    'cancelled': "[CANCELLED]",
+    'unchanged': "[UNCHANGED]",
+}
+
+SUCCESS_STATUSES = ('success', 'success_lossy')
+COUNTED_COMPRESSED_STATUSES = SUCCESS_STATUSES + ('unchanged',)
+
+
+def default_output_folder(source_folder):
+    return os.path.join(source_folder, OUTPUT_FOLDER_NAME)
+
+
+def is_within(path, folder):
+    # Path-component test, so a sibling such as 'compressed2' is not inside 'compressed'.
+    path, folder = os.path.abspath(path), os.path.abspath(folder)
+    try:
+        return os.path.commonpath([path, folder]) == folder
+    except ValueError:
+        return False
+
+
+def build_options(source_folder, **overrides):
+    options = dict(DEFAULT_OPTIONS)
+    options.update(overrides)
+    options['source_folder'] = source_folder
+    return options
+
+
+class FileScanner:
+    # Yields supported files while walking the tree with os.scandir, so processing can start
+    # before the scan is finished. count and done can be read from other threads for progress.
+    def __init__(self, source_folder, output_folder=None):
+        if output_folder is None:
+            output_folder = default_output_folder(source_folder)
+        self.source_folder = source_folder
+        self.output_folder = output_folder
+        self.count = 0
+        self.done = False
+
+    def __iter__(self):
+        folders = [self.source_folder]
+        while folders:
+            folder = folders.pop()
+            if is_within(folder, self.output_folder):
+                continue
+            try:
+                with os.scandir(folder) as entries:
+                    entries = sorted(entries, key=lambda entry: entry.name)
+            except OSError:
+                continue
+
+            subfolders = []
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subfolders.append(entry.path)
+                        continue
+                    if not entry.is_file():
+                        continue
+                except OSError:
+                    continue
+                file_ext = pathlib.Path(entry.name).suffix.lower()
+                if file_ext in IMAGE_EXTS or file_ext in VIDEO_EXTS:
+                    self.count += 1
+                    yield entry.path
+            folders.extend(reversed(subfolders))
+        self.done = True
+
+
+def scan_files(source_folder, output_folder=None):
+    return list(FileScanner(source_folder, output_folder))
+
+
+def make_result(file_path, status, message, original_size=0, compressed_size=0):
+    return {
+        'original_size': original_size,
+        'compressed_size': compressed_size,
+        'status': status,
+        'message': message,
+        'file_path': file_path,
+        'output_path': None
+    }
+
+
+def format_result(result):
+    status = result.get('status', 'unknown')
+    message = result.get('message', 'No message provided')
+    return f"{STATUS_LABELS.get(status, '[UNKNOWN STATUS]')} {message}"
+
+
+def _lane_for(file_path, options):
+    file_ext = pathlib.Path(file_path).suffix.lower()
+    if file_ext in IMAGE_EXTS:
+        if options.get('compress_images_webp', False):
+            return IMAGE_LANE, None
+        return None, make_result(file_path, 'skipped', f"Skipped {os.path.basename(file_path)} (Image compression disabled).")
+    if file_ext in VIDEO_EXTS:
+        return VIDEO_LANE, None
+    return None, make_result(file_path, 'skipped', f"File {os.path.basename(file_path)} has unsupported extension.")
+
+
+def _image_threads(options):
+    # Threads one image job keeps busy: its own, plus the encoder race running next to the WEBP
+    # encode or the size-ladder pool encoding rungs while the next one is resampled.
+    extra = 0
+    racing = race_names(options)
+    if racing:
+        extra = max(extra, min(len(racing), RACE_MAX_THREADS))
+    if options.get('size_ladder'):
+        extra = max(extra, min(len(options['size_ladder']), LADDER_MAX_THREADS))
+    return 1 + extra
+
+
+def _file_cost(file_path):
+    try:
+        return os.path.getsize(file_path)
+    except OSError:
+        return 0
+
+
+def _start_supervisor(progress_callback):
+    # Imported and started with the first video, so image-only runs skip asyncio and the loop thread.
+    from supervisor import FFmpegSupervisor
+    return FFmpegSupervisor(progress_callback=progress_callback)
+
+
+def _memory_budget(options):
+    budget_mb = options.get('memory_budget_mb')
+    if budget_mb is None:
+        return default_memory_budget()
+    return int(budget_mb * 1024 * 1024) if budget_mb > 0 else None
+
+
+def duplicate_result(file_path, primary, primary_result, output_folder, options):
+    original_size = _file_cost(file_path)
+    output_path = None
+    if primary_result.get('output_path'):
+        primary_output = primary_result['output_path']
+        relative_path = pathlib.Path(file_path).relative_to(options['source_folder'])
+        output_path = str(pathlib.Path(output_folder) / relative_path.with_suffix(pathlib.Path(primary_output).suffix))
+        how = 'shared'
+        variants = []
+        try:
+            if os.path.abspath(output_path) != os.path.abspath(primary_output):
+                how = link_or_copy(primary_output, output_path)
+                for variant in primary_result.get('variants') or []:
+                    target = str(variant_path(pathlib.Path(output_path), variant['width']))
+                    link_or_copy(variant['output_path'], target)
+                    variants.append(dict(variant, output_path=target))
+        except OSError as exc:
+            return make_result(file_path, 'fail', f"Could not reuse the output of {os.path.basename(primary)} for duplicate {os.path.basename(file_path)}: {exc}", original_size)
+        message = (f"Duplicate of {os.path.basename(primary)}: output {how} "
+                   f"({format_bytes(original_size)} -> {format_bytes(primary_result.get('compressed_size') or 0)})")
+    else:
+        previous = (primary_result.get('message') or '').splitlines()[:1]
+        message = f"Duplicate of {os.path.basename(primary)}, same result: {previous[0] if previous else primary_result['status']}"
+
+    result = make_result(file_path, primary_result['status'], message, original_size, primary_result.get('compressed_size') or 0)
+    result['output_path'] = output_path
+    result['duplicate_of'] = primary
+    if output_path is not None:
+        result['variants'] = variants
+    result['time_saved'] = primary_result.get('processing_time') or 0.0
+    return result
+
+
+def _item_files(item):
+    return item if isinstance(item, tuple) else (item,)
+
+
+def _future_results(future, item):
+    try:
+        result = future.result()
+    except concurrent.futures.CancelledError:
+        return [make_result(file_path, 'cancelled', f"Task for {os.path.basename(file_path)} was cancelled.")
+                for file_path in _item_files(item)]
+    except Exception as exc:
+        return [make_result(file_path, 'fail', f"An unhandled exception occurred in a worker process for {os.path.basename(file_path)}: {exc}")
+                for file_path in _item_files(item)]
+    return result if isinstance(item, tuple) else [result]
+
+
+def _upcoming_files(scheduler):
+    for lane, item, cost in scheduler.upcoming():
+        files = _item_files(item)
+        for file_path in files:
+            yield lane, file_path, cost // len(files)
+
+
+def _io_stages(output_folder, options, notify):
+    # Optional prefetch readers and write-behind writers, sharing one per-device limit.
+    limiter = DeviceLimiter(options.get('io_device_limit', DEFAULT_DEVICE_LIMIT))
+    prefetcher = None
+    write_behind = None
+    if options.get('io_readers'):
+        max_mb = options.get('prefetch_max_mb') or DEFAULT_PREFETCH_MAX_MB
+        prefetcher = Prefetcher(options['source_folder'], options['io_readers'], mode=options.get('prefetch_mode') or DEFAULT_PREFETCH_MODE,
+                                max_bytes=int(max_mb * 1024 * 1024), limiter=limiter, scratch_folder=options.get('scratch_folder'),
+                                notify=notify)
+    if options.get('write_behind'):
+        write_behind = WriteBehind(output_folder, options.get('io_writers') or DEFAULT_IO_WRITERS, limiter=limiter,
+                                   scratch_folder=options.get('scratch_folder'))
+    return prefetcher, write_behind
+
+
+def warm_executor(executor, workers):
+    # Starts the worker processes before the first file arrives, so it does not pay for their startup.
+    for future in [executor.submit(os.getpid) for _ in range(workers)]:
+        future.result()
+    return executor
+
+
+def open_manifest(output_folder, options, files=None):
+    manifest = Manifest(output_folder, options['source_folder'], options)
+    pruned = []
+    if options.get('prune_deleted', False):
+        pruned = manifest.prune(files)
+    return manifest, pruned
+
+
+def process_files(files, output_folder, options, max_workers=None, executor=None, manifest=None,
+                  progress_callback=None, cancel_event=None, withdrawn=None):
+    # withdrawn, if given, is a set of file paths the caller no longer wants (e.g. a cluster lease
+    # that went to another host); it may grow from another thread while the batch runs.
+    cpu_budget = max_workers or options.get('cpu_budget') or os.cpu_count()
+    max_video_threads = options.get('max_video_threads', DEFAULT_MAX_VIDEO_THREADS)
+    if options.get('chunked_video', False):
+        # Chunked encodes split their threads across segments, so they scale past the per-video cap.
+        max_video_threads = cpu_budget
+    scheduler = LaneScheduler(cpu_budget=cpu_budget, max_video_threads=max_video_threads, memory_budget=_memory_budget(options),
+                              image_threads=_image_threads(options))
+    own_executor = executor is None
+    if own_executor:
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=scheduler.cpu_budget)
+    video_executor = concurrent.futures.ThreadPoolExecutor(max_workers=scheduler.cpu_budget)
+    supervisor = None
+    wait_timeout = CANCEL_POLL_INTERVAL if cancel_event is not None else None
+
+    # Futures report themselves here when they finish, so each completion costs O(1)
+    # instead of re-scanning every pending future.
+    completed = queue.Queue()
+    pending = {}
+    # Prefetch futures also report to completed, so a file whose read finishes wakes the loop.
+    prefetcher, write_behind = _io_stages(output_folder, options, completed.put)
+    ready = (lambda item: prefetcher.ready(_item_files(item))) if prefetcher is not None else None
+    task_output = write_behind.staging_root if write_behind is not None else output_folder
+    writes = set()
+    io_stall = 0.0
+    stalled_since = None
+    dedupe = DuplicateIndex() if options.get('deduplicate', True) else None
+    # A source may yield None when it has no file ready yet (e.g. FolderWatcher); it is asked again
+    # after the next completion or CANCEL_POLL_INTERVAL, whichever comes first.
+    files = iter(files)
+    scanning = True
+    idle = False
+    small_batch = []
+    small_batch_cost = 0
+    small_batch_memory = 0
+    withdrawing = set()
+
+    def is_withdrawn(file_path):
+        return withdrawn is not None and file_path in withdrawn
+
+    def finish(result):
+        if manifest is not None:
+            manifest.record(result)
+        finished = [result]
+        if dedupe is not None:
+            for duplicate in dedupe.finished(result):
+                duplicate = duplicate_result(duplicate, result['file_path'], result, output_folder, options)
+                if manifest is not None:
+                    manifest.record(duplicate)
+                finished.append(duplicate)
+        return finished
+
+    try:
+        cancelling = False
+        while True:
+            if not cancelling and cancel_event is not None and cancel_event.is_set():
+                cancelling = True
+                scanning = False
+                drained = [file_path for _, item in scheduler.drain() for file_path in _item_files(item)]
+                for file_path in small_batch + drained:
+                    yield make_result(file_path, 'cancelled', f"Cancelled {os.path.basename(file_path)} before it started.")
+                small_batch = []
+                for future in pending:
+                    future.cancel()
+                if supervisor is not None:
+                    supervisor.cancel_all()
+
+            # Keep a bounded window of queued work; the scan continues as tasks finish.
+            idle = False
+            while scanning and scheduler.queued() < SCAN_WINDOW:
+                file_path = next(files, _END_OF_FILES)
+                if file_path is _END_OF_FILES:
+                    scanning = False
+                    break
+                if file_path is None:
+                    idle = True
+                    break
+                if manifest is not None:
+                    result = manifest.check(file_path)
+                    if result is not None:
+                        yield result
+                        continue
+
+                lane, result = _lane_for(file_path, options)
+                if lane is None:
+                    yield result
+                    continue
+                cost = _file_cost(file_path)
+                if dedupe is not None:
+                    primary = dedupe.primary_for(file_path, cost, lane)
+                    if primary is not None:
+                        primary_result = dedupe.result_for(primary)
+                        if primary_result is None:
+                            dedupe.wait_for(primary, file_path)
+                            continue
+                        result = duplicate_result(file_path, primary, primary_result, output_folder, options)
+                        if manifest is not None:
+                            manifest.record(result)
+                        yield result
+                        continue
+                if lane == VIDEO_LANE:
+                    scheduler.add(lane, file_path, cost)
+                    continue
+                memory = estimate_image_memory(file_path, options)
+                if cost >= SMALL_IMAGE_BYTES:
+                    scheduler.add(lane, file_path, cost, memory)
+                    continue
+                small_batch.append(file_path)
+                small_batch_cost += cost
+                small_batch_memory = max(small_batch_memory, memory)
+                if len(small_batch) >= SMALL_BATCH_FILES:
+                    scheduler.add(lane, tuple(small_batch), small_batch_cost, small_batch_memory)
+                    small_batch, small_batch_cost, small_batch_memory = [], 0, 0
+            if (not scanning or idle) and small_batch:
+                scheduler.add(IMAGE_LANE, tuple(small_batch), small_batch_cost, small_batch_memory)
+                small_batch, small_batch_cost, small_batch_memory = [], 0, 0
+
+            if prefetcher is not None and not cancelling:
+                prefetcher.fill(_upcoming_files(scheduler))
+            for lane, item, threads, memory in scheduler.dispatch(ready):
+                if all(is_withdrawn(file_path) for file_path in _item_files(item)):
+                    scheduler.release(lane, threads, memory)
+                    for file_path in _item_files(item):
+                        result = make_result(file_path, 'cancelled', f"Withdrew {os.path.basename(file_path)} before it started.")
+                        if prefetcher is not None:
+                            prefetcher.finish(result)
+                        yield from finish(result)
+                    continue
+                task_files, task_options = list(_item_files(item)), options
+                if prefetcher is not None:
+                    task_files, task_source = prefetcher.task_source(task_files)
+                    if task_source != options['source_folder']:
+                        task_options = dict(options, source_folder=task_source)
+                if isinstance(item, tuple):
+                    future = executor.submit(process_image_batch, task_files, task_output, task_options)
+                elif lane == IMAGE_LANE:
+                    future = executor.submit(process_image, task_files[0], task_output, task_options)
+                else:
+                    if supervisor is None:
+                        supervisor = _start_supervisor(progress_callback)
+                    future = video_executor.submit(process_video, task_files[0], task_output, dict(task_options, video_threads=threads),
+                                                   runner=supervisor.runner(item))
+                pending[future] = (lane, item, threads, memory, time.monotonic())
+                future.add_done_callback(completed.put)
+            # Time the encoders had free slots but every job that could use them was still being read.
+            now = time.monotonic()
+            if stalled_since is not None:
+                io_stall += now - stalled_since
+            stalled_since = now if scheduler.waiting_on_io else None
+
+            if withdrawn and supervisor is not None:
+                # Running ffmpeg jobs can be stopped; running image workers finish and are discarded below.
+                for lane, item, *_ in list(pending.values()):
+                    if lane == VIDEO_LANE and item not in withdrawing and is_withdrawn(item):
+                        withdrawing.add(item)
+                        supervisor.cancel(item)
+
+            if not pending and not writes and not scanning and not scheduler.queued():
+                break
+
+            try:
+                done = [completed.get(timeout=CANCEL_POLL_INTERVAL if idle else wait_timeout)]
+            except queue.Empty:
+                continue
+            while True:
+                try:
+                    done.append(completed.get_nowait())
+                except queue.Empty:
+                    break
+            for future in done:
+                if future in writes:
+                    writes.discard(future)
+                    yield from finish(future.result())
+                    continue
+                if future not in pending:
+                    # A prefetch finished; its file is dispatched on the next pass.
+                    continue
+                lane, item, threads, memory, started = pending.pop(future)
+                scheduler.release(lane, threads, memory)
+                processing_time = (time.monotonic() - started) / len(_item_files(item))
+                for file_path, result in zip(_item_files(item), _future_results(future, item)):
+                    # Workers may have read a scratch copy; results always name the source file.
+                    result['file_path'] = file_path
+                    result['memory_estimate'] = memory
+                    result['peak_memory_in_flight'] = scheduler.peak_memory_in_flight
+                    result['processing_time'] = processing_time
+                    if prefetcher is not None:
+                        result['io_stall'] = io_stall
+                        prefetcher.finish(result)
+                    if is_withdrawn(file_path):
+                        withdrawing.discard(file_path)
+                        result = make_result(file_path, 'cancelled', f"Withdrew {os.path.basename(file_path)}; its result was discarded.",
+                                             result.get('original_size', 0))
+                    if write_behind is not None and write_behind.needs_write(result):
+                        write = write_behind.submit(result)
+                        writes.add(write)
+                        write.add_done_callback(completed.put)
+                        continue
+                    yield from finish(result)
+
+        if dedupe is not None:
+            # Copies of files that were cancelled before they ran.
+            for primary, file_path in dedupe.waiting():
+                yield make_result(file_path, 'cancelled', f"Cancelled {os.path.basename(file_path)} (duplicate of {os.path.basename(primary)}).")
+    finally:
+        for future in pending:
+            future.cancel()
+        if pending and supervisor is not None:
+            supervisor.cancel_all()
+        video_executor.shutdown(wait=True, cancel_futures=True)
+        if supervisor is not None:
+            supervisor.shutdown()
+        if own_executor:
+            executor.shutdown(wait=True, cancel_futures=True)
+        if prefetcher is not None:
+            prefetcher.close()
+        if write_behind is not None:
+            write_behind.close()
+        if manifest is not None:
+            manifest.commit()
+
+
+def run_batch(source_folder, options=None, output_folder=None, max_workers=None, executor=None,
+              progress_callback=None, cancel_event=None):
+    if output_folder is None:
+        output_folder = default_output_folder(source_folder)
+    os.makedirs(output_folder, exist_ok=True)
+    options = build_options(source_folder, **(options or {}))
+
+    files = FileScanner(source_folder, output_folder)
+    manifest, _ = open_manifest(output_folder, options)
+    try:
+        yield from process_files(files, output_folder, options, max_workers=max_workers, executor=executor, manifest=manifest,
+                                 progress_callback=progress_callback, cancel_event=cancel_event)
+    finally:
+        manifest.close()
+
+
+class BatchStats:
+    def __init__(self, total_files=0):
+        self.total_files = total_files
+        # True while the scanner is still discovering files, so total_files is a lower bound.
+        self.scanning = False
+        # Set by front ends that run a FolderWatcher; settling is the number of files still being written.
+        self.watching = False
+        self.settling = 0
+        self.recent = collections.deque()
+        self.files_processed = 0
+        self.total_original_size = 0
+        self.total_compressed_size = 0
+        self.status_counts = {}
+        self.planner_predictions = 0
+        self.planner_hits = 0
+        self.planner_skips = 0
+        # Files left on the default lossless-first order; they are not predictions to score.
+        self.planner_defaults = 0
+        self.planner_wasted_time = 0.0
+        # Per WEBP mode: pixels whose encode the planner avoided, and the seconds and pixels of
+        # the full encodes that did run, which price the avoided ones.
+        self.planner_skipped_pixels = {'lossless': 0, 'lossy': 0}
+        self.encode_seconds = {'lossless': 0.0, 'lossy': 0.0}
+        self.encode_pixels = {'lossless': 0, 'lossy': 0}
+        self.video_actions = {}
+        self.encoder_wins = {}
+        self.worker_counts = {}
+        self.retried = 0
+        self.peak_memory_in_flight = 0
+        self.duplicates = 0
+        self.duplicate_bytes = 0
+        self.duplicate_time_saved = 0.0
+        self.stage_times = {}
+        self.file_times = StageHistogram()
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.io_wait = 0.0
+        self.io_stall = 0.0
+        self.start_time = None
+        self.end_time = None
+
+    def start(self):
+        self.start_time = time.time()
+        self.end_time = None
+
+    def finish(self):
+        self.end_time = time.time()
+
+    def add(self, result):
+        status = result.get('status', 'unknown')
+        self.files_processed += 1
+        now = time.monotonic()
+        self.recent.append((now, result.get('original_size', 0)))
+        self._trim_recent(now)
+        self.status_counts[status] = self.status_counts.get(status, 0) + 1
+        self.total_original_size += result.get('original_size', 0)
+        if status in COUNTED_COMPRESSED_STATUSES:
+            self.total_compressed_size += result.get('compressed_size', 0)
+
+        self.peak_memory_in_flight = max(self.peak_memory_in_flight, result.get('peak_memory_in_flight', 0))
+
+        timings = result.get('timings')
+        if timings:
+            for stage, seconds in timings.items():
+                self.stage_times.setdefault(stage, StageHistogram()).add(seconds)
+            self.file_times.add(result_time(result))
+        self.bytes_read += result.get('bytes_read', 0)
+        self.bytes_written += result.get('bytes_written', 0)
+        self.io_wait += result.get('io_wait', 0.0)
+        self.io_stall = max(self.io_stall, result.get('io_stall', 0.0))
+
+        if result.get('duplicate_of'):
+            self.duplicates += 1
+            self.duplicate_bytes += result.get('original_size', 0)
+            self.duplicate_time_saved += result.get('time_saved', 0.0)
+
+        worker = result.get('worker')
+        if worker:
+            self.worker_counts[worker] = self.worker_counts.get(worker, 0) + 1
+            self.retried += 1 if result.get('attempts', 1) > 1 else 0
+
+        encoder = result.get('encoder')
+        if encoder and status in ('success', 'success_lossy'):
+            self.encoder_wins[encoder] = self.encoder_wins.get(encoder, 0) + 1
+
+        video_action = result.get('video_action')
+        if video_action:
+            self.video_actions[video_action] = self.video_actions.get(video_action, 0) + 1
+
+        plan = result.get('plan')
+        if plan:
+            self.planner_wasted_time += plan['wasted_time']
+            for mode in plan['skipped']:
+                self.planner_skipped_pixels[mode] += plan['pixels']
+            for mode in self.encode_seconds:
+                if mode in (result.get('timings') or {}):
+                    self.encode_seconds[mode] += result['timings'][mode]
+                    self.encode_pixels[mode] += plan['pixels']
+            if plan['predicted'] == 'skip':
+                self.planner_skips += 1
+            elif plan['predicted'] == 'lossless':
+                self.planner_defaults += 1
+            else:
+                self.planner_predictions += 1
+                self.planner_hits += 1 if plan['hit'] else 0
+
+    def _trim_recent(self, now):
+        while self.recent and now - self.recent[0][0] > THROUGHPUT_WINDOW:
+            self.recent.popleft()
+
+    def recent_throughput(self):
+        # Files per minute and bytes per second over the last THROUGHPUT_WINDOW seconds (or since the start).
+        self._trim_recent(time.monotonic())
+        window = min(THROUGHPUT_WINDOW, self.elapsed or 0.0)
+        if not window:
+            return 0.0, 0.0
+        return len(self.recent) / window * 60, sum(size for _, size in self.recent) / window
+
+    @property
+    def queued(self):
+        return max(0, self.total_files - self.files_processed)
+
+    @property
+    def elapsed(self):
+        if self.start_time is None:
+            return None
+        return (self.end_time or time.time()) - self.start_time
+
+    @property
+    def planner_time_saved(self):
+        saved = -self.planner_wasted_time
+        for mode, pixels in self.planner_skipped_pixels.items():
+            if pixels and self.encode_pixels[mode]:
+                saved += pixels * self.encode_seconds[mode] / self.encode_pixels[mode]
+        return saved
+
+    @property
+    def planner_accuracy(self):
+        if not self.planner_predictions:
+            return 0.0
+        return self.planner_hits / self.planner_predictions * 100
+
+    @property
+    def failed(self):
+        return self.status_counts.get('fail', 0)
+
+    def summary_text(self, show_elapsed=True):
+        saved = max(0, self.total_original_size - self.total_compressed_size)
+        savings_percent = (saved / self.total_original_size * 100) if self.total_original_size > 0 else 0
+
+        stats_text = f"Files Processed: {self.files_processed} / {self.total_files}"
+        stats_text += "+ (scanning...)\n" if self.scanning else "\n"
+        stats_text += f"Total Original Size (from {self.files_processed} files): {format_bytes(self.total_original_size)}\n"
+        stats_text += f"Total Compressed Size (from successful): {format_bytes(self.total_compressed_size)}\n"
+        stats_text += f"Data Saved: {format_bytes(saved)} ({savings_percent:.1f}%)"
+
+        if self.status_counts:
+            counts = ", ".join(f"{count} {status.replace('_', ' ')}" for status, count in sorted(self.status_counts.items()))
+            stats_text += f"\nResults: {counts}"
+
+        if self.planner_predictions or self.planner_skips or self.planner_defaults:
+            stats_text += f"\nEncode Planner: lossy-first {self.planner_accuracy:.1f}% correct ({self.planner_hits}/{self.planner_predictions})"
+            stats_text += f", {self.planner_skips} predicted no savings, {self.planner_defaults} default order"
+            stats_text += f", est. {self.planner_time_saved:.1f} s saved"
+
+        if len(self.encoder_wins) > 1 or set(self.encoder_wins) - {'webp'}:
+            wins = ", ".join(f"{count} {encoder}" for encoder, count in sorted(self.encoder_wins.items()))
+            stats_text += f"\nEncoders: {wins}"
+
+        if self.worker_counts:
+            workers = ", ".join(f"{worker} {count}" for worker, count in sorted(self.worker_counts.items()))
+            stats_text += f"\nWorkers: {workers}"
+            if self.retried:
+                stats_text += f" ({self.retried} files retried after a lost lease)"
+
+        if self.duplicates:
+            stats_text += f"\nDuplicates: {self.duplicates} files ({format_bytes(self.duplicate_bytes)}) reused an earlier result"
+            stats_text += f", est. {self.duplicate_time_saved:.1f} s saved"
+
+        if self.video_actions:
+            actions = ", ".join(f"{count} {action.replace('_', ' ')}" for action, count in sorted(self.video_actions.items()))
+            stats_text += f"\nVideo Actions: {actions}"
+
+        if self.file_times.count:
+            stages = ", ".join(f"{stage} {format_seconds(hist.percentile(50))}/{format_seconds(hist.percentile(95))}"
+                               for stage, hist in self.stage_times.items())
+            stats_text += f"\nStage Times (p50/p95): {stages}"
+            stats_text += f"\nFile Times: {self.file_times.summary_text()}"
+            stats_text += f"\nI/O: {format_bytes(self.bytes_read)} read, {format_bytes(self.bytes_written)} written"
+            if self.io_wait or self.io_stall:
+                stats_text += (f", {format_seconds(self.io_wait)} waiting for device slots,"
+                               f" encoders idle {format_seconds(self.io_stall)} waiting for prefetch")
+
+        if self.peak_memory_in_flight:
+            stats_text += f"\nPeak Image Memory (estimated): {format_bytes(self.peak_memory_in_flight)}"
+
+        if self.watching:
+            files_per_minute, bytes_per_second = self.recent_throughput()
+            stats_text += (f"\nWatching: {self.settling} settling, {self.queued} queued, {files_per_minute:.1f} files/min"
+                           f" ({format_bytes(bytes_per_second)}/s) over the last {THROUGHPUT_WINDOW:.0f} s")
+
+        if show_elapsed and self.elapsed is not None:
+            stats_text += f"\nElapsed Time: {self.elapsed:.1f} seconds"
+        return stats_text
+
+    def as_dict(self):
+        return {
+            'total_files': self.total_files,
+            'files_processed': self.files_processed,
+            'total_original_size': self.total_original_size,
+            'total_compressed_size': self.total_compressed_size,
+            'status_counts': dict(self.status_counts),
+            'video_actions': dict(self.video_actions),
+            'encoder_wins': dict(self.encoder_wins),
+            'workers': {'files': dict(self.worker_counts), 'retried': self.retried},
+            'peak_memory_in_flight': self.peak_memory_in_flight,
+            'duplicates': {
+                'files': self.duplicates,
+                'bytes': self.duplicate_bytes,
+                'estimated_time_saved': self.duplicate_time_saved,
+            },
+            'planner': {
+                'predictions': self.planner_predictions,
+                'hits': self.planner_hits,
+                'accuracy_percent': self.planner_accuracy,
+                'predicted_no_savings': self.planner_skips,
+                'default_order': self.planner_defaults,
+                'estimated_time_saved': self.planner_time_saved,
+            },
+            'stage_times': {stage: hist.as_dict() for stage, hist in self.stage_times.items()},
+            'file_times': self.file_times.as_dict(),
+            'bytes_read': self.bytes_read,
+            'bytes_written': self.bytes_written,
+            'io_wait': self.io_wait,
+            'io_stall': self.io_stall,
+            'elapsed': self.elapsed,
+            **({'watch': self.watch_dict()} if self.watching else {}),
+        }
+
+    def watch_dict(self):
+        files_per_minute, bytes_per_second = self.recent_throughput()
+        return {
+            'settling': self.settling,
+            'queued': self.queued,
+            'files_per_minute': files_per_minute,
+            'bytes_per_second': bytes_per_second,
+            'window': THROUGHPUT_WINDOW,
+        }
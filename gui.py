@@ -0,0 +1,581 @@
+import tkinter as tk
+from tkinter import filedialog, scrolledtext, ttk, messagebox
+import os
+import subprocess
+import threading
+import queue
+import time
+import concurrent.futures
+
+# The engine (and through it Pillow) is imported on first use, off the path to the first window.
+from defaults import DEFAULT_RESIZE_PERCENTAGE, DEFAULT_RESIZE_THRESHOLD, WEBP_LOSSY_FALLBACK_QUALITY
+from quality import DEFAULT_LOSSY_TARGETS, quality_metrics_available
+from report import RunReport, default_report_paths
+
+UI_REFRESH_MS = 100
+# Upper bound on results handled per UI refresh so a burst of completions cannot stall the window.
+MAX_RESULTS_PER_REFRESH = 5000
+# The log view keeps only the most recent lines; the full log is written to LOG_FILE_NAME.
+LOG_VIEW_LINES = 2000
+LOG_FILE_NAME = "compression_log.txt"
+
+LOSSY_TARGET_LABELS = {
+    f"Fixed (Q={WEBP_LOSSY_FALLBACK_QUALITY})": 'fixed',
+    "Target SSIM": 'ssim',
+    "Target PSNR (dB)": 'psnr',
+    "Target Size (KB)": 'size',
+}
+
+class CompressorApp(tk.Tk):
+    def __init__(self, launch_time=None):
+        super().__init__()
+
+        self.title("Image & Video Compressor")
+        self.geometry("800x970")
+        self.style = ttk.Style(self)
+        self.style.theme_use('clam')
+
+        self.source_folder = ""
+        self.stats = None
+        self.results_queue = queue.Queue()
+        self.worker_thread = None
+        self.cancel_event = None
+        self.scanner = None
+        self.report = RunReport()
+        self.report_json_path = None
+        self.video_progress = {}
+        self.pending_log_lines = []
+        self.log_flush_scheduled = False
+        self.log_file = None
+        self.launch_time = launch_time if launch_time is not None else time.perf_counter()
+        self.run_started = None
+        self.first_result_logged = False
+        # The worker pool is started in the background once the window is up and reused by every run.
+        self.executor = None
+        self.executor_lock = threading.Lock()
+        self.startup_queue = queue.Queue()
+
+        self.enable_resize_var = tk.BooleanVar(value=False)
+        self.lossy_target_mode_var = tk.StringVar(value=next(iter(LOSSY_TARGET_LABELS)))
+        self.lossy_target_value_var = tk.StringVar(value="")
+        self.resize_percent_var = tk.StringVar(value=str(DEFAULT_RESIZE_PERCENTAGE))
+        self.resize_threshold_var = tk.StringVar(value=str(DEFAULT_RESIZE_THRESHOLD))
+        self.size_ladder_var = tk.StringVar(value="")
+
+
+        self.create_widgets()
+        self.update_stats_display()
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+
+        self.after_idle(self.start_background_tasks)
+
+    def create_widgets(self):
+        folder_frame = ttk.LabelFrame(self, text="Folders", padding="10")
+        folder_frame.grid(row=0, column=0, columnspan=2, padx=10, pady=5, sticky="ew")
+
+        ttk.Label(folder_frame, text="Source Folder:").grid(row=0, column=0, padx=5, pady=5, sticky="w")
+        self.folder_entry = ttk.Entry(folder_frame, width=50)
+        self.folder_entry.grid(row=0, column=1, padx=5, pady=5, sticky="ew")
+        ttk.Button(folder_frame, text="Browse", command=self.select_folder).grid(row=0, column=2, padx=5, pady=5)
+
+        folder_frame.columnconfigure(1, weight=1)
+
+        options_frame = ttk.LabelFrame(self, text="Options", padding="10")
+        options_frame.grid(row=1, column=0, padx=10, pady=5, sticky="nsew")
+
+        ttk.Label(options_frame, text="Image Options:").grid(row=0, column=0, sticky="w", pady=(0, 2), columnspan=2)
+        self.compress_images_webp_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(options_frame, text=f"Compress Images (Lossless WEBP or Lossy Q={WEBP_LOSSY_FALLBACK_QUALITY} fallback if larger)", variable=self.compress_images_webp_var).grid(row=1, column=0, sticky="w", padx=10, pady=2, columnspan=2)
+
+        self.remove_image_metadata_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(options_frame, text="Remove Metadata from Images", variable=self.remove_image_metadata_var).grid(row=2, column=0, sticky="w", padx=10, pady=2, columnspan=2)
+
+        self.use_planner_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(options_frame, text="Predict Best WEBP Mode (skip redundant encodes)", variable=self.use_planner_var).grid(row=3, column=0, sticky="w", padx=10, pady=2, columnspan=2)
+
+        self.race_formats_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(options_frame, text="Also Try Optimized JPEG/PNG (keep smallest)", variable=self.race_formats_var).grid(row=4, column=0, sticky="w", padx=10, pady=2, columnspan=2)
+
+        ttk.Label(options_frame, text="Lossy Quality:").grid(row=5, column=0, sticky="e", padx=(20, 0), pady=2)
+        self.lossy_target_combo = ttk.Combobox(options_frame, textvariable=self.lossy_target_mode_var, values=list(LOSSY_TARGET_LABELS), state='readonly', width=18)
+        self.lossy_target_combo.grid(row=5, column=1, sticky="w", padx=(0, 5), pady=2)
+        self.lossy_target_combo.bind('<<ComboboxSelected>>', self.on_lossy_target_selected)
+
+        ttk.Label(options_frame, text="Target Value:").grid(row=6, column=0, sticky="e", padx=(20, 0), pady=2)
+        self.lossy_target_entry = ttk.Entry(options_frame, textvariable=self.lossy_target_value_var, width=7)
+        self.lossy_target_entry.grid(row=6, column=1, sticky="w", padx=(0, 5), pady=2)
+        self.on_lossy_target_selected()
+
+        self.enable_resize_check = ttk.Checkbutton(options_frame, text="Resize Large Images", variable=self.enable_resize_var, command=self.toggle_resize_options)
+        self.enable_resize_check.grid(row=7, column=0, sticky="w", padx=10, pady=(5,2), columnspan=2)
+
+        self.resize_percent_label = ttk.Label(options_frame, text="Percentage (%):")
+        self.resize_percent_label.grid(row=8, column=0, sticky="e", padx=(20, 0), pady=2)
+
+        self.resize_percent_entry = ttk.Entry(options_frame, textvariable=self.resize_percent_var, width=5)
+        self.resize_percent_entry.grid(row=8, column=1, sticky="w", padx=(0, 5), pady=2)
+
+        self.resize_threshold_label = ttk.Label(options_frame, text="Threshold (px, max dim >):")
+        self.resize_threshold_label.grid(row=9, column=0, sticky="e", padx=(20, 0), pady=2)
+
+        self.resize_threshold_entry = ttk.Entry(options_frame, textvariable=self.resize_threshold_var, width=7)
+        self.resize_threshold_entry.grid(row=9, column=1, sticky="w", padx=(0, 5), pady=2)
+
+        ttk.Label(options_frame, text="Extra Widths (px, e.g. 320,640):").grid(row=10, column=0, sticky="e", padx=(20, 0), pady=2)
+        ttk.Entry(options_frame, textvariable=self.size_ladder_var, width=14).grid(row=10, column=1, sticky="w", padx=(0, 5), pady=2)
+
+        self.toggle_resize_options()
+
+        ttk.Label(options_frame, text="Video Options:").grid(row=11, column=0, sticky="w", pady=(10, 2), columnspan=2)
+        self.remove_video_audio_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(options_frame, text="Remove Audio from Videos", variable=self.remove_video_audio_var).grid(row=12, column=0, sticky="w", padx=10, pady=2, columnspan=2)
+        self.remove_video_metadata_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(options_frame, text="Remove Metadata from Videos", variable=self.remove_video_metadata_var).grid(row=13, column=0, sticky="w", padx=10, pady=2, columnspan=2)
+
+        self.analyze_video_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(options_frame, text="Skip/Remux Videos That Are Already Efficient", variable=self.analyze_video_var).grid(row=14, column=0, sticky="w", padx=10, pady=2, columnspan=2)
+        self.chunked_video_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(options_frame, text="Split Long Videos Into Parallel Segments", variable=self.chunked_video_var).grid(row=15, column=0, sticky="w", padx=10, pady=2, columnspan=2)
+
+        ttk.Label(options_frame, text="Run Options:").grid(row=16, column=0, sticky="w", pady=(10, 2), columnspan=2)
+        self.incremental_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(options_frame, text="Skip Files Unchanged Since Last Run", variable=self.incremental_var).grid(row=17, column=0, sticky="w", padx=10, pady=2, columnspan=2)
+        self.prune_deleted_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(options_frame, text="Delete Outputs of Removed Source Files", variable=self.prune_deleted_var).grid(row=18, column=0, sticky="w", padx=10, pady=2, columnspan=2)
+        self.deduplicate_var = tk.BooleanVar(value=True)
+        ttk.Checkbutton(options_frame, text="Reuse Output for Identical Files (hardlink or copy)", variable=self.deduplicate_var).grid(row=19, column=0, sticky="w", padx=10, pady=2, columnspan=2)
+        self.watch_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(options_frame, text="Keep Watching for New Files (stop with Cancel)", variable=self.watch_var).grid(row=20, column=0, sticky="w", padx=10, pady=2, columnspan=2)
+
+        options_frame.columnconfigure(1, weight=1)
+
+        control_frame = ttk.Frame(self, padding="10")
+        control_frame.grid(row=1, column=1, padx=10, pady=5, sticky="nsew")
+
+        self.start_button = ttk.Button(control_frame, text="Start Compression", command=self.start_compression)
+        self.start_button.grid(row=0, column=0, pady=10)
+
+        self.cancel_button = ttk.Button(control_frame, text="Cancel", command=self.cancel_compression, state='disabled')
+        self.cancel_button.grid(row=0, column=1, pady=10, sticky="w")
+
+        ttk.Label(control_frame, text="Progress:").grid(row=1, column=0, sticky="w")
+        self.progress_bar = ttk.Progressbar(control_frame, orient="horizontal", length=300, mode="determinate")
+        self.progress_bar.grid(row=1, column=1, sticky="ew", padx=5)
+
+        self.video_progress_label = ttk.Label(control_frame, text="", wraplength=320, justify="left")
+        self.video_progress_label.grid(row=2, column=0, columnspan=2, sticky="w", pady=(5, 0))
+
+        control_frame.columnconfigure(1, weight=1)
+
+        stats_frame = ttk.LabelFrame(self, text="Statistics", padding="10")
+        stats_frame.grid(row=2, column=0, columnspan=2, padx=10, pady=5, sticky="ew")
+
+        self.stats_label = ttk.Label(stats_frame, text="Processing statistics will appear here.")
+        self.stats_label.grid(row=0, column=0, sticky="w")
+        stats_frame.columnconfigure(0, weight=1)
+
+
+        log_frame = ttk.LabelFrame(self, text="Logs", padding="10")
+        log_frame.grid(row=3, column=0, columnspan=2, padx=10, pady=5, sticky="nsew")
+
+        self.log_text = scrolledtext.ScrolledText(log_frame, state='disabled', height=10, wrap='word')
+        self.log_text.grid(row=0, column=0, sticky="nsew")
+
+        log_frame.columnconfigure(0, weight=1)
+        log_frame.rowconfigure(0, weight=1)
+
+        self.columnconfigure(0, weight=1)
+        self.columnconfigure(1, weight=1)
+        self.rowconfigure(3, weight=1)
+
+    def on_lossy_target_selected(self, event=None):
+        target_mode = LOSSY_TARGET_LABELS[self.lossy_target_mode_var.get()]
+        if target_mode == 'fixed':
+            self.lossy_target_value_var.set("")
+            self.lossy_target_entry.config(state='disabled')
+        else:
+            self.lossy_target_value_var.set(str(DEFAULT_LOSSY_TARGETS[target_mode]))
+            self.lossy_target_entry.config(state='normal')
+
+    def toggle_resize_options(self):
+        state = 'normal' if self.enable_resize_var.get() else 'disabled'
+        self.resize_percent_entry.config(state=state)
+        self.resize_threshold_entry.config(state=state)
+
+    def log_message(self, message):
+        if self.log_file is not None:
+            self.log_file.write(message + "\n")
+        self.pending_log_lines.append(message)
+        if not self.log_flush_scheduled:
+            self.log_flush_scheduled = True
+            self.after(UI_REFRESH_MS, self.flush_log)
+
+    def flush_log(self):
+        self.log_flush_scheduled = False
+        lines = self.pending_log_lines[-LOG_VIEW_LINES:]
+        self.pending_log_lines = []
+        if not lines:
+            return
+        self.log_text.config(state='normal')
+        self.log_text.insert(tk.END, "\n".join(lines) + "\n")
+        line_count = int(self.log_text.index('end-1c').split('.')[0]) - 1
+        if line_count > LOG_VIEW_LINES:
+            self.log_text.delete('1.0', f"{line_count - LOG_VIEW_LINES + 1}.0")
+        self.log_text.see(tk.END)
+        self.log_text.config(state='disabled')
+
+    def open_log_file(self, output_folder):
+        log_path = os.path.join(output_folder, LOG_FILE_NAME)
+        try:
+            self.log_file = open(log_path, 'w', encoding='utf-8')
+        except OSError as e:
+            self.log_file = None
+            self.log_message(f"Warning: Could not open log file {log_path}: {e}")
+            return
+        self.log_message(f"Full log: {log_path}")
+
+    def open_report(self, output_folder):
+        self.report.close()
+        self.report_json_path, report_csv_path = default_report_paths(output_folder)
+        try:
+            self.report = RunReport(csv_path=report_csv_path)
+        except OSError as e:
+            self.report = RunReport()
+            self.log_message(f"Warning: Could not open run report {report_csv_path}: {e}")
+
+    def write_report(self):
+        self.report.close()
+        try:
+            self.report.write_json(self.report_json_path, self.stats)
+            self.log_message(f"Run report: {self.report_json_path}")
+        except OSError as e:
+            self.log_message(f"Warning: Could not write run report {self.report_json_path}: {e}")
+
+    def close_log_file(self):
+        if self.log_file is not None:
+            self.log_file.close()
+            self.log_file = None
+
+    def start_background_tasks(self):
+        self.log_message(f"Window ready {(time.perf_counter() - self.launch_time) * 1000:.0f} ms after launch.")
+        threading.Thread(target=self.warm_up, daemon=True).start()
+        self.after(UI_REFRESH_MS, self.check_startup_queue)
+
+    def warm_up(self):
+        # Runs off the UI thread: the ffmpeg check, the engine imports and worker startup no longer delay the window.
+        self.startup_queue.put(self.check_ffmpeg())
+        started = time.perf_counter()
+        try:
+            self.get_executor()
+            self.startup_queue.put(f"{os.cpu_count() or 1} worker processes ready in {(time.perf_counter() - started) * 1000:.0f} ms.")
+        except Exception as exc:
+            self.startup_queue.put(f"Warning: could not start worker processes in advance: {exc}")
+        self.startup_queue.put(None)
+
+    def check_startup_queue(self):
+        while True:
+            try:
+                message = self.startup_queue.get_nowait()
+            except queue.Empty:
+                self.after(UI_REFRESH_MS, self.check_startup_queue)
+                return
+            if message is None:
+                return
+            self.log_message(message)
+
+    def check_ffmpeg(self):
+         try:
+             subprocess.run(['ffmpeg', '-version'], check=True, capture_output=True)
+             return "ffmpeg found."
+         except (FileNotFoundError, subprocess.CalledProcessError):
+             print("ffmpeg not found warning displayed.")
+             return "Warning: ffmpeg not found. Video compression will not work. Please install it and ensure it's in your system's PATH."
+
+    def get_executor(self):
+        # Returns the shared pool, replacing it if a crashed worker left it broken.
+        with self.executor_lock:
+            if self.executor is not None:
+                try:
+                    self.executor.submit(os.getpid).result()
+                except concurrent.futures.process.BrokenProcessPool:
+                    self.executor.shutdown(wait=False, cancel_futures=True)
+                    self.executor = None
+            if self.executor is None:
+                from engine import warm_executor
+                workers = os.cpu_count() or 1
+                self.executor = warm_executor(concurrent.futures.ProcessPoolExecutor(max_workers=workers), workers)
+            return self.executor
+
+    def on_close(self):
+        if self.cancel_event is not None:
+            self.cancel_event.set()
+        with self.executor_lock:
+            if self.executor is not None:
+                self.executor.shutdown(wait=False, cancel_futures=True)
+                self.executor = None
+        self.close_log_file()
+        self.destroy()
+
+    def select_folder(self):
+        folder_selected = filedialog.askdirectory()
+        if folder_selected:
+            self.source_folder = folder_selected
+            self.folder_entry.delete(0, tk.END)
+            self.folder_entry.insert(0, self.source_folder)
+            self.log_message(f"Source folder selected: {self.source_folder}")
+
+    def start_compression(self):
+        from engine import BatchStats, FileScanner, build_options, default_output_folder
+        from watcher import FolderWatcher
+        self.source_folder = self.folder_entry.get()
+        if not self.source_folder or not os.path.isdir(self.source_folder):
+            messagebox.showwarning("Invalid Folder", "Please select a valid source folder.")
+            self.log_message("Operation failed: Invalid source folder.")
+            return
+
+        resize_percentage = DEFAULT_RESIZE_PERCENTAGE
+        resize_threshold = DEFAULT_RESIZE_THRESHOLD
+        enable_resize = self.enable_resize_var.get()
+
+        if enable_resize:
+            try:
+                resize_percentage = float(self.resize_percent_var.get())
+                if not (0 < resize_percentage < 100):
+                     messagebox.showwarning("Invalid Input", "Resize percentage must be between 0 and 100.")
+                     return
+            except ValueError:
+                messagebox.showwarning("Invalid Input", "Resize percentage must be a number.")
+                return
+
+            try:
+                resize_threshold = int(self.resize_threshold_var.get())
+                if resize_threshold <= 0:
+                     messagebox.showwarning("Invalid Input", "Resize threshold must be a positive integer.")
+                     return
+            except ValueError:
+                messagebox.showwarning("Invalid Input", "Resize threshold must be an integer.")
+                return
+
+        size_ladder = None
+        if self.size_ladder_var.get().strip():
+            try:
+                size_ladder = sorted({int(width) for width in self.size_ladder_var.get().replace(' ', '').split(',') if width})
+                if any(width <= 0 for width in size_ladder):
+                     messagebox.showwarning("Invalid Input", "Extra widths must be positive integers.")
+                     return
+            except ValueError:
+                messagebox.showwarning("Invalid Input", "Extra widths must be comma-separated integers.")
+                return
+
+        lossy_target_mode = LOSSY_TARGET_LABELS[self.lossy_target_mode_var.get()]
+        lossy_target_value = None
+        if lossy_target_mode != 'fixed':
+            if lossy_target_mode in ('ssim', 'psnr') and not quality_metrics_available():
+                messagebox.showwarning("Missing Dependency", "SSIM/PSNR quality targets require NumPy (pip install numpy).")
+                return
+            try:
+                lossy_target_value = float(self.lossy_target_value_var.get())
+                if lossy_target_value <= 0 or (lossy_target_mode == 'ssim' and lossy_target_value > 1):
+                     messagebox.showwarning("Invalid Input", "Lossy quality target is out of range.")
+                     return
+            except ValueError:
+                messagebox.showwarning("Invalid Input", "Lossy quality target must be a number.")
+                return
+
+        output_folder = default_output_folder(self.source_folder)
+
+        try:
+            os.makedirs(output_folder, exist_ok=True)
+            self.log_message(f"Output folder created/ensured: {output_folder}")
+        except Exception as e:
+            messagebox.showerror("Error", f"Could not create output folder: {e}")
+            self.log_message(f"Operation failed: Could not create output folder {output_folder}. Error: {e}")
+            return
+
+        self.close_log_file()
+        self.open_log_file(output_folder)
+        self.open_report(output_folder)
+        self.cancel_event = threading.Event()
+        self.stats = BatchStats()
+        self.stats.scanning = True
+        if self.watch_var.get():
+            self.scanner = FolderWatcher(self.source_folder, output_folder, stop_event=self.cancel_event)
+            self.stats.watching = True
+            self.log_message(f"Watching for new files ({self.scanner.backend}); press Cancel to stop.")
+        else:
+            self.log_message("Scanning for supported files (processing starts while the scan continues)...")
+            self.scanner = FileScanner(self.source_folder, output_folder)
+        image_compression_enabled = self.compress_images_webp_var.get()
+
+        self.progress_bar.config(maximum=1, value=0)
+        self.start_button.config(state='disabled')
+
+        self.stats.start()
+        self.run_started = time.perf_counter()
+        self.first_result_logged = False
+        self.update_stats_display()
+
+
+        options = build_options(
+            self.source_folder,
+            compress_images_webp=image_compression_enabled,
+            remove_image_metadata=self.remove_image_metadata_var.get(),
+            use_planner=self.use_planner_var.get(),
+            lossy_target_mode=lossy_target_mode,
+            lossy_target_value=lossy_target_value,
+            enable_resize=enable_resize,
+            resize_percentage=resize_percentage,
+            resize_threshold=resize_threshold,
+            size_ladder=size_ladder or None,
+            output_formats=['jpeg', 'png'] if self.race_formats_var.get() else None,
+            remove_video_audio=self.remove_video_audio_var.get(),
+            remove_video_metadata=self.remove_video_metadata_var.get(),
+            analyze_video=self.analyze_video_var.get(),
+            chunked_video=self.chunked_video_var.get(),
+            incremental=self.incremental_var.get(),
+            prune_deleted=self.prune_deleted_var.get(),
+            deduplicate=self.deduplicate_var.get(),
+        )
+
+        self.results_queue = queue.Queue()
+        self.video_progress = {}
+        self.worker_thread = threading.Thread(
+            target=self.run_engine,
+            args=(self.scanner, output_folder, options, self.results_queue, self.cancel_event),
+            daemon=True,
+        )
+        self.worker_thread.start()
+        self.cancel_button.config(state='normal')
+
+        self.after(UI_REFRESH_MS, self.check_results_queue)
+
+    def cancel_compression(self):
+        if self.cancel_event is not None and not self.cancel_event.is_set():
+            self.cancel_event.set()
+            self.cancel_button.config(state='disabled')
+            self.log_message("Cancelling: waiting for running tasks to stop...")
+
+    def run_engine(self, files, output_folder, options, results_queue, cancel_event):
+        from engine import open_manifest, process_files
+        from watcher import FolderWatcher
+        def on_progress(progress):
+            results_queue.put({'status': 'engine_progress', 'progress': progress})
+
+        try:
+            manifest, pruned = open_manifest(output_folder, options)
+            if pruned:
+                results_queue.put({'status': 'engine_log', 'message': f"Pruned {len(pruned)} outputs of deleted source files."})
+            try:
+                for result in process_files(files, output_folder, options, executor=self.get_executor(), manifest=manifest,
+                                            progress_callback=on_progress, cancel_event=cancel_event):
+                    results_queue.put(result)
+            finally:
+                manifest.close()
+                if isinstance(files, FolderWatcher):
+                    files.close()
+        except Exception as exc:
+            results_queue.put({'status': 'engine_error', 'message': str(exc)})
+        results_queue.put(None)
+
+    def check_results_queue(self):
+        # Runs at a fixed rate: drain what the engine produced since the last refresh, then
+        # redraw the progress bar and statistics once for the whole batch of results.
+        from engine import format_result
+        finished = False
+        changed = False
+        for _ in range(MAX_RESULTS_PER_REFRESH):
+            try:
+                result = self.results_queue.get_nowait()
+            except queue.Empty:
+                break
+
+            if result is None:
+                finished = True
+                break
+            if result.get('status') == 'engine_error':
+                self.log_message(f"[CRITICAL ERROR] Compression engine stopped: {result.get('message')}")
+                continue
+            if result.get('status') == 'engine_log':
+                self.log_message(result.get('message'))
+                continue
+            if result.get('status') == 'engine_progress':
+                progress = result['progress']
+                self.video_progress[progress['file_path']] = progress
+                changed = True
+                continue
+
+            self.video_progress.pop(result.get('file_path'), None)
+            if not self.first_result_logged:
+                self.first_result_logged = True
+                self.log_message(f"First result {(time.perf_counter() - self.run_started) * 1000:.0f} ms after Start.")
+            self.stats.add(result)
+            self.report.add(result)
+            self.log_message(format_result(result))
+            changed = True
+
+        if self.stats.scanning:
+            self.stats.total_files = self.scanner.count
+            self.stats.scanning = not self.scanner.done
+            if self.stats.watching:
+                self.stats.settling = self.scanner.settling
+            changed = True
+
+        if not finished:
+            if changed:
+                self.update_progress()
+                self.update_stats_display()
+            self.after(UI_REFRESH_MS, self.check_results_queue)
+            return
+
+        self.worker_thread = None
+        self.cancel_event = None
+        self.video_progress = {}
+        self.stats.total_files = self.scanner.count
+        self.stats.scanning = False
+        self.stats.finish()
+        self.write_report()
+        self.update_progress()
+        self.update_stats_display()
+        self.start_button.config(state='normal')
+        self.cancel_button.config(state='disabled')
+        if self.stats.watching:
+            self.log_message(f"Stopped watching after {self.stats.files_processed} files.")
+            self.close_log_file()
+            messagebox.showinfo("Watch Stopped", f"Stopped watching the folder after {self.stats.files_processed} files.")
+        elif self.stats.total_files == 0:
+            self.log_message("Scan complete: No supported files found.")
+            self.close_log_file()
+            messagebox.showinfo("No Files Found", "No supported image or video files found in the selected folder (excluding 'compressed' subfolder).")
+        elif self.stats.status_counts.get('cancelled'):
+            self.log_message("Compression process cancelled.")
+            self.close_log_file()
+            messagebox.showinfo("Process Cancelled", "Compression process was cancelled.")
+        else:
+            self.log_message("Compression process finished.")
+            self.close_log_file()
+            messagebox.showinfo("Process Complete", "Compression process has finished.")
+
+    def update_progress(self):
+        running_fraction = sum(p['fraction'] or 0 for p in self.video_progress.values())
+        self.progress_bar.config(maximum=max(1, self.stats.total_files))
+        self.progress_bar['value'] = min(self.stats.files_processed + running_fraction, self.stats.total_files)
+
+        lines = []
+        for file_path, progress in self.video_progress.items():
+            line = os.path.basename(file_path)
+            if progress['fraction'] is not None:
+                line += f" {progress['fraction'] * 100:.0f}%"
+            if progress['fps'] is not None:
+                line += f", {progress['fps']:.0f} fps"
+            if progress['speed'] is not None:
+                line += f", {progress['speed']:.2f}x"
+            lines.append(line)
+        self.video_progress_label.config(text="\n".join(lines))
+
+    def update_stats_display(self):
+        if self.stats is None:
+            return
+        self.stats_label.config(text=self.stats.summary_text(show_elapsed=self.stats.end_time is None))
+
+    def run(self):
+        self.mainloop()
@@ -0,0 +1,215 @@
+import concurrent.futures
+import contextlib
+import itertools
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+
+READ_CHUNK_SIZE = 1024 * 1024
+PREFETCH_MODES = ('memory', 'scratch')
+DEFAULT_PREFETCH_MODE = 'memory'
+# Bytes of upcoming files read ahead of the encoders.
+DEFAULT_PREFETCH_MAX_MB = 1024
+DEFAULT_IO_WRITERS = 2
+# Reads and writes running at once against one device (st_dev), e.g. one NFS mount.
+DEFAULT_DEVICE_LIMIT = 4
+
+
+def device_of(path):
+    try:
+        return os.stat(path).st_dev
+    except OSError:
+        return None
+
+
+def temp_path_for(path):
+    # A temporary name next to path that is unique to this writer, so two processes or hosts
+    # writing the same output never write into each other's partial file. Create it with
+    # open(..., 'xb'), which fails instead of sharing should the name exist after all.
+    return os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.{uuid.uuid4().hex[:16]}.tmp")
+
+
+def copy_file(source_path, target_path):
+    # Sequential chunked copy to a temporary name next to the target, then a rename.
+    os.makedirs(os.path.dirname(target_path), exist_ok=True)
+    temp_path = temp_path_for(target_path)
+    try:
+        with open(source_path, 'rb') as source, open(temp_path, 'xb') as target:
+            shutil.copyfileobj(source, target, READ_CHUNK_SIZE)
+        os.replace(temp_path, target_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+class DeviceLimiter:
+    # Caps concurrent reads and writes per device, shared by the prefetch readers and the
+    # write-behind writers, so outputs going to the source share do not starve its readers.
+    def __init__(self, limit=DEFAULT_DEVICE_LIMIT):
+        self.limit = limit
+        self._lock = threading.Lock()
+        self._slots = {}
+
+    @contextlib.contextmanager
+    def slot(self, device):
+        # Yields the seconds spent waiting for the slot.
+        if not self.limit or device is None:
+            yield 0.0
+            return
+        with self._lock:
+            semaphore = self._slots.setdefault(device, threading.Semaphore(self.limit))
+        start = time.perf_counter()
+        semaphore.acquire()
+        try:
+            yield time.perf_counter() - start
+        finally:
+            semaphore.release()
+
+
+class Prefetcher:
+    # Reads upcoming source files on a few I/O threads ahead of the encoders. 'memory' reads each
+    # file through once, so the worker's own read is served from the local page cache; 'scratch'
+    # copies it to a local folder and the worker reads the copy. fill() is given the queued files
+    # in dispatch order and keeps at most max_bytes of them read ahead, split between the lanes.
+    def __init__(self, source_folder, readers, mode=DEFAULT_PREFETCH_MODE, max_bytes=DEFAULT_PREFETCH_MAX_MB * 1024 * 1024,
+                 limiter=None, scratch_folder=None, notify=None):
+        self.source_folder = source_folder
+        self.mode = mode
+        self.max_bytes = max_bytes
+        self.limiter = limiter or DeviceLimiter(None)
+        self.notify = notify
+        self.scratch_root = tempfile.mkdtemp(prefix='compress-prefetch-', dir=scratch_folder) if mode == 'scratch' else None
+        self._pool = concurrent.futures.ThreadPoolExecutor(max_workers=readers, thread_name_prefix='prefetch')
+        self._entries = {}
+
+    def scratch_path(self, file_path):
+        return os.path.join(self.scratch_root, os.path.relpath(file_path, self.source_folder))
+
+    def fill(self, upcoming):
+        # upcoming yields (lane, file_path, size). Each lane with queued files gets an equal share
+        # of max_bytes, so a backlog of large videos cannot keep the images from being read ahead.
+        # The first file of each lane is always started, so a file larger than its share cannot
+        # hold up the queue, and reads are submitted alternating between the lanes.
+        lanes = {}
+        for lane, file_path, size in upcoming:
+            lanes.setdefault(lane, []).append((file_path, size))
+        share = self.max_bytes // max(1, len(lanes))
+        admitted = []
+        for files in lanes.values():
+            ahead = 0
+            for index, (file_path, size) in enumerate(files):
+                if ahead and ahead + size > share:
+                    del files[index:]
+                    break
+                ahead += size
+            admitted.append(files)
+        for file_path, _ in filter(None, itertools.chain.from_iterable(itertools.zip_longest(*admitted))):
+            if file_path not in self._entries:
+                future = self._pool.submit(self._read, file_path)
+                self._entries[file_path] = future
+                if self.notify is not None:
+                    future.add_done_callback(self.notify)
+
+    def _read(self, file_path):
+        start = time.perf_counter()
+        with self.limiter.slot(device_of(file_path)) as waited:
+            if self.mode == 'scratch':
+                copy_file(file_path, self.scratch_path(file_path))
+            else:
+                with open(file_path, 'rb') as f:
+                    if hasattr(os, 'posix_fadvise'):
+                        os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+                    while f.read(READ_CHUNK_SIZE):
+                        pass
+        return {'seconds': time.perf_counter() - start - waited, 'io_wait': waited}
+
+    def ready(self, file_paths):
+        return all(file_path in self._entries and self._entries[file_path].done() for file_path in file_paths)
+
+    def _staged(self, file_path):
+        future = self._entries.get(file_path)
+        if future is None or not future.done() or future.cancelled() or future.exception() is not None:
+            return None
+        return future.result()
+
+    def task_source(self, file_paths):
+        # (paths, source_folder) to hand to the worker; scratch copies only if every file was staged.
+        if self.mode != 'scratch' or not all(self._staged(file_path) for file_path in file_paths):
+            return list(file_paths), self.source_folder
+        return [self.scratch_path(file_path) for file_path in file_paths], self.scratch_root
+
+    def finish(self, result):
+        # Adds the prefetch time and device wait of result's file and drops its scratch copy.
+        file_path = result.get('file_path')
+        staged = self._staged(file_path)
+        self._entries.pop(file_path, None)
+        if staged is None:
+            return result
+        if result.get('timings') is not None:
+            result['timings']['prefetch'] = staged['seconds']
+        result['io_wait'] = result.get('io_wait', 0.0) + staged['io_wait']
+        if self.mode == 'scratch':
+            with contextlib.suppress(OSError):
+                os.remove(self.scratch_path(file_path))
+        return result
+
+    def close(self):
+        self._pool.shutdown(wait=True, cancel_futures=True)
+        self._entries = {}
+        if self.scratch_root is not None:
+            shutil.rmtree(self.scratch_root, ignore_errors=True)
+
+
+class WriteBehind:
+    # Workers write their outputs into a local staging folder; a few I/O threads copy them to the
+    # output folder (temporary name, then rename) while the workers move on. A result is only
+    # reported, and recorded in the manifest, once its files have landed.
+    def __init__(self, output_folder, writers=DEFAULT_IO_WRITERS, limiter=None, scratch_folder=None):
+        self.output_folder = output_folder
+        self.limiter = limiter or DeviceLimiter(None)
+        self.device = device_of(output_folder)
+        self.staging_root = tempfile.mkdtemp(prefix='compress-output-', dir=scratch_folder)
+        self._pool = concurrent.futures.ThreadPoolExecutor(max_workers=writers, thread_name_prefix='write-behind')
+
+    def needs_write(self, result):
+        return bool(result.get('output_path') or result.get('variants'))
+
+    def submit(self, result):
+        # The future's result is the result with its output paths in the output folder.
+        return self._pool.submit(self._write, result)
+
+    def _target(self, staged_path):
+        return os.path.join(self.output_folder, os.path.relpath(staged_path, self.staging_root))
+
+    def _write(self, result):
+        result = dict(result)
+        staged_paths = [result['output_path']] if result.get('output_path') else []
+        staged_paths += [variant['output_path'] for variant in result.get('variants') or []]
+        start = time.perf_counter()
+        try:
+            with self.limiter.slot(self.device) as waited:
+                for staged_path in staged_paths:
+                    copy_file(staged_path, self._target(staged_path))
+                    os.remove(staged_path)
+        except OSError as exc:
+            result['status'] = 'fail'
+            result['message'] = f"Error writing output of {os.path.basename(result['file_path'])}: {exc}"
+            result['output_path'] = None
+            result['variants'] = []
+            return result
+        if result.get('output_path'):
+            result['output_path'] = self._target(result['output_path'])
+        if result.get('variants'):
+            result['variants'] = [dict(variant, output_path=self._target(variant['output_path'])) for variant in result['variants']]
+        if result.get('timings') is not None:
+            result['timings']['write_behind'] = time.perf_counter() - start - waited
+        result['io_wait'] = result.get('io_wait', 0.0) + waited
+        return result
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+        shutil.rmtree(self.staging_root, ignore_errors=True)
@@ -0,0 +1,147 @@
+import os
+import json
+import hashlib
+import sqlite3
+import time
+
+MANIFEST_FILENAME = ".compress_manifest.sqlite"
+MANIFEST_COMMIT_INTERVAL = 2.0
+
+# Options that only change how a run is executed, not what ends up in the output.
+NON_OUTPUT_OPTIONS = {'source_folder', 'incremental', 'prune_deleted', 'cpu_budget', 'max_video_threads',
+                      'memory_budget_mb', 'deduplicate', 'spool_max_mb', 'io_readers', 'prefetch_mode', 'prefetch_max_mb',
+                      'write_behind', 'io_writers', 'io_device_limit', 'scratch_folder'}
+
+RECORDED_STATUSES = ('success', 'success_lossy', 'skipped_size_increase')
+
+
+def options_hash(options):
+    relevant = {k: v for k, v in options.items() if k not in NON_OUTPUT_OPTIONS}
+    encoded = json.dumps(relevant, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.sha1(encoded).hexdigest()
+
+
+class Manifest:
+    def __init__(self, output_folder, source_folder, options):
+        self.output_folder = output_folder
+        self.source_folder = source_folder
+        self.options_hash = options_hash(options)
+        self.skip_unchanged = options.get('incremental', True)
+        self.path = os.path.join(output_folder, MANIFEST_FILENAME)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            " source TEXT PRIMARY KEY,"
+            " size INTEGER NOT NULL,"
+            " mtime_ns INTEGER NOT NULL,"
+            " options_hash TEXT NOT NULL,"
+            " status TEXT NOT NULL,"
+            " output TEXT,"
+            " original_size INTEGER,"
+            " compressed_size INTEGER,"
+            " updated_at REAL,"
+            " variants TEXT)"
+        )
+        # Manifests written before size ladders existed lack the variants column (JSON list of outputs).
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(files)")}
+        if 'variants' not in columns:
+            self.conn.execute("ALTER TABLE files ADD COLUMN variants TEXT")
+        self.conn.commit()
+        self._stats = {}
+        self._last_commit = time.monotonic()
+
+    def _key(self, file_path):
+        return os.path.relpath(file_path, self.source_folder)
+
+    def _outputs(self, output, variants):
+        outputs = [output] if output else []
+        outputs += json.loads(variants) if variants else []
+        return [os.path.join(self.output_folder, path) for path in outputs]
+
+    def check(self, file_path):
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            return None
+        key = self._key(file_path)
+        self._stats[file_path] = (st.st_size, st.st_mtime_ns)
+        if not self.skip_unchanged:
+            return None
+
+        row = self.conn.execute(
+            "SELECT size, mtime_ns, options_hash, status, output, original_size, compressed_size, variants FROM files WHERE source = ?",
+            (key,),
+        ).fetchone()
+        if row is None:
+            return None
+        size, mtime_ns, row_hash, status, output, original_size, compressed_size, variants = row
+        if size != st.st_size or mtime_ns != st.st_mtime_ns or row_hash != self.options_hash:
+            return None
+        # The main output and every size-ladder variant must still be there.
+        if not all(os.path.exists(path) for path in self._outputs(output, variants)):
+            return None
+        output_path = os.path.join(self.output_folder, output) if output else None
+
+        self._stats.pop(file_path, None)
+        return {
+            'original_size': original_size or 0,
+            'compressed_size': compressed_size or 0,
+            'status': 'unchanged',
+            'message': f"Unchanged since last run: {os.path.basename(file_path)} (previous result: {status})",
+            'file_path': file_path,
+            'output_path': output_path,
+            'previous_status': status,
+        }
+
+    def record(self, result):
+        file_path = result.get('file_path')
+        stat = self._stats.pop(file_path, None)
+        if stat is None or result.get('status') not in RECORDED_STATUSES:
+            return
+
+        output = None
+        if result.get('output_path'):
+            output = os.path.relpath(result['output_path'], self.output_folder)
+        variants = None
+        if result.get('variants'):
+            variants = json.dumps([os.path.relpath(variant['output_path'], self.output_folder) for variant in result['variants']])
+
+        self.conn.execute(
+            "INSERT OR REPLACE INTO files"
+            " (source, size, mtime_ns, options_hash, status, output, original_size, compressed_size, updated_at, variants)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (self._key(file_path), stat[0], stat[1], self.options_hash, result['status'], output,
+             result.get('original_size', 0), result.get('compressed_size', 0), time.time(), variants),
+        )
+        if time.monotonic() - self._last_commit >= MANIFEST_COMMIT_INTERVAL:
+            self.commit()
+
+    def prune(self, existing_files=None):
+        # Without a file list, a source counts as deleted when it is no longer on disk.
+        existing = None if existing_files is None else {self._key(f) for f in existing_files}
+        removed = []
+        rows = self.conn.execute("SELECT source, output, variants FROM files").fetchall()
+        for source, output, variants in rows:
+            if existing is None:
+                if os.path.exists(os.path.join(self.source_folder, source)):
+                    continue
+            elif source in existing:
+                continue
+            for output_path in self._outputs(output, variants):
+                try:
+                    os.remove(output_path)
+                    removed.append(output_path)
+                except FileNotFoundError:
+                    pass
+            self.conn.execute("DELETE FROM files WHERE source = ?", (source,))
+        self.commit()
+        return removed
+
+    def commit(self):
+        self.conn.commit()
+        self._last_commit = time.monotonic()
+
+    def close(self):
+        self.commit()
+        self.conn.close()
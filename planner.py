@@ -0,0 +1,104 @@
+import io
+import time
+
+from PIL import Image
+
+PLANNER_MIN_PIXELS = 512 * 512
+PLANNER_TILE_SIZE = 128
+PLANNER_GRID = 3
+
+# A low-effort lossless encode of the sample. It overestimates the full lossless size, by
+# up to about 1.5x on photographic content and by much more on flat graphics.
+SAMPLE_LOSSLESS_OPTIONS = {'quality': 0, 'method': 0, 'lossless': True}
+SAMPLE_LOSSY_METHOD = 0
+# The sample has more distinct colors than this: photographic content.
+PHOTO_MIN_COLORS = 4096
+# Photographic images whose sample lossless size (relative to the original) is above this
+# go straight to lossy; everything else keeps the unplanned order, lossless first.
+LOSSY_FIRST_RATIO = 2.0
+# Predicted lossy size (relative to the original) above which no WEBP encode is attempted.
+HOPELESS_RATIO = 1.5
+
+
+def _sample_mosaic(img):
+    tile = PLANNER_TILE_SIZE
+    grid = PLANNER_GRID
+    mosaic = Image.new(img.mode, (tile * grid, tile * grid))
+    step_x = (img.width - tile) / (grid - 1)
+    step_y = (img.height - tile) / (grid - 1)
+    for row in range(grid):
+        for col in range(grid):
+            left = int(col * step_x)
+            top = int(row * step_y)
+            mosaic.paste(img.crop((left, top, left + tile, top + tile)), (col * tile, row * tile))
+    return mosaic
+
+
+def _encoded_size(img, **save_options):
+    buffer = io.BytesIO()
+    img.save(buffer, format='WEBP', **save_options)
+    return buffer.tell()
+
+
+def plan_image_encode(img, original_size, lossy_quality):
+    total_pixels = img.width * img.height
+    if total_pixels < PLANNER_MIN_PIXELS or img.width < PLANNER_TILE_SIZE or img.height < PLANNER_TILE_SIZE:
+        return None
+
+    start = time.perf_counter()
+    sample = _sample_mosaic(img)
+    scale = total_pixels / (sample.width * sample.height)
+
+    predicted_lossless = int(_encoded_size(sample, **SAMPLE_LOSSLESS_OPTIONS) * scale)
+    predicted_lossy = None
+    photographic = sample.getcolors(PHOTO_MIN_COLORS) is None
+    if photographic and predicted_lossless > original_size * LOSSY_FIRST_RATIO:
+        predicted_lossy = int(_encoded_size(sample, quality=lossy_quality, method=SAMPLE_LOSSY_METHOD) * scale)
+
+    if predicted_lossy is None:
+        order = ('lossless', 'lossy')
+        predicted = 'lossless'
+    elif predicted_lossy > original_size * HOPELESS_RATIO:
+        order = ()
+        predicted = 'skip'
+    else:
+        order = ('lossy', 'lossless')
+        predicted = 'lossy'
+
+    return {
+        'predicted': predicted,
+        'order': order,
+        'predicted_lossless_size': predicted_lossless,
+        'predicted_lossy_size': predicted_lossy,
+        'pixels': total_pixels,
+        'planning_time': time.perf_counter() - start,
+    }
+
+
+def finish_plan(plan, actual, timings):
+    # 'actual' is the mode that produced the kept output, or 'skip' if none did. 'skipped' lists
+    # the encodes the unplanned path (lossless, then lossy if that lost) would have run but the
+    # plan avoided; BatchStats prices them with full encodes measured in the same run. A lossy
+    # encode that only ran because of a wrong prediction is counted against the planner.
+    if plan is None:
+        return None
+    predicted = plan['predicted']
+    skipped = ()
+    wasted = plan['planning_time']
+    if predicted == 'skip':
+        skipped = ('lossless', 'lossy')
+    elif predicted == 'lossy':
+        if actual == 'lossy':
+            skipped = ('lossless',)
+        elif actual == 'lossless':
+            wasted += timings.get('lossy', 0.0)
+
+    return {
+        'predicted': predicted,
+        'actual': actual,
+        'hit': None if predicted == 'skip' else predicted == actual,
+        'planning_time': plan['planning_time'],
+        'pixels': plan['pixels'],
+        'skipped': skipped,
+        'wasted_time': wasted,
+    }
@@ -0,0 +1,777 @@
+import io
+import os
+import math
+import time
+import bisect
+import pathlib
+import shutil
+import tempfile
+import contextlib
+import concurrent.futures
+from PIL import Image, ImageCms, UnidentifiedImageError
+
+from defaults import DEFAULT_RESIZE_PERCENTAGE, DEFAULT_RESIZE_THRESHOLD, WEBP_LOSSY_FALLBACK_QUALITY
+from encoders import ENCODERS, RACE_MAX_THREADS, race_encoders, race_names, race_pool
+from iostage import temp_path_for
+from planner import plan_image_encode, finish_plan
+from quality import DEFAULT_LOSSY_TARGETS, DEFAULT_MAX_TRIALS, search_lossy_quality, search_memory
+from video import (
+    AUDIO_ENCODER_ARGS, VIDEO_ENCODER_ARGS, EncodeCancelled, encode_chunked, plan_video, probe_video, run_ffmpeg, should_chunk,
+)
+
+IMAGE_EXTS = {'.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.tif'}
+VIDEO_EXTS = {'.mp4', '.mov', '.avi', '.mkv', '.webm'}
+
+DRAFT_MIN_REDUCTION = 2.0
+RESIZE_REDUCING_GAP = 3.0
+# Encoded images larger than this are spooled to the local temp folder instead of being held in memory.
+SPOOL_MAX_BYTES = 64 * 1024 * 1024
+# Threads encoding size-ladder variants while the next smaller rung is being resampled.
+LADDER_MAX_THREADS = 2
+WEBP_MAX_DIMENSION = 16383
+# Images above this many pixels are downscaled band by band when their file layout allows it.
+BANDED_MIN_PIXELS = 64 * 1024 * 1024
+# Decoded source rows held at once by the banded path.
+BAND_MAX_BYTES = 64 * 1024 * 1024
+# Rows per block when a single uncompressed raster (BMP, PPM) is read in bands.
+RASTER_BLOCK_ROWS = 64
+LANCZOS_SUPPORT = 3.0
+TIFF_COMPRESSION_CODECS = {1: 'raw', 32773: 'packbits'}
+
+def format_bytes(byte_count):
+    if byte_count is None:
+        return "N/A"
+    power = 1024
+    n = 0
+    power_labels = {0: '', 1: 'K', 2: 'M', 3: 'G', 4: 'T'}
+    while byte_count >= power and n < len(power_labels) - 1:
+        byte_count /= power
+        n += 1
+    return f"{byte_count:.2f} {power_labels[n]}B"
+
+def resize_image(img, size, fast=True):
+    if not fast:
+        return img.resize(size, Image.Resampling.LANCZOS)
+    if img.format == 'JPEG' and img.width >= size[0] * DRAFT_MIN_REDUCTION and img.height >= size[1] * DRAFT_MIN_REDUCTION:
+        # Let libjpeg decode at 1/2, 1/4 or 1/8 scale (never below the target size) before loading.
+        img.draft(img.mode, size)
+    return img.resize(size, Image.Resampling.LANCZOS, reducing_gap=RESIZE_REDUCING_GAP)
+
+def output_size(width, height, options):
+    # The optional percentage resize, then WEBP's dimension limit, which larger images would otherwise fail on.
+    threshold = options.get('resize_threshold', DEFAULT_RESIZE_THRESHOLD)
+    if options.get('enable_resize', False) and (width > threshold or height > threshold):
+        resize_percentage = options.get('resize_percentage', DEFAULT_RESIZE_PERCENTAGE)
+        if 0 < resize_percentage < 100:
+            scale_factor = 1.0 - (resize_percentage / 100.0)
+            width = max(1, int(width * scale_factor))
+            height = max(1, int(height * scale_factor))
+    if max(width, height) > WEBP_MAX_DIMENSION:
+        fit = WEBP_MAX_DIMENSION / max(width, height)
+        width = max(1, min(WEBP_MAX_DIMENSION, int(width * fit)))
+        height = max(1, min(WEBP_MAX_DIMENSION, int(height * fit)))
+    return width, height
+
+def _tiff_blocks(img):
+    tags = img.tag_v2
+    codec = TIFF_COMPRESSION_CODECS.get(tags.get(259, 1))
+    if codec is None or tags.get(284, 1) != 1 or tags.get(317, 1) != 1 or not img.tile:
+        return None
+    rawmode = img.tile[0].args[0]
+    if 324 in tags and 325 in tags:
+        block_width, block_height = tags[322], tags[323]
+        offsets, lengths = tags[324], tags[325]
+    elif 273 in tags and 279 in tags:
+        block_width, block_height = img.width, min(tags.get(278, img.height), img.height)
+        offsets, lengths = tags[273], tags[279]
+    else:
+        return None
+    positions = [(x, y) for y in range(0, img.height, block_height) for x in range(0, img.width, block_width)]
+    if len(positions) != len(offsets) or len(offsets) != len(lengths):
+        return None
+    blocks = []
+    for (x, y), offset, length in zip(positions, offsets, lengths):
+        # Strips are as tall as the rows left; tiles are always stored at full size.
+        height = block_height if 324 in tags else min(block_height, img.height - y)
+        if codec == 'raw' and 324 not in tags and height > RASTER_BLOCK_ROWS and length % height == 0:
+            # Uncompressed strips can be split by row, so one tall strip does not become one tall band.
+            stride = length // height
+            for top in range(0, height, RASTER_BLOCK_ROWS):
+                rows = min(RASTER_BLOCK_ROWS, height - top)
+                blocks.append((x, y + top, block_width, rows, offset + top * stride, rows * stride, codec, (rawmode,)))
+            continue
+        blocks.append((x, y, block_width, height, offset, length, codec, (rawmode,)))
+    return blocks
+
+def _raster_blocks(img):
+    # A single uncompressed raster: rows sit at a fixed stride, top-down or bottom-up.
+    tile = img.tile[0]
+    args = tile.args if isinstance(tile.args, tuple) else (tile.args,)
+    rawmode, stride, orientation = (args + (0, 1))[:3]
+    if tile.codec_name != 'raw' or orientation not in (1, -1) or tile.extents != (0, 0) + img.size:
+        return None
+    if not stride:
+        try:
+            stride = len(Image.new(img.mode, (img.width, 1)).tobytes('raw', rawmode))
+        except Exception:
+            return None
+    blocks = []
+    for y in range(0, img.height, RASTER_BLOCK_ROWS):
+        rows = min(RASTER_BLOCK_ROWS, img.height - y)
+        first_row = y if orientation == 1 else img.height - y - rows
+        blocks.append((0, y, img.width, rows, tile.offset + first_row * stride, rows * stride, 'raw', (rawmode, stride, orientation)))
+    return blocks
+
+class BandReader:
+    # Decodes horizontal bands of an image straight from its file, for layouts whose rows can be
+    # found without decoding the rest: TIFF strips and tiles (uncompressed or PackBits) and single
+    # uncompressed rasters such as BMP and PPM. band_reader() returns None for anything else.
+    def __init__(self, img, blocks):
+        self.path = img.filename
+        self.mode = img.mode
+        self.size = img.size
+        self.info = dict(img.info)
+        self.palette = img.getpalette() if img.mode == 'P' else None
+        self.rows = {}
+        for block in blocks:
+            self.rows.setdefault(block[1], []).append(block)
+        self.row_starts = sorted(self.rows)
+
+    def read(self, fp, top, bottom):
+        # Returns (band, band_top); the band covers whole block rows, so it can start above top.
+        first = bisect.bisect_right(self.row_starts, top) - 1
+        last = bisect.bisect_left(self.row_starts, bottom)
+        row_starts = self.row_starts[max(0, first):last]
+        band_top = row_starts[0]
+        band_bottom = min(self.size[1], max(block[1] + block[3] for block in self.rows[row_starts[-1]]))
+        band = Image.new(self.mode, (self.size[0], band_bottom - band_top))
+        for row_start in row_starts:
+            for x, y, width, height, offset, length, codec, args in self.rows[row_start]:
+                fp.seek(offset)
+                data = fp.read(length)
+                block = Image.frombytes(self.mode, (width, height), data, codec, *args)
+                if x + width > self.size[0] or y + height > band_bottom:
+                    block = block.crop((0, 0, min(width, self.size[0] - x), min(height, band_bottom - y)))
+                band.paste(block, (x, y - band_top))
+        if self.palette is not None:
+            band.putpalette(self.palette)
+        return self.prepare(band), band_top
+
+    def prepare(self, band):
+        # Bands are resampled, so palette, bilevel and 16-bit modes are widened first.
+        if self.mode == 'P':
+            if 'transparency' in self.info:
+                band.info['transparency'] = self.info['transparency']
+                return band.convert('RGBA')
+            return band.convert('RGB')
+        if self.mode == '1':
+            return band.convert('L')
+        if self.mode.startswith('I;16'):
+            return band.convert('I')
+        return band
+
+    def band_rows(self):
+        return max(1, BAND_MAX_BYTES // (self.size[0] * max(bytes_per_pixel(self.mode), 1)))
+
+def band_reader(img):
+    try:
+        if img.format == 'TIFF':
+            blocks = _tiff_blocks(img)
+        elif len(img.tile) == 1:
+            blocks = _raster_blocks(img)
+        else:
+            blocks = None
+    except Exception:
+        blocks = None
+    if not blocks or not img.filename:
+        return None
+    return BandReader(img, blocks)
+
+def open_image(file_path):
+    # Pillow's decompression-bomb guard still applies to images that would be decoded whole;
+    # larger ones are only accepted when they can be read in bands.
+    try:
+        return Image.open(file_path)
+    except Image.DecompressionBombError:
+        max_image_pixels = Image.MAX_IMAGE_PIXELS
+        Image.MAX_IMAGE_PIXELS = None
+        try:
+            img = Image.open(file_path)
+        finally:
+            Image.MAX_IMAGE_PIXELS = max_image_pixels
+        if band_reader(img) is None:
+            img.close()
+            raise
+        return img
+
+def downscale_banded(reader, size, fast=True):
+    # Resamples the source one band of rows at a time into the output image, so only a band of
+    # decoded rows plus the output are ever held. Bands overlap by the filter's reach, so the
+    # result matches a whole-image LANCZOS resize (to within rounding) without seams.
+    width, height = reader.size
+    scale = height / size[1]
+    margin = math.ceil(LANCZOS_SUPPORT * max(scale, 1.0)) + 1
+    output_rows = max(1, int((reader.band_rows() - 2 * margin) / scale))
+    reducing_gap = RESIZE_REDUCING_GAP if fast else None
+    output = None
+    with open(reader.path, 'rb') as fp:
+        for output_top in range(0, size[1], output_rows):
+            output_bottom = min(size[1], output_top + output_rows)
+            source_top = output_top * scale
+            source_bottom = output_bottom * scale
+            band, band_top = reader.read(fp, max(0, math.floor(source_top) - margin), min(height, math.ceil(source_bottom) + margin))
+            part = band.resize((size[0], output_bottom - output_top), Image.Resampling.LANCZOS,
+                               box=(0, source_top - band_top, width, source_bottom - band_top), reducing_gap=reducing_gap)
+            band.close()
+            if output is None:
+                output = Image.new(part.mode, size)
+            output.paste(part, (0, output_top))
+    output.info = dict(reader.info)
+    return output
+
+@contextlib.contextmanager
+def timed(timings, stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - start
+
+def spool_buffer(options):
+    spool_max_mb = options.get('spool_max_mb')
+    max_size = SPOOL_MAX_BYTES if spool_max_mb is None else int(spool_max_mb * 1024 * 1024)
+    return tempfile.SpooledTemporaryFile(max_size=max_size)
+
+def write_atomic(buffer, output_path):
+    # One sequential write next to the target, then a rename, so readers never see a partial file.
+    temp_path = pathlib.Path(temp_path_for(output_path))
+    buffer.seek(0)
+    try:
+        with open(temp_path, 'xb') as f:
+            shutil.copyfileobj(buffer, f)
+        os.replace(temp_path, output_path)
+    except BaseException:
+        if temp_path.exists():
+            temp_path.unlink()
+        raise
+
+def variant_path(output_path, width):
+    return output_path.with_name(f"{output_path.stem}-{width}w{output_path.suffix}")
+
+def _write_variant(variant, output_path, encode, options):
+    buffer = spool_buffer(options)
+    try:
+        encode(variant, buffer)
+        size = buffer.tell()
+        write_atomic(buffer, output_path)
+    finally:
+        buffer.close()
+    return size
+
+def write_size_ladder(img, output_path, widths, encode, options):
+    # Decode once, then resample each rung from the previous (larger) one instead of from the full image.
+    widths = sorted({width for width in widths if 0 < width < img.width}, reverse=True)
+    if not widths:
+        return []
+    variants = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(len(widths), LADDER_MAX_THREADS)) as pool:
+        futures = []
+        rung = img
+        for width in widths:
+            height = max(1, round(img.height * width / img.width))
+            rung = rung.resize((width, height), Image.Resampling.LANCZOS)
+            path = variant_path(output_path, width)
+            futures.append((width, height, path, pool.submit(_write_variant, rung, path, encode, options)))
+        for width, height, path, future in futures:
+            variants.append({'width': width, 'height': height, 'output_path': str(path), 'size': future.result()})
+    return variants
+
+def has_transparency(img):
+    if img.mode == 'P':
+        return 'transparency' in img.info
+    if 'A' not in img.getbands():
+        return False
+    # getextrema scans the alpha band in C; (255, 255) means every pixel is opaque.
+    return img.getchannel('A').getextrema() != (255, 255)
+
+def cmyk_to_rgb(img):
+    icc_profile = img.info.get('icc_profile')
+    if icc_profile:
+        try:
+            source_profile = ImageCms.ImageCmsProfile(io.BytesIO(icc_profile))
+            return ImageCms.profileToProfile(img, source_profile, ImageCms.createProfile('sRGB'), outputMode='RGB')
+        except (ImageCms.PyCMSError, OSError):
+            pass
+    return img.convert('RGB')
+
+def prepare_for_webp(img):
+    # WEBP stores RGB or RGBA. Only keep an alpha channel that actually has transparency.
+    if img.mode == 'CMYK':
+        return cmyk_to_rgb(img)
+    if img.mode.startswith('I;16') or img.mode == 'I':
+        # 16-bit grayscale (TIFF/PNG): scale to 8 bits instead of clipping everything above 255.
+        return img.convert('I').point(lambda value: value * (1 / 256)).convert('L').convert('RGB')
+    if img.mode == 'F':
+        return img.convert('L').convert('RGB')
+    if img.mode in ('RGB', 'RGBA') and not has_transparency(img):
+        return img if img.mode == 'RGB' else img.convert('RGB')
+    if has_transparency(img):
+        return img if img.mode == 'RGBA' else img.convert('RGBA')
+    return img.convert('RGB')
+
+def bytes_per_pixel(mode):
+    if mode in ('1', 'L', 'P'):
+        return 1
+    if mode.startswith('I;16'):
+        return 2
+    return 4
+
+def estimate_image_memory(file_path, options):
+    # Rough peak footprint of process_image: decoded image (or one band of it), optional resize
+    # target, the RGB(A) copy handed to the encoder and libwebp's own ARGB working buffer, plus the
+    # quality search's metric arrays and the race encoders when those are enabled.
+    try:
+        with open_image(file_path) as img:
+            width, height = img.size
+            mode = img.mode
+            banded = width * height > BANDED_MIN_PIXELS and band_reader(img) is not None
+    except Exception:
+        return 0
+
+    pixels = width * height
+    new_width, new_height = output_size(width, height, options)
+    if (new_width, new_height) == (width, height):
+        memory = pixels * bytes_per_pixel(mode)
+    else:
+        source = BAND_MAX_BYTES * 2 if banded else pixels * bytes_per_pixel(mode)
+        pixels = new_width * new_height
+        memory = source + pixels * bytes_per_pixel(mode)
+    if options.get('size_ladder'):
+        # The rungs are smaller than the source; the ones in flight together rarely exceed half of it.
+        memory += pixels * 4 // 2
+    memory += search_memory(pixels, options.get('lossy_target_mode', 'fixed'))
+    racing = race_names(options)
+    if racing:
+        # Each racing encoder works on its own copy of the image and fills its own output buffer.
+        memory += min(len(racing), RACE_MAX_THREADS) * pixels * 4 * 2
+    return memory + pixels * 4 * 2
+
+def describe_quality_search(target_mode, quality_search):
+    if target_mode == 'size':
+        description = f"target size, {format_bytes(len(quality_search['data']))}"
+    else:
+        description = f"target {target_mode.upper()}, {quality_search['score']:.3f}"
+    description += f", {quality_search['trials']} trials"
+    if not quality_search['target_met']:
+        description += ", target not met"
+    return description
+
+def process_image(file_path, output_folder, options):
+    original_size = 0
+    compressed_size = 0
+    status = 'skipped'
+    message = f"Skipped {os.path.basename(file_path)} (No image processing selected)."
+    final_output_path = None
+    plan_report = None
+    lossy_quality = None
+    variants = []
+    encoder = None
+    race = None
+    timings = {}
+    bytes_read = 0
+    bytes_written = 0
+
+    try:
+        original_size = os.path.getsize(file_path)
+        file_ext = pathlib.Path(file_path).suffix.lower()
+
+        if file_ext in IMAGE_EXTS and options.get('compress_images_webp', False):
+            status = 'fail'
+            temp_message = f"Processing {os.path.basename(file_path)}..."
+
+            relative_path = pathlib.Path(file_path).relative_to(options['source_folder'])
+            output_path = pathlib.Path(output_folder) / relative_path.with_suffix('.webp')
+
+            output_path.parent.mkdir(parents=True, exist_ok=True)
+
+            with timed(timings, 'decode'):
+                img = open_image(file_path)
+                original_dimensions = img.size
+                new_width, new_height = output_size(img.width, img.height, options)
+                resize_needed = (new_width, new_height) != img.size
+                reader = band_reader(img) if resize_needed and img.width * img.height > BANDED_MIN_PIXELS else None
+                if reader is None and Image.MAX_IMAGE_PIXELS and img.width * img.height > 2 * Image.MAX_IMAGE_PIXELS:
+                    # open_image let it through for the banded path, but it would be decoded whole here.
+                    raise Image.DecompressionBombError(
+                        f"{img.width}x{img.height} is too large to decode whole; enable resizing to downscale it in bands")
+                if not resize_needed:
+                    # A resized image is decoded by resize_image (possibly at reduced scale), so that time counts as 'resize'.
+                    img.load()
+            bytes_read = original_size
+
+            resized = False
+            if resize_needed:
+                resize_start = time.perf_counter()
+                try:
+                    if reader is not None:
+                        img.close()
+                        img = downscale_banded(reader, (new_width, new_height), fast=options.get('fast_downscale', True))
+                    else:
+                        img = resize_image(img, (new_width, new_height), fast=options.get('fast_downscale', True))
+                    resized = True
+                    temp_message += f" (resized from {original_dimensions[0]}x{original_dimensions[1]} to {new_width}x{new_height})"
+                except Exception as e:
+                    if reader is not None:
+                        # Skipping the resize would mean decoding the whole image after all.
+                        raise
+                    temp_message += f" (error during resize: {e}, skipping resize)"
+                timings['resize'] = time.perf_counter() - resize_start
+
+            with timed(timings, 'convert'):
+                img = prepare_for_webp(img)
+
+            save_options = {'format': 'WEBP'}
+            if options.get('remove_image_metadata', False):
+                 save_options['exif'] = b''
+
+            plan = None
+            encode_order = ('lossless', 'lossy')
+            if options.get('use_planner', False):
+                with timed(timings, 'plan'):
+                    plan = plan_image_encode(img, original_size, WEBP_LOSSY_FALLBACK_QUALITY)
+                if plan is not None:
+                    encode_order = plan['order']
+
+            lossy_target_mode = options.get('lossy_target_mode', 'fixed')
+            lossy_quality = WEBP_LOSSY_FALLBACK_QUALITY
+            quality_search = None
+
+            # Alternative encoders run in threads alongside the WEBP encodes below.
+            racing = race_names(options)
+            race = race_pool(racing)
+            race_futures = {}
+            if race is not None:
+                race_futures = race_encoders(race, img, racing, WEBP_LOSSY_FALLBACK_QUALITY, lambda: spool_buffer(options))
+
+            winner = None
+            winner_buffer = None
+            attempted_sizes = {}
+            lossy_error = None
+            for mode in encode_order:
+                buffer = spool_buffer(options)
+                if mode == 'lossless':
+                    temp_message += " Trying lossless WEBP..."
+                    mode_save_options = {'quality': 100, 'lossless': True}
+                elif lossy_target_mode == 'fixed':
+                    temp_message += f" Trying lossy WEBP (Q={WEBP_LOSSY_FALLBACK_QUALITY})..."
+                    mode_save_options = {'quality': WEBP_LOSSY_FALLBACK_QUALITY}
+                else:
+                    temp_message += f" Searching lossy WEBP quality (target {lossy_target_mode})..."
+
+                mode_start = time.perf_counter()
+                try:
+                    if mode == 'lossy' and lossy_target_mode != 'fixed':
+                        target_value = options.get('lossy_target_value') or DEFAULT_LOSSY_TARGETS[lossy_target_mode]
+                        if lossy_target_mode == 'size':
+                            # A budget above the original could only pick a quality that is then discarded.
+                            target_value = min(target_value * 1024, original_size - 1)
+                        quality_search = search_lossy_quality(img, lossy_target_mode, target_value, save_options,
+                                                              options.get('lossy_max_trials', DEFAULT_MAX_TRIALS))
+                        lossy_quality = quality_search['quality']
+                        buffer.write(quality_search['data'])
+                    else:
+                        img.save(buffer, **mode_save_options, **save_options)
+                    attempted_sizes[mode] = buffer.tell()
+                except Exception as e:
+                    timings[mode] = time.perf_counter() - mode_start
+                    if mode == 'lossy':
+                        lossy_error = e
+                    else:
+                        temp_message += f" Lossless save failed: {e}"
+                    buffer.close()
+                    continue
+                timings[mode] = time.perf_counter() - mode_start
+
+                if attempted_sizes[mode] < original_size:
+                    winner = mode
+                    compressed_size = attempted_sizes[mode]
+                    winner_buffer = buffer
+                    if mode == 'lossless':
+                        status = 'success'
+                        message = f"Compressed {os.path.basename(file_path)} to lossless WEBP"
+                    else:
+                        status = 'success_lossy'
+                        message = f"Compressed {os.path.basename(file_path)} to lossy WEBP (Q={lossy_quality})"
+                        if quality_search is not None:
+                            message += f" ({describe_quality_search(lossy_target_mode, quality_search)})"
+                    if resized: message += f" (resized from {original_dimensions[0]}x{original_dimensions[1]})"
+                    message += f" ({format_bytes(original_size)} -> {format_bytes(compressed_size)})"
+                    break
+
+                temp_message += f" {mode.capitalize()} size {format_bytes(attempted_sizes[mode])} >= original {format_bytes(original_size)}."
+                buffer.close()
+
+            if winner is None:
+                compressed_size = 0
+                if lossy_error is not None:
+                    status = 'fail'
+                    message = f"Error processing image {os.path.basename(file_path)}: Lossy save failed - {lossy_error}"
+                elif not encode_order:
+                    status = 'skipped_size_increase'
+                    message = f"Skipped {os.path.basename(file_path)} (Predicted lossy WEBP size ({format_bytes(plan['predicted_lossy_size'])}) is much larger than original ({format_bytes(original_size)}))."
+                else:
+                    status = 'skipped_size_increase'
+                    message = f"Skipped {os.path.basename(file_path)} (Both lossless and lossy WEBP ({format_bytes(attempted_sizes.get('lossy'))}) resulted in larger file than original ({format_bytes(original_size)}))."
+
+            encoder = 'webp' if winner else None
+            if race_futures:
+                with timed(timings, 'race'):
+                    best_size = compressed_size if winner else original_size
+                    for name, future in race_futures.items():
+                        try:
+                            buffer = future.result()
+                        except Exception as e:
+                            temp_message += f" {name} encode failed: {e}"
+                            continue
+                        attempted_sizes[name] = buffer.tell()
+                        # A lossy encoder never replaces a lossless WEBP result.
+                        if attempted_sizes[name] >= best_size or (winner == 'lossless' and not ENCODERS[name]['lossless']):
+                            buffer.close()
+                            continue
+                        if winner_buffer is not None:
+                            winner_buffer.close()
+                        winner_buffer, best_size, encoder = buffer, attempted_sizes[name], name
+
+                if encoder not in (None, 'webp'):
+                    spec = ENCODERS[encoder]
+                    compressed_size = best_size
+                    output_path = output_path.with_suffix(spec['extension'])
+                    lossy_quality = WEBP_LOSSY_FALLBACK_QUALITY
+                    status = 'success' if spec['lossless'] else 'success_lossy'
+                    message = f"Compressed {os.path.basename(file_path)} to {spec['label']}"
+                    if not spec['lossless']:
+                        message += f" (Q={lossy_quality})"
+                    if 'lossless' in attempted_sizes or 'lossy' in attempted_sizes:
+                        webp_size = min(attempted_sizes.get('lossless', float('inf')), attempted_sizes.get('lossy', float('inf')))
+                        message += f" (smaller than WEBP at {format_bytes(webp_size)})"
+                    if resized: message += f" (resized from {original_dimensions[0]}x{original_dimensions[1]})"
+                    message += f" ({format_bytes(original_size)} -> {format_bytes(compressed_size)})"
+
+            plan_report = finish_plan(plan, winner or 'skip', timings)
+
+            if status in ('success', 'success_lossy'):
+                try:
+                    with timed(timings, 'write'):
+                        write_atomic(winner_buffer, output_path)
+                    bytes_written = compressed_size
+                    final_output_path = str(output_path)
+                except Exception as e:
+                    status = 'fail'
+                    message = f"Error writing output file for {os.path.basename(file_path)}: {e}"
+                    compressed_size = 0
+            if winner_buffer is not None:
+                winner_buffer.close()
+
+            # Variants sit next to the main output, so there are none when it was not written.
+            if options.get('size_ladder') and final_output_path:
+                if encoder not in (None, 'webp'):
+                    def encode_variant(variant, buffer):
+                        ENCODERS[encoder]['encode'](variant, buffer, lossy_quality)
+                else:
+                    if winner == 'lossless':
+                        variant_save_options = dict(save_options, quality=100, lossless=True)
+                    else:
+                        variant_save_options = dict(save_options, quality=lossy_quality)
+
+                    def encode_variant(variant, buffer):
+                        variant.save(buffer, **variant_save_options)
+                try:
+                    with timed(timings, 'variants'):
+                        variants = write_size_ladder(img, output_path, options['size_ladder'], encode_variant, options)
+                    bytes_written += sum(variant['size'] for variant in variants)
+                    if variants:
+                        message += f" (+{len(variants)} sizes: {', '.join(str(v['width']) for v in variants)}px wide)"
+                except Exception as e:
+                    status = 'fail'
+                    message = f"Error writing resized variants of {os.path.basename(file_path)}: {e}"
+
+        elif file_ext in IMAGE_EXTS and not options.get('compress_images_webp', False):
+             status = 'skipped'
+             message = f"Skipped {os.path.basename(file_path)} (Image compression disabled)."
+
+
+    except FileNotFoundError:
+        status = 'fail'
+        message = f"Error: File not found {os.path.basename(file_path)}"
+        compressed_size = 0
+    except UnidentifiedImageError:
+        status = 'fail'
+        message = f"Error: Cannot identify image file {os.path.basename(file_path)}"
+        compressed_size = 0
+    except Exception as e:
+        status = 'fail'
+        message = f"An unexpected error occurred processing image {os.path.basename(file_path)}: {e}"
+        compressed_size = 0
+    finally:
+         if race is not None:
+              race.shutdown(wait=True)
+         if 'img' in locals() and img:
+              try:
+                   img.close()
+              except Exception:
+                   pass
+
+    return {
+        'original_size': original_size,
+        'compressed_size': compressed_size,
+        'status': status,
+        'message': message,
+        'file_path': file_path,
+        'output_path': final_output_path,
+        'plan': plan_report,
+        'lossy_quality': lossy_quality if status == 'success_lossy' else None,
+        'variants': variants,
+        'encoder': encoder,
+        'timings': timings,
+        'bytes_read': bytes_read,
+        'bytes_written': bytes_written,
+    }
+
+def process_image_batch(file_paths, output_folder, options):
+    # Many small images in one task, so options and results cross the process boundary once per batch.
+    return [process_image(file_path, output_folder, options) for file_path in file_paths]
+
+def process_video(file_path, output_folder, options, runner=run_ffmpeg):
+    original_size = 0
+    compressed_size = 0
+    status = 'fail'
+    message = f"Error processing video {os.path.basename(file_path)}"
+    final_output_path = None
+    video_action = None
+    output_path = None
+    temp_output_path = None
+    timings = {}
+    bytes_written = 0
+
+    try:
+        original_size = os.path.getsize(file_path)
+        file_ext = pathlib.Path(file_path).suffix.lower()
+
+        if file_ext in VIDEO_EXTS:
+
+            relative_path = pathlib.Path(file_path).relative_to(options['source_folder'])
+            output_path = pathlib.Path(output_folder) / relative_path.with_suffix('.mp4')
+
+            output_path.parent.mkdir(parents=True, exist_ok=True)
+            # ffmpeg writes to a name of its own and the result is renamed into place, so a
+            # partial or concurrent encode of the same file never shows up as the output.
+            temp_output_path = pathlib.Path(temp_path_for(output_path))
+
+            with timed(timings, 'probe'):
+                info = probe_video(file_path)
+            video_plan = {'action': 'encode', 'copy_audio': False, 'reason': "video analysis disabled"}
+            if options.get('analyze_video', True):
+                video_plan = plan_video(info, options, file_ext)
+            video_action = video_plan['action']
+
+            if video_action == 'skip':
+                status = 'skipped'
+                message = f"Skipped {os.path.basename(file_path)} ({video_plan['reason']}, re-encoding would not help)."
+            else:
+                video_threads = options.get('video_threads')
+                command = ['ffmpeg']
+                if video_threads and video_action == 'encode':
+                    command.extend(['-threads', str(video_threads)])
+                command.extend(['-i', file_path])
+                if video_action == 'encode':
+                    command.extend(VIDEO_ENCODER_ARGS)
+                    if video_threads:
+                        command.extend(['-threads', str(video_threads)])
+                else:
+                    command.extend(['-c:v', 'copy'])
+
+                audio_args = ['-c:a', 'copy'] if video_plan['copy_audio'] else AUDIO_ENCODER_ARGS
+                if options.get('remove_video_audio', False):
+                    command.extend(['-an'])
+                else:
+                    command.extend(audio_args)
+
+                if options.get('remove_video_metadata', False):
+                     command.extend(['-map_metadata', '-1'])
+
+                command.extend(['-f', 'mp4'])
+
+                command.extend([
+                    '-y',
+                    str(temp_output_path)
+                ])
+
+                duration = info['duration'] if info else None
+                with timed(timings, 'ffmpeg'):
+                    if video_action == 'encode' and should_chunk(duration, options):
+                        process = encode_chunked(file_path, temp_output_path, options, duration, threads=video_threads,
+                                                 audio_args=audio_args, runner=runner)
+                    else:
+                        process = runner(command, duration=duration)
+
+                if process.returncode == 0:
+                    if temp_output_path.exists() and os.path.getsize(temp_output_path) > 0:
+                        compressed_size = os.path.getsize(temp_output_path)
+                        bytes_written = compressed_size
+                        if compressed_size >= original_size:
+                            status = 'skipped_size_increase'
+                            message = f"Skipped {os.path.basename(file_path)} (MP4 output ({format_bytes(compressed_size)}) is not smaller than original ({format_bytes(original_size)}))."
+                            compressed_size = 0
+                        else:
+                            os.replace(temp_output_path, output_path)
+                            status = 'success'
+                            final_output_path = str(output_path)
+                            if video_action == 'remux':
+                                message = f"Remuxed {os.path.basename(file_path)} to MP4 without re-encoding"
+                            elif video_action == 'audio_transcode':
+                                message = f"Converted audio of {os.path.basename(file_path)} to AAC, video stream copied"
+                            else:
+                                message = f"Compressed {os.path.basename(file_path)} to MP4"
+                                if video_plan['copy_audio'] and not options.get('remove_video_audio', False):
+                                    message += " (audio stream copied)"
+                            message += f" ({format_bytes(original_size)} -> {format_bytes(compressed_size)})"
+                    else:
+                        status = 'fail'
+                        message = f"Error processing video {os.path.basename(file_path)}: Output file not created or is empty."
+                        if process.stderr.strip():
+                             message += f"\nffmpeg output:\n{process.stderr.strip()}"
+                else:
+                    status = 'fail'
+                    message = f"Error processing video {os.path.basename(file_path)}. ffmpeg failed with code {process.returncode}."
+                    if process.stderr.strip():
+                         message += f"\nffmpeg output:\n{process.stderr.strip()}"
+                    print(f"FFmpeg stderr for {os.path.basename(file_path)}:\n{process.stderr.strip()}")
+
+
+    except EncodeCancelled:
+        status = 'cancelled'
+        message = f"Cancelled encoding of {os.path.basename(file_path)}."
+        compressed_size = 0
+    except FileNotFoundError:
+        status = 'fail'
+        message = f"Error: ffmpeg not found. Please ensure it's installed and in your system's PATH."
+        print("Error: ffmpeg not found. Please install ffmpeg and ensure it's in your system's PATH.")
+    except Exception as e:
+        status = 'fail'
+        message = f"An unexpected error occurred processing video {os.path.basename(file_path)}: {e}"
+    finally:
+        if temp_output_path is not None and temp_output_path.exists():
+            temp_output_path.unlink()
+
+    return {
+        'original_size': original_size,
+        'compressed_size': compressed_size,
+        'status': status,
+        'message': message,
+        'file_path': file_path,
+        'output_path': final_output_path,
+        'video_action': video_action,
+        'timings': timings,
+        'bytes_read': original_size if 'ffmpeg' in timings else 0,
+        'bytes_written': bytes_written,
+    }
@@ -0,0 +1,141 @@
+import importlib.util
+import io
+
+# NumPy is imported on the first SSIM/PSNR search, so runs without quality targets do not pay for it.
+np = None
+
+QUALITY_SEARCH_MIN = 30
+QUALITY_SEARCH_MAX = 95
+DEFAULT_MAX_TRIALS = 6
+SSIM_WINDOW = 7
+# Full-size float64 arrays alive at the peak of a trial (measured): for SSIM the reference and decoded
+# planes, box means, variances and summed-area temporaries; for PSNR the RGB reference, decoded and difference.
+SSIM_PEAK_ARRAYS = 11
+PSNR_PEAK_ARRAYS = 3
+SSIM_C1 = (0.01 * 255) ** 2
+SSIM_C2 = (0.03 * 255) ** 2
+
+LOSSY_TARGET_MODES = ('fixed', 'ssim', 'psnr', 'size')
+DEFAULT_LOSSY_TARGETS = {'ssim': 0.95, 'psnr': 40.0, 'size': 200}
+
+
+def quality_metrics_available():
+    return np is not None or importlib.util.find_spec('numpy') is not None
+
+
+def _load_numpy():
+    global np
+    if np is None:
+        import numpy
+        np = numpy
+    return np
+
+
+def _to_array(img, mode):
+    _load_numpy()
+    if img.mode != mode:
+        img = img.convert(mode)
+    return np.asarray(img, dtype=np.float64)
+
+
+def psnr(reference, candidate):
+    mse = np.mean((reference - candidate) ** 2)
+    if mse == 0:
+        return float('inf')
+    return float(10 * np.log10(255.0 ** 2 / mse))
+
+
+def _box_mean(values, window):
+    # Mean over every window x window block ('valid' region) using a summed-area table.
+    table = np.pad(values.cumsum(axis=0).cumsum(axis=1), ((1, 0), (1, 0)))
+    sums = table[window:, window:] - table[:-window, window:] - table[window:, :-window] + table[:-window, :-window]
+    return sums / (window * window)
+
+
+def ssim(reference, candidate, window=SSIM_WINDOW):
+    if reference.shape[0] < window or reference.shape[1] < window:
+        window = max(1, min(reference.shape[0], reference.shape[1]))
+    mu_x = _box_mean(reference, window)
+    mu_y = _box_mean(candidate, window)
+    var_x = _box_mean(reference * reference, window) - mu_x * mu_x
+    var_y = _box_mean(candidate * candidate, window) - mu_y * mu_y
+    cov_xy = _box_mean(reference * candidate, window) - mu_x * mu_y
+
+    numerator = (2 * mu_x * mu_y + SSIM_C1) * (2 * cov_xy + SSIM_C2)
+    denominator = (mu_x * mu_x + mu_y * mu_y + SSIM_C1) * (var_x + var_y + SSIM_C2)
+    return float(np.mean(numerator / denominator))
+
+
+def search_memory(pixels, target_mode):
+    # Bytes the metric arrays of one trial need on top of the image being encoded.
+    if target_mode == 'ssim':
+        return pixels * 8 * SSIM_PEAK_ARRAYS
+    if target_mode == 'psnr':
+        return pixels * 3 * 8 * PSNR_PEAK_ARRAYS
+    return 0
+
+
+def _encode(img, quality, save_options):
+    buffer = io.BytesIO()
+    img.save(buffer, quality=quality, **save_options)
+    return buffer.getvalue()
+
+
+def _score(metric, reference, data):
+    # Imported here so the GUI can read DEFAULT_LOSSY_TARGETS without loading Pillow.
+    from PIL import Image
+    with Image.open(io.BytesIO(data)) as decoded:
+        if metric == 'ssim':
+            return ssim(reference, _to_array(decoded, 'L'))
+        return psnr(reference, _to_array(decoded, 'RGB'))
+
+
+def search_lossy_quality(img, target_mode, target_value, save_options, max_trials=DEFAULT_MAX_TRIALS):
+    # Bisection over the WEBP quality setting, encoding in memory.
+    # 'ssim'/'psnr' find the lowest quality meeting the score, 'size' the highest quality within the byte budget.
+    # When no trial meets the target, the best-scoring (or, for 'size', the smallest) trial is returned.
+    if target_mode in ('ssim', 'psnr'):
+        if not quality_metrics_available():
+            raise RuntimeError("NumPy is required for SSIM/PSNR quality targets (pip install numpy)")
+        reference = _to_array(img, 'L' if target_mode == 'ssim' else 'RGB')
+    elif target_mode != 'size':
+        raise ValueError(f"Unknown lossy target mode: {target_mode}")
+
+    lo, hi = QUALITY_SEARCH_MIN, QUALITY_SEARCH_MAX
+    best = None
+    fallback = None
+    trials = 0
+    while lo <= hi and trials < max(1, max_trials):
+        quality = (lo + hi) // 2
+        data = _encode(img, quality, save_options)
+        trials += 1
+
+        if target_mode == 'size':
+            score = None
+            meets_target = len(data) <= target_value
+            if fallback is None or len(data) < len(fallback['data']):
+                fallback = {'quality': quality, 'data': data, 'score': score}
+        else:
+            score = _score(target_mode, reference, data)
+            meets_target = score >= target_value
+            if fallback is None or score > fallback['score']:
+                fallback = {'quality': quality, 'data': data, 'score': score}
+
+        candidate = {'quality': quality, 'data': data, 'score': score}
+        if target_mode == 'size':
+            if meets_target:
+                best = candidate
+                lo = quality + 1
+            else:
+                hi = quality - 1
+        else:
+            if meets_target:
+                best = candidate
+                hi = quality - 1
+            else:
+                lo = quality + 1
+
+    chosen = best or fallback
+    chosen['trials'] = trials
+    chosen['target_met'] = best is not None
+    return chosen
@@ -0,0 +1,155 @@
+import bisect
+import csv
+import heapq
+import json
+import os
+
+# Upper bounds in seconds of the histogram buckets (1-2-5 steps from 1 ms to 500 s), plus an overflow bucket.
+HISTOGRAM_BOUNDS = tuple(step * 10.0 ** exponent for exponent in range(-3, 3) for step in (1, 2, 5))
+# Coarser buckets used for the one-line histogram in the statistics text.
+SUMMARY_BOUNDS = (0.01, 0.1, 1.0, 10.0)
+TOP_FILES = 20
+
+CSV_STAGES = ('prefetch', 'decode', 'resize', 'convert', 'plan', 'lossless', 'lossy', 'race', 'write', 'variants',
+              'write_behind', 'probe', 'ffmpeg')
+CSV_FIELDS = ('file_path', 'status', 'encoder', 'original_size', 'compressed_size', 'ratio', 'processing_time',
+              'bytes_read', 'bytes_written', 'io_wait', *(f"{stage}_time" for stage in CSV_STAGES), 'output_path')
+
+
+def format_seconds(seconds):
+    if seconds < 1:
+        return f"{seconds * 1000:.0f} ms"
+    return f"{seconds:.1f} s"
+
+
+def result_time(result):
+    return result.get('processing_time') or sum((result.get('timings') or {}).values())
+
+
+def result_ratio(result):
+    if result.get('status') not in ('success', 'success_lossy') or result.get('duplicate_of'):
+        return None
+    if not result.get('original_size'):
+        return None
+    return result.get('compressed_size', 0) / result['original_size']
+
+
+class StageHistogram:
+    # Fixed log-scale buckets, so percentiles stay cheap and memory stays constant on huge batches.
+    def __init__(self):
+        self.buckets = [0] * (len(HISTOGRAM_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.buckets[bisect.bisect_left(HISTOGRAM_BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, percent):
+        if not self.count:
+            return 0.0
+        rank = percent / 100 * self.count
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= rank and count:
+                bound = HISTOGRAM_BOUNDS[index] if index < len(HISTOGRAM_BOUNDS) else self.max
+                return min(bound, self.max)
+        return self.max
+
+    def summary_counts(self):
+        counts = [0] * (len(SUMMARY_BOUNDS) + 1)
+        for index, count in enumerate(self.buckets):
+            bound = HISTOGRAM_BOUNDS[index] if index < len(HISTOGRAM_BOUNDS) else float('inf')
+            counts[bisect.bisect_left(SUMMARY_BOUNDS, bound)] += count
+        return counts
+
+    def summary_text(self):
+        labels = [f"<{format_seconds(SUMMARY_BOUNDS[0])}"]
+        labels += [f"{format_seconds(low)}-{format_seconds(high)}" for low, high in zip(SUMMARY_BOUNDS, SUMMARY_BOUNDS[1:])]
+        labels.append(f">{format_seconds(SUMMARY_BOUNDS[-1])}")
+        return " | ".join(f"{label}: {count}" for label, count in zip(labels, self.summary_counts()))
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'total': self.total,
+            'mean': self.total / self.count if self.count else 0.0,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+            'max': self.max,
+            'buckets': [[bound, count] for bound, count in zip(HISTOGRAM_BOUNDS + (None,), self.buckets)],
+        }
+
+
+class RunReport:
+    # Streams one CSV row per file and keeps only the slowest files and worst ratios for the JSON report.
+    def __init__(self, csv_path=None, top=TOP_FILES):
+        self.top = top
+        self.slowest = []
+        self.worst_ratios = []
+        self._counter = 0
+        self._csv_file = None
+        self._csv = None
+        if csv_path:
+            self._csv_file = open(csv_path, 'w', newline='', encoding='utf-8')
+            self._csv = csv.DictWriter(self._csv_file, fieldnames=CSV_FIELDS, extrasaction='ignore')
+            self._csv.writeheader()
+
+    def _keep(self, heap, key, entry):
+        self._counter += 1
+        item = (key, self._counter, entry)
+        if len(heap) < self.top:
+            heapq.heappush(heap, item)
+        elif key > heap[0][0]:
+            heapq.heapreplace(heap, item)
+
+    def add(self, result):
+        timings = result.get('timings') or {}
+        seconds = result_time(result)
+        ratio = result_ratio(result)
+        entry = {
+            'file_path': result.get('file_path'),
+            'status': result.get('status'),
+            'encoder': result.get('encoder'),
+            'original_size': result.get('original_size', 0),
+            'compressed_size': result.get('compressed_size', 0),
+            'ratio': ratio,
+            'processing_time': seconds,
+        }
+        if timings:
+            self._keep(self.slowest, seconds, dict(entry, timings=timings))
+        if ratio is not None:
+            self._keep(self.worst_ratios, ratio, entry)
+
+        if self._csv is not None:
+            row = dict(entry, bytes_read=result.get('bytes_read', 0), bytes_written=result.get('bytes_written', 0),
+                       io_wait=result.get('io_wait', 0.0), output_path=result.get('output_path'))
+            for stage, stage_seconds in timings.items():
+                row[f"{stage}_time"] = stage_seconds
+            self._csv.writerow(row)
+
+    def as_dict(self):
+        return {
+            'slowest_files': [entry for _, _, entry in sorted(self.slowest, reverse=True)],
+            'worst_ratios': [entry for _, _, entry in sorted(self.worst_ratios, reverse=True)],
+        }
+
+    def write_json(self, path, stats):
+        report = {'summary': stats.as_dict(), **self.as_dict()}
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+    def close(self):
+        if self._csv_file is not None:
+            self._csv_file.close()
+            self._csv_file = None
+            self._csv = None
+
+
+def default_report_paths(output_folder):
+    return os.path.join(output_folder, "run_report.json"), os.path.join(output_folder, "run_report.csv")
@@ -0,0 +1,143 @@
+import os
+
+DEFAULT_MAX_VIDEO_THREADS = 8
+MIN_VIDEO_THREADS = 2
+# Share of the CPU budget the video lane may use while images are still queued or running.
+DEFAULT_VIDEO_SHARE = 0.5
+
+# Share of physical memory used as the default budget for in-flight image decodes.
+DEFAULT_MEMORY_SHARE = 0.6
+# How far below the largest queued image the scheduler looks for one that fits the memory budget.
+ADMISSION_WINDOW = 64
+
+IMAGE_LANE = 'image'
+VIDEO_LANE = 'video'
+
+
+def default_memory_budget():
+    try:
+        total = os.sysconf('SC_PHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (AttributeError, ValueError, OSError):
+        return None
+    return int(total * DEFAULT_MEMORY_SHARE)
+
+
+class LaneScheduler:
+    # Hands out image and video jobs so that image workers (image_threads each, more than one
+    # when an image runs helper threads) plus ffmpeg threads never exceed the CPU budget and the
+    # estimated memory of running images stays within the memory budget. Within each lane the
+    # largest job starts first.
+    def __init__(self, cpu_budget=None, max_video_threads=DEFAULT_MAX_VIDEO_THREADS, video_share=DEFAULT_VIDEO_SHARE,
+                 memory_budget=None, image_threads=1):
+        self.cpu_budget = max(1, cpu_budget or os.cpu_count() or 1)
+        self.image_threads = max(1, min(image_threads, self.cpu_budget))
+        self.memory_budget = memory_budget
+        self.memory_in_flight = 0
+        self.peak_memory_in_flight = 0
+        self.max_video_threads = max(1, max_video_threads)
+        self.video_share = video_share
+        self.queues = {IMAGE_LANE: [], VIDEO_LANE: []}
+        self.in_use = {IMAGE_LANE: 0, VIDEO_LANE: 0}
+        self.running = {IMAGE_LANE: 0, VIDEO_LANE: 0}
+        # Set by dispatch() when threads were free but the jobs that could use them were not ready yet.
+        self.waiting_on_io = False
+        self._sorted = True
+
+    def add(self, lane, item, cost, memory=0):
+        self.queues[lane].append((cost, memory, item))
+        self._sorted = False
+
+    def queued(self, lane=None):
+        if lane is not None:
+            return len(self.queues[lane])
+        return sum(len(queue) for queue in self.queues.values())
+
+    def _video_lane_limit(self):
+        if self.queues[IMAGE_LANE] or self.running[IMAGE_LANE]:
+            return max(1, int(self.cpu_budget * self.video_share))
+        return self.cpu_budget
+
+    def _free(self):
+        return self.cpu_budget - self.in_use[IMAGE_LANE] - self.in_use[VIDEO_LANE]
+
+    def _fits(self, memory):
+        if self.memory_budget is None or self.memory_in_flight == 0:
+            return True
+        return self.memory_in_flight + memory <= self.memory_budget
+
+    def _admit(self, memory):
+        self.memory_in_flight += memory
+        self.peak_memory_in_flight = max(self.peak_memory_in_flight, self.memory_in_flight)
+
+    def _pop_fitting(self, queue, ready=None):
+        self.waiting_on_io = False
+        for index in range(len(queue) - 1, max(-1, len(queue) - 1 - ADMISSION_WINDOW), -1):
+            if ready is not None and not ready(queue[index][2]):
+                self.waiting_on_io = True
+                continue
+            if self._fits(queue[index][1]):
+                self.waiting_on_io = False
+                return queue.pop(index)
+        return None
+
+    def _sort(self):
+        if not self._sorted:
+            for queue in self.queues.values():
+                queue.sort(key=lambda entry: entry[0])
+            self._sorted = True
+
+    def upcoming(self):
+        # Queued (lane, item, cost) in the order dispatch() would hand them out.
+        self._sort()
+        for lane in (VIDEO_LANE, IMAGE_LANE):
+            for cost, _, item in reversed(self.queues[lane]):
+                yield lane, item, cost
+
+    def dispatch(self, ready=None):
+        # ready(item), if given, holds back jobs whose input is not available yet (see iostage.Prefetcher).
+        self._sort()
+        self.waiting_on_io = False
+
+        jobs = []
+        video_queue = self.queues[VIDEO_LANE]
+        while video_queue:
+            lane_free = self._video_lane_limit() - self.in_use[VIDEO_LANE]
+            threads = min(self.max_video_threads, lane_free, self._free())
+            if threads < 1 or (threads < MIN_VIDEO_THREADS and self.running[VIDEO_LANE]):
+                break
+            entry = self._pop_fitting(video_queue, ready)
+            if entry is None:
+                break
+            _, memory, item = entry
+            self.in_use[VIDEO_LANE] += threads
+            self.running[VIDEO_LANE] += 1
+            self._admit(memory)
+            jobs.append((VIDEO_LANE, item, threads, memory))
+
+        image_queue = self.queues[IMAGE_LANE]
+        video_reserve = self._video_lane_limit() if video_queue else self.in_use[VIDEO_LANE]
+        image_limit = self.cpu_budget - video_reserve
+        threads = self.image_threads
+        # One image always gets to run when the lane is idle, even if its threads exceed what the videos leave over.
+        while image_queue and image_limit > 0 and (self.in_use[IMAGE_LANE] + threads <= image_limit or not self.in_use[IMAGE_LANE]):
+            entry = self._pop_fitting(image_queue, ready)
+            if entry is None:
+                break
+            _, memory, item = entry
+            self.in_use[IMAGE_LANE] += threads
+            self.running[IMAGE_LANE] += 1
+            self._admit(memory)
+            jobs.append((IMAGE_LANE, item, threads, memory))
+
+        return jobs
+
+    def drain(self):
+        drained = [(lane, item) for lane, queue in self.queues.items() for _, _, item in reversed(queue)]
+        for queue in self.queues.values():
+            queue.clear()
+        return drained
+
+    def release(self, lane, threads, memory=0):
+        self.in_use[lane] -= threads
+        self.running[lane] -= 1
+        self.memory_in_flight -= memory
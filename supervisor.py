@@ -0,0 +1,136 @@
+import asyncio
+import collections
+import subprocess
+import threading
+
+from video import EncodeCancelled
+
+STDERR_TAIL_LINES = 40
+TERMINATE_TIMEOUT = 5.0
+
+
+def _parse_seconds(progress):
+    for key in ('out_time_us', 'out_time_ms'):
+        # ffmpeg reports both keys in microseconds.
+        try:
+            return int(progress[key]) / 1_000_000
+        except (KeyError, ValueError):
+            continue
+    return None
+
+
+def _parse_float(value):
+    try:
+        return float(value.rstrip('x'))
+    except (AttributeError, ValueError):
+        return None
+
+
+class FFmpegSupervisor:
+    # Runs every ffmpeg process of a batch on one asyncio loop in a background thread, reading
+    # machine-readable progress from stdout and keeping only a short stderr tail per process.
+    def __init__(self, progress_callback=None):
+        self.progress_callback = progress_callback
+        self.cancelled = False
+        self._cancelled_jobs = set()
+        # process -> job
+        self._processes = {}
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="ffmpeg-supervisor", daemon=True)
+        self._thread.start()
+
+    def runner(self, job):
+        # A new run of a job that was cancelled earlier (e.g. leased again) starts clean.
+        self._cancelled_jobs.discard(job)
+
+        def run(command, duration=None):
+            return self.run(command, job=job, duration=duration)
+        return run
+
+    def _is_cancelled(self, job):
+        return self.cancelled or (job is not None and job in self._cancelled_jobs)
+
+    def run(self, command, job=None, duration=None):
+        if self._is_cancelled(job):
+            raise EncodeCancelled()
+        future = asyncio.run_coroutine_threadsafe(self._run(command, job, duration), self._loop)
+        process = future.result()
+        if self._is_cancelled(job) and process.returncode != 0:
+            raise EncodeCancelled()
+        return process
+
+    async def _run(self, command, job, duration):
+        command = [command[0], '-progress', 'pipe:1', '-nostats', *command[1:]]
+        process = await asyncio.create_subprocess_exec(
+            *command, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        )
+        self._processes[process] = job
+        stderr_tail = collections.deque(maxlen=STDERR_TAIL_LINES)
+        try:
+            await asyncio.gather(
+                self._read_progress(process.stdout, job, duration),
+                self._read_stderr(process.stderr, stderr_tail),
+            )
+            returncode = await process.wait()
+        finally:
+            self._processes.pop(process, None)
+        return subprocess.CompletedProcess(command, returncode, stdout='', stderr='\n'.join(stderr_tail))
+
+    async def _read_stderr(self, stream, stderr_tail):
+        async for line in stream:
+            stderr_tail.append(line.decode('utf-8', errors='replace').rstrip())
+
+    async def _read_progress(self, stream, job, duration):
+        progress = {}
+        async for line in stream:
+            key, _, value = line.decode('utf-8', errors='replace').strip().partition('=')
+            if not key:
+                continue
+            progress[key] = value
+            if key != 'progress':
+                continue
+
+            if self.progress_callback is not None:
+                out_time = _parse_seconds(progress)
+                fraction = None
+                if duration and out_time is not None:
+                    fraction = max(0.0, min(1.0, out_time / duration))
+                self.progress_callback({
+                    'file_path': job,
+                    'fraction': fraction,
+                    'out_time': out_time,
+                    'fps': _parse_float(progress.get('fps')),
+                    'speed': _parse_float(progress.get('speed')),
+                    'done': value == 'end',
+                })
+            progress = {}
+
+    async def _terminate(self, job=None):
+        processes = [process for process, process_job in list(self._processes.items()) if job is None or process_job == job]
+        for process in processes:
+            if process.returncode is None:
+                try:
+                    process.terminate()
+                except ProcessLookupError:
+                    pass
+        for process in processes:
+            try:
+                await asyncio.wait_for(process.wait(), TERMINATE_TIMEOUT)
+            except asyncio.TimeoutError:
+                process.kill()
+
+    def cancel(self, job):
+        # Stops the processes of one job; later runs for it raise EncodeCancelled.
+        self._cancelled_jobs.add(job)
+        asyncio.run_coroutine_threadsafe(self._terminate(job), self._loop).result()
+
+    def cancel_all(self):
+        self.cancelled = True
+        asyncio.run_coroutine_threadsafe(self._terminate(), self._loop).result()
+
+    def shutdown(self):
+        if self._processes:
+            self.cancel_all()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
@@ -0,0 +1,44 @@
+import os
+import random
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from PIL import Image, ImageDraw, ImageFilter
+
+
+def photo_image(size, seed=0):
+    # Noisy, smoothly varying RGB content that WEBP lossless cannot shrink, like a photograph.
+    rng = random.Random(seed)
+    width, height = max(1, size[0] // 4), max(1, size[1] // 4)
+    red = Image.frombytes('L', (width, height), rng.randbytes(width * height)).resize(size, Image.Resampling.BICUBIC)
+    green = Image.linear_gradient('L').rotate(rng.randrange(360)).resize(size)
+    blue = red.filter(ImageFilter.GaussianBlur(2))
+    return Image.merge('RGB', (red, green, blue))
+
+
+def flat_image(size, seed=0):
+    # A few flat rectangles on a plain background, like a screenshot.
+    rng = random.Random(seed)
+    img = Image.new('RGB', size, (240, 240, 240))
+    draw = ImageDraw.Draw(img)
+    for _ in range(8):
+        x, y = rng.randrange(size[0]), rng.randrange(size[1])
+        draw.rectangle((x, y, x + size[0] // 4, y + size[1] // 8), fill=(rng.randrange(256), 0, 128))
+    return img
+
+
+def save(img, folder, name, **save_options):
+    path = os.path.join(folder, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    img.save(path, **save_options)
+    return path
+
+
+def run_folder(source, output, executor, **options):
+    # One batch over source; results keyed by the path relative to source.
+    from engine import run_batch
+    results = run_batch(source, options, output, max_workers=1, executor=executor)
+    return {os.path.relpath(result['file_path'], source): result for result in results}
@@ -0,0 +1,58 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from support import photo_image, save
+
+import processing
+from engine import build_options
+from PIL import Image, ImageChops
+
+
+class BandedResizeTest(unittest.TestCase):
+    def setUp(self):
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        self.folder = folder.name
+        self.img = photo_image((300, 233))
+        # Bands of a few dozen rows, so every output is stitched from several of them.
+        patcher = mock.patch.object(processing, 'BAND_MAX_BYTES', 300 * 3 * 40)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def assert_matches_whole(self, name, size, **save_options):
+        path = save(self.img, self.folder, name, **save_options)
+        with Image.open(path) as img:
+            reader = processing.band_reader(img)
+            self.assertIsNotNone(reader)
+            banded = processing.downscale_banded(reader, size, fast=False)
+            whole = img.resize(size, Image.Resampling.LANCZOS)
+        self.assertEqual(banded.size, size)
+        # Band offsets shift the filter weights in the last bit, which can round a channel by one.
+        self.assertLessEqual(max(high for _, high in ImageChops.difference(banded, whole).getextrema()), 1)
+
+    def test_tiff_strips(self):
+        self.assert_matches_whole('strips.tif', (120, 93))
+
+    def test_packbits_tiff(self):
+        self.assert_matches_whole('packbits.tif', (97, 75), compression='packbits')
+
+    def test_bottom_up_bmp(self):
+        self.assert_matches_whole('raster.bmp', (150, 116))
+        self.assert_matches_whole('raster.bmp', (120, 93))
+
+    def test_process_image_uses_bands_for_large_images(self):
+        path = save(self.img, self.folder, 'source/large.tif')
+        options = build_options(os.path.dirname(path), enable_resize=True, resize_percentage=60.0, resize_threshold=100)
+        with mock.patch.object(processing, 'BANDED_MIN_PIXELS', 0), \
+                mock.patch.object(processing, 'downscale_banded', wraps=processing.downscale_banded) as banded:
+            result = processing.process_image(path, os.path.join(self.folder, 'out'), options)
+        self.assertTrue(banded.called)
+        self.assertIn(result['status'], ('success', 'success_lossy'))
+        with Image.open(result['output_path']) as output:
+            self.assertEqual(output.size, (120, 93))
+
+
+if __name__ == '__main__':
+    unittest.main()
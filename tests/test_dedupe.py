@@ -0,0 +1,64 @@
+import concurrent.futures
+import os
+import shutil
+import tempfile
+import unittest
+
+from support import photo_image, run_folder, save
+
+
+def read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+class DuplicateLinkingTest(unittest.TestCase):
+    def setUp(self):
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        self.source = os.path.join(folder.name, 'source')
+        self.output = os.path.join(folder.name, 'out')
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(self.executor.shutdown)
+
+    def copy(self, name, copy_name):
+        target = os.path.join(self.source, copy_name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.copyfile(os.path.join(self.source, name), target)
+
+    def test_duplicates_share_output_and_variants(self):
+        save(photo_image((200, 150)), self.source, 'a.jpg', quality=90)
+        self.copy('a.jpg', os.path.join('copies', 'b.jpg'))
+        # Same size, different bytes: not a duplicate.
+        save(photo_image((200, 150), seed=1), self.source, 'c.jpg', quality=90)
+        results = run_folder(self.source, self.output, self.executor, size_ladder=[100])
+
+        duplicates = [result for result in results.values() if result.get('duplicate_of')]
+        self.assertEqual(len(duplicates), 1)
+        duplicate = duplicates[0]
+        primary = results[os.path.relpath(duplicate['duplicate_of'], self.source)]
+        self.assertNotEqual(os.path.basename(duplicate['file_path']), 'c.jpg')
+        self.assertEqual(duplicate['status'], primary['status'])
+        self.assertEqual(read(duplicate['output_path']), read(primary['output_path']))
+        self.assertEqual(len(duplicate['variants']), 1)
+        variant = duplicate['variants'][0]
+        stem = os.path.splitext(os.path.basename(duplicate['file_path']))[0]
+        self.assertEqual(os.path.basename(variant['output_path']), stem + '-100w.webp')
+        self.assertEqual(read(variant['output_path']), read(primary['variants'][0]['output_path']))
+
+    def test_duplicate_of_skipped_file_has_no_output(self):
+        save(photo_image((200, 150)), self.source, 'a.jpg', quality=5)
+        self.copy('a.jpg', 'b.jpg')
+        results = run_folder(self.source, self.output, self.executor)
+        self.assertEqual({result['status'] for result in results.values()}, {'skipped_size_increase'})
+        self.assertEqual([result['output_path'] for result in results.values()], [None, None])
+
+    def test_disabled(self):
+        save(photo_image((200, 150)), self.source, 'a.jpg', quality=90)
+        self.copy('a.jpg', 'b.jpg')
+        results = run_folder(self.source, self.output, self.executor, deduplicate=False)
+        self.assertFalse(any(result.get('duplicate_of') for result in results.values()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import io
+import os
+import tempfile
+import unittest
+
+from support import flat_image, photo_image, save
+
+from encoders import ENCODERS, race_encoders, race_names, race_pool
+from engine import build_options
+from processing import WEBP_LOSSY_FALLBACK_QUALITY, process_image
+
+
+def encoded_size(name, img):
+    buffer = io.BytesIO()
+    ENCODERS[name]['encode'](img, buffer, WEBP_LOSSY_FALLBACK_QUALITY)
+    return buffer.tell()
+
+
+class RaceTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.addCleanup(self.folder.cleanup)
+
+    def run_race(self, img, name, quality=90, **overrides):
+        path = save(img, self.folder.name, 'source/' + name, quality=quality)
+        options = build_options(os.path.dirname(path), **overrides)
+        return process_image(path, os.path.join(self.folder.name, 'out'), options)
+
+    def test_race_ignores_concurrent_webp_settings(self):
+        img = photo_image((200, 150))
+        pool = race_pool(['jpeg'])
+        self.addCleanup(pool.shutdown)
+        futures = race_encoders(pool, img, ['jpeg'], WEBP_LOSSY_FALLBACK_QUALITY, io.BytesIO)
+        img.save(io.BytesIO(), format='WEBP', lossless=True, quality=100)
+        self.assertEqual(futures['jpeg'].result().tell(), encoded_size('jpeg', img))
+
+    def test_smallest_candidate_wins(self):
+        img = photo_image((200, 150))
+        result = self.run_race(img, 'photo.jpg', output_formats=['jpeg'])
+        self.assertEqual(result['status'], 'success_lossy')
+        self.assertLessEqual(result['compressed_size'], encoded_size('jpeg', img))
+        extension = '.webp' if result['encoder'] == 'webp' else ENCODERS[result['encoder']]['extension']
+        self.assertTrue(result['output_path'].endswith(extension))
+        self.assertEqual(os.path.getsize(result['output_path']), result['compressed_size'])
+
+    def test_lossy_encoder_never_replaces_lossless_webp(self):
+        result = self.run_race(flat_image((200, 150)), 'screen.png', output_formats=['png', 'jpeg'])
+        self.assertEqual(result['status'], 'success')
+        self.assertIn(result['encoder'], ('webp', 'png'))
+
+    def test_target_mode_races_lossless_encoders_only(self):
+        options = build_options('.', output_formats=['png', 'jpeg'], lossy_target_mode='ssim')
+        self.assertEqual(race_names(options), ['png'])
+        # At this target the WEBP is larger than a Q85 JPEG, which must not win.
+        result = self.run_race(photo_image((200, 150)), 'photo.jpg', quality=97, output_formats=['jpeg'],
+                               lossy_target_mode='ssim', lossy_target_value=0.995)
+        self.assertEqual(result['status'], 'success_lossy')
+        self.assertEqual(result['encoder'], 'webp')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import os
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from engine import _upcoming_files
+from iostage import Prefetcher
+from scheduler import IMAGE_LANE, VIDEO_LANE, LaneScheduler
+
+GB = 1024 ** 3
+
+
+class PrefetchLaneTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.addCleanup(self.folder.cleanup)
+
+    def make_file(self, name):
+        path = os.path.join(self.folder.name, name)
+        with open(path, 'wb') as f:
+            f.write(b'\0' * 1024)
+        return path
+
+    def test_video_backlog_does_not_starve_images(self):
+        scheduler = LaneScheduler(cpu_budget=4)
+        # Queued videos far larger than the whole prefetch window come first in dispatch order.
+        videos = [self.make_file(f'video{i}.mp4') for i in range(8)]
+        for video in videos:
+            scheduler.add(VIDEO_LANE, video, 5 * GB)
+        images = [self.make_file(f'image{i}.jpg') for i in range(4)]
+        for image in images:
+            scheduler.add(IMAGE_LANE, image, 2 * 1024 * 1024)
+
+        prefetcher = Prefetcher(self.folder.name, readers=2, max_bytes=GB)
+        try:
+            prefetcher.fill(_upcoming_files(scheduler))
+            prefetcher._pool.shutdown(wait=True)
+            self.assertTrue(prefetcher.ready(images))
+            # Only the first video of the backlog is read ahead.
+            self.assertEqual(len([video for video in videos if video in prefetcher._entries]), 1)
+        finally:
+            prefetcher.close()
+
+    def test_single_lane_uses_the_whole_window(self):
+        scheduler = LaneScheduler(cpu_budget=4)
+        images = [self.make_file(f'image{i}.jpg') for i in range(4)]
+        for image in images:
+            scheduler.add(IMAGE_LANE, image, 300 * 1024 * 1024)
+
+        prefetcher = Prefetcher(self.folder.name, readers=2, max_bytes=GB)
+        try:
+            prefetcher.fill(_upcoming_files(scheduler))
+            self.assertEqual(len(prefetcher._entries), 3)
+        finally:
+            prefetcher.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
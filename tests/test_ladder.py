@@ -0,0 +1,57 @@
+import concurrent.futures
+import os
+import tempfile
+import unittest
+
+from support import photo_image, save
+
+from engine import run_batch
+
+
+class SizeLadderTest(unittest.TestCase):
+    def setUp(self):
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        self.source = os.path.join(folder.name, 'source')
+        self.output = os.path.join(folder.name, 'out')
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(self.executor.shutdown)
+
+    def run_once(self, **options):
+        options.setdefault('size_ladder', [100, 50])
+        results = list(run_batch(self.source, options, self.output, max_workers=1, executor=self.executor))
+        return {os.path.basename(result['file_path']): result for result in results}
+
+    def test_variants_are_written_and_tracked(self):
+        save(photo_image((200, 150)), self.source, 'photo.jpg', quality=90)
+        result = self.run_once()['photo.jpg']
+        self.assertEqual(result['status'], 'success_lossy')
+        self.assertEqual([(v['width'], v['height']) for v in result['variants']], [(100, 75), (50, 38)])
+        for variant in result['variants']:
+            self.assertTrue(variant['output_path'].endswith(f"photo-{variant['width']}w.webp"))
+            self.assertEqual(os.path.getsize(variant['output_path']), variant['size'])
+
+        self.assertEqual(self.run_once()['photo.jpg']['status'], 'unchanged')
+        # A missing variant means the file is processed again.
+        os.remove(result['variants'][1]['output_path'])
+        self.assertEqual(self.run_once()['photo.jpg']['status'], 'success_lossy')
+        self.assertTrue(os.path.exists(result['variants'][1]['output_path']))
+
+    def test_pruning_removes_variants(self):
+        path = save(photo_image((200, 150)), self.source, 'photo.jpg', quality=90)
+        save(photo_image((200, 150), seed=1), self.source, 'other.jpg', quality=90)
+        variants = self.run_once()['photo.jpg']['variants']
+        os.remove(path)
+        self.run_once(prune_deleted=True)
+        self.assertFalse(any(os.path.exists(variant['output_path']) for variant in variants))
+
+    def test_no_variants_without_main_output(self):
+        save(photo_image((200, 150)), self.source, 'small.jpg', quality=5)
+        result = self.run_once()['small.jpg']
+        self.assertEqual(result['status'], 'skipped_size_increase')
+        self.assertFalse(result['variants'])
+        self.assertEqual([name for name in os.listdir(self.output) if name.endswith('.webp')], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import concurrent.futures
+import os
+import tempfile
+import unittest
+
+from support import flat_image, photo_image, run_folder, save
+
+from manifest import MANIFEST_FILENAME
+
+
+class IncrementalRunTest(unittest.TestCase):
+    def setUp(self):
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        self.source = os.path.join(folder.name, 'source')
+        self.output = os.path.join(folder.name, 'out')
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(self.executor.shutdown)
+        save(photo_image((120, 90)), self.source, 'photo.jpg', quality=90)
+        save(flat_image((120, 90)), self.source, 'sub/screen.png')
+
+    def statuses(self, **options):
+        return {name: result['status'] for name, result in run_folder(self.source, self.output, self.executor, **options).items()}
+
+    def test_unchanged_files_are_skipped(self):
+        first = self.statuses()
+        self.assertEqual(first, {'photo.jpg': 'success_lossy', os.path.join('sub', 'screen.png'): 'success'})
+        self.assertTrue(os.path.exists(os.path.join(self.output, MANIFEST_FILENAME)))
+        self.assertEqual(set(self.statuses().values()), {'unchanged'})
+
+    def test_changes_invalidate_entries(self):
+        self.statuses()
+        # A rewritten source, a deleted output and a changed output option each mean reprocessing.
+        save(photo_image((120, 90), seed=1), self.source, 'photo.jpg', quality=90)
+        os.remove(os.path.join(self.output, 'sub', 'screen.webp'))
+        self.assertEqual(set(self.statuses().values()), {'success', 'success_lossy'})
+        self.assertEqual(set(self.statuses().values()), {'unchanged'})
+        self.assertEqual(set(self.statuses(remove_image_metadata=True).values()), {'success', 'success_lossy'})
+
+    def test_non_output_options_keep_entries(self):
+        self.statuses()
+        self.assertEqual(set(self.statuses(deduplicate=False, io_writers=3).values()), {'unchanged'})
+
+    def test_incremental_off_reprocesses(self):
+        self.statuses()
+        self.assertNotIn('unchanged', self.statuses(incremental=False).values())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import io
+import os
+import tempfile
+import unittest
+
+from support import photo_image, save
+
+from engine import build_options
+from processing import process_image
+from quality import QUALITY_SEARCH_MIN, quality_metrics_available, search_lossy_quality, ssim, _to_array
+
+from PIL import Image
+
+WEBP = {'format': 'WEBP'}
+
+
+class SearchLossyQualityTest(unittest.TestCase):
+    def test_size_target_fits_budget(self):
+        img = photo_image((160, 120))
+        result = search_lossy_quality(img, 'size', 4000, WEBP)
+        self.assertTrue(result['target_met'])
+        self.assertLessEqual(len(result['data']), 4000)
+
+    def test_unreachable_size_returns_smallest_trial(self):
+        img = photo_image((160, 120))
+        result = search_lossy_quality(img, 'size', 10, WEBP)
+        self.assertFalse(result['target_met'])
+        self.assertEqual(result['quality'], QUALITY_SEARCH_MIN)
+
+    @unittest.skipUnless(quality_metrics_available(), "needs numpy")
+    def test_ssim_target_is_met(self):
+        img = photo_image((160, 120))
+        result = search_lossy_quality(img, 'ssim', 0.9, WEBP)
+        self.assertTrue(result['target_met'])
+        decoded = Image.open(io.BytesIO(result['data']))
+        self.assertGreaterEqual(ssim(_to_array(img, 'L'), _to_array(decoded, 'L')), 0.9)
+
+
+class TargetSizeImageTest(unittest.TestCase):
+    def test_budget_above_original_still_compresses(self):
+        # A 20 KB budget for a ~3 KB thumbnail must not pick a quality larger than the original.
+        with tempfile.TemporaryDirectory() as folder:
+            path = save(photo_image((96, 96)), folder, 'source/thumb.jpg', quality=80)
+            options = build_options(os.path.dirname(path), lossy_target_mode='size', lossy_target_value=20)
+            result = process_image(path, os.path.join(folder, 'out'), options)
+            self.assertEqual(result['status'], 'success_lossy')
+            self.assertLess(result['compressed_size'], os.path.getsize(path))
+
+
+if __name__ == '__main__':
+    unittest.main()
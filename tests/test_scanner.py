@@ -0,0 +1,20 @@
+import os
+import tempfile
+import unittest
+
+from support import flat_image, save
+
+from engine import FileScanner
+
+
+class FileScannerTest(unittest.TestCase):
+    def test_skips_output_folder_but_not_siblings(self):
+        with tempfile.TemporaryDirectory() as folder:
+            for name in ('a.png', 'out/b.png', 'out2/c.png'):
+                save(flat_image((32, 32)), folder, name)
+            files = FileScanner(folder, os.path.join(folder, 'out'))
+            self.assertEqual(sorted(os.path.relpath(path, folder) for path in files), ['a.png', os.path.join('out2', 'c.png')])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,207 @@
+import os
+import json
+import math
+import pathlib
+import shutil
+import subprocess
+import tempfile
+import concurrent.futures
+
+VIDEO_ENCODER_ARGS = ['-c:v', 'libx264', '-crf', '23', '-preset', 'medium']
+AUDIO_ENCODER_ARGS = ['-c:a', 'aac', '-b:a', '128k']
+
+CHUNK_MIN_DURATION = 300.0
+CHUNK_THREADS = 2
+
+
+# Bits per pixel per frame below which an H.264 stream is not worth re-encoding at CRF 23.
+EFFICIENT_H264_BPP = 0.1
+COPYABLE_PIX_FMTS = {'yuv420p', 'yuvj420p'}
+COPYABLE_AUDIO_CODECS = {'aac', 'mp3'}
+AUDIO_COPY_MAX_BITRATE = 192000
+
+VIDEO_ACTIONS = ('skip', 'remux', 'audio_transcode', 'encode')
+
+
+class EncodeCancelled(Exception):
+    pass
+
+
+def run_ffmpeg(command, duration=None):
+    return subprocess.run(command, capture_output=True, text=True)
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _frame_rate(value):
+    try:
+        numerator, denominator = value.split('/')
+        return float(numerator) / float(denominator) if float(denominator) else None
+    except (AttributeError, ValueError):
+        return _to_float(value)
+
+
+def probe_video(file_path):
+    command = ['ffprobe', '-v', 'error', '-show_format', '-show_streams', '-of', 'json', str(file_path)]
+    try:
+        process = subprocess.run(command, capture_output=True, text=True)
+    except FileNotFoundError:
+        return None
+    if process.returncode != 0:
+        return None
+    try:
+        data = json.loads(process.stdout)
+    except ValueError:
+        return None
+
+    streams = data.get('streams', [])
+    video = next((s for s in streams if s.get('codec_type') == 'video'
+                  and not s.get('disposition', {}).get('attached_pic')), None)
+    audio = next((s for s in streams if s.get('codec_type') == 'audio'), None)
+    fmt = data.get('format', {})
+
+    info = {
+        'duration': _to_float(fmt.get('duration')),
+        'bit_rate': _to_float(fmt.get('bit_rate')),
+        'video': None,
+        'audio': None,
+    }
+    if audio is not None:
+        info['audio'] = {
+            'codec': audio.get('codec_name'),
+            'bit_rate': _to_float(audio.get('bit_rate')),
+        }
+    if video is not None:
+        video_bit_rate = _to_float(video.get('bit_rate'))
+        if video_bit_rate is None and info['bit_rate'] is not None:
+            video_bit_rate = info['bit_rate'] - ((info['audio'] or {}).get('bit_rate') or 0)
+        width, height = video.get('width'), video.get('height')
+        fps = _frame_rate(video.get('avg_frame_rate')) or _frame_rate(video.get('r_frame_rate'))
+        bpp = None
+        if video_bit_rate and width and height and fps:
+            bpp = video_bit_rate / (width * height * fps)
+        info['video'] = {
+            'codec': video.get('codec_name'),
+            'pix_fmt': video.get('pix_fmt'),
+            'width': width,
+            'height': height,
+            'fps': fps,
+            'bit_rate': video_bit_rate,
+            'bpp': bpp,
+        }
+    return info
+
+
+def probe_duration(file_path):
+    info = probe_video(file_path)
+    return info['duration'] if info else None
+
+
+def plan_video(info, options, file_ext):
+    if info is None or info['video'] is None:
+        return {'action': 'encode', 'copy_audio': False, 'reason': "could not analyze video"}
+
+    video = info['video']
+    audio = info['audio']
+    remove_audio = options.get('remove_video_audio', False)
+
+    video_reusable = (video['codec'] == 'h264' and video['pix_fmt'] in COPYABLE_PIX_FMTS
+                      and video['bpp'] is not None and video['bpp'] <= EFFICIENT_H264_BPP)
+    audio_reusable = (audio is None or remove_audio or (audio['codec'] in COPYABLE_AUDIO_CODECS
+                      and (audio['bit_rate'] or 0) <= AUDIO_COPY_MAX_BITRATE))
+
+    if not video_reusable:
+        copy_audio = audio is not None and not remove_audio and audio_reusable
+        return {'action': 'encode', 'copy_audio': copy_audio, 'reason': f"{video['codec']} video needs re-encoding"}
+    if not audio_reusable:
+        return {'action': 'audio_transcode', 'copy_audio': False, 'reason': f"efficient H.264 with {audio['codec']} audio"}
+
+    needs_rewrite = (file_ext != '.mp4' or options.get('remove_video_metadata', False)
+                     or (remove_audio and audio is not None))
+    if needs_rewrite:
+        return {'action': 'remux', 'copy_audio': True, 'reason': "efficient H.264 in another container or with options to apply"}
+    return {'action': 'skip', 'copy_audio': True, 'reason': "already efficient H.264 MP4"}
+
+
+def should_chunk(duration, options):
+    return (options.get('chunked_video', False) and duration is not None
+            and duration >= options.get('chunk_min_duration', CHUNK_MIN_DURATION))
+
+
+def _failed(command, process, stage):
+    return subprocess.CompletedProcess(command, process.returncode, stdout='', stderr=f"[{stage}] {process.stderr}")
+
+
+def _encode_segment(segment_path, encoded_path, threads, runner):
+    command = [
+        'ffmpeg', '-v', 'error', '-threads', str(threads), '-i', segment_path,
+        *VIDEO_ENCODER_ARGS, '-threads', str(threads), '-an', '-y', encoded_path,
+    ]
+    return runner(command)
+
+
+def encode_chunked(file_path, output_path, options, duration, threads=None, segments=None, audio_args=None, runner=run_ffmpeg):
+    # Split the video stream at keyframes (stream copy), encode the pieces concurrently with the
+    # regular x264 settings, then concatenate them without re-encoding and add the audio back.
+    threads = threads or os.cpu_count() or 1
+    parallel = max(1, threads // CHUNK_THREADS)
+    segments = segments or options.get('video_segments') or max(2, parallel)
+    segment_time = max(1, math.ceil(duration / segments))
+
+    work_dir = tempfile.mkdtemp(prefix=f".{pathlib.Path(output_path).stem}_chunks_", dir=os.path.dirname(str(output_path)))
+    try:
+        split_command = [
+            'ffmpeg', '-v', 'error', '-i', str(file_path), '-map', '0:v:0', '-c', 'copy',
+            '-f', 'segment', '-segment_time', str(segment_time), '-reset_timestamps', '1',
+            '-y', os.path.join(work_dir, 'source_%05d.mkv'),
+        ]
+        process = runner(split_command)
+        if process.returncode != 0:
+            return _failed(split_command, process, 'split')
+
+        sources = sorted(name for name in os.listdir(work_dir) if name.startswith('source_'))
+        if not sources:
+            return subprocess.CompletedProcess(split_command, 1, stdout='', stderr="[split] No video segments were produced.")
+        encoded = [os.path.join(work_dir, name.replace('source_', 'encoded_').replace('.mkv', '.mp4')) for name in sources]
+        segment_threads = max(1, threads // min(parallel, len(sources)))
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(parallel, len(sources))) as pool:
+            futures = [
+                pool.submit(_encode_segment, os.path.join(work_dir, source), target, segment_threads, runner)
+                for source, target in zip(sources, encoded)
+            ]
+            for future in futures:
+                process = future.result()
+                if process.returncode != 0:
+                    for other in futures:
+                        other.cancel()
+                    return _failed(process.args, process, 'encode segment')
+
+        list_path = os.path.join(work_dir, 'segments.txt')
+        with open(list_path, 'w', encoding='utf-8') as f:
+            for path in encoded:
+                escaped = path.replace("'", "'\\''")
+                f.write(f"file '{escaped}'\n")
+
+        concat_command = [
+            'ffmpeg', '-v', 'error', '-f', 'concat', '-safe', '0', '-i', list_path, '-i', str(file_path),
+            '-map', '0:v:0', '-c:v', 'copy',
+        ]
+        if options.get('remove_video_audio', False):
+            concat_command.append('-an')
+        else:
+            concat_command.extend(['-map', '1:a:0?', *(audio_args or AUDIO_ENCODER_ARGS)])
+        concat_command.extend(['-map_metadata', '-1' if options.get('remove_video_metadata', False) else '1'])
+        concat_command.extend(['-f', 'mp4', '-y', str(output_path)])
+
+        process = runner(concat_command)
+        if process.returncode != 0:
+            return _failed(concat_command, process, 'concat')
+        return process
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
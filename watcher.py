@@ -0,0 +1,293 @@
+import collections
+import ctypes
+import ctypes.util
+import os
+import pathlib
+import select
+import struct
+import sys
+import time
+
+from engine import default_output_folder, is_within
+from processing import IMAGE_EXTS, VIDEO_EXTS
+
+# A file is handed to the workers once its size and modification time have not changed for this long.
+DEFAULT_SETTLE_SECONDS = 2.0
+DEFAULT_POLL_INTERVAL = 2.0
+# How often files that are still settling are re-checked.
+SETTLE_CHECK_INTERVAL = 0.2
+# Signatures of handed-out files kept to ignore events that did not change them; the oldest are
+# forgotten beyond this (such a file is at worst handed out again and found unchanged by the manifest).
+EMITTED_MAX_FILES = 200000
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+              | IN_DELETE_SELF | IN_MOVE_SELF)
+EVENT_HEADER = struct.Struct('iIII')
+EVENT_BUFFER_SIZE = 64 * 1024
+
+
+def _supported(path):
+    file_ext = pathlib.Path(path).suffix.lower()
+    return file_ext in IMAGE_EXTS or file_ext in VIDEO_EXTS
+
+
+class Inotify:
+    # Minimal non-blocking inotify binding through ctypes; raises OSError where inotify is not available.
+    def __init__(self):
+        if not sys.platform.startswith('linux'):
+            raise OSError("inotify is only available on Linux")
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        self.folders = {}
+
+    def add_watch(self, folder):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(folder), WATCH_MASK)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), folder)
+        self.folders[wd] = folder
+
+    def read_events(self, timeout=0):
+        # Returns (path, mask) pairs; path is None for a queue overflow.
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return []
+        try:
+            data = os.read(self.fd, EVENT_BUFFER_SIZE)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                events.append((None, mask))
+                continue
+            folder = self.folders.get(wd)
+            if mask & IN_IGNORED:
+                self.folders.pop(wd, None)
+                continue
+            if folder is None:
+                continue
+            events.append((os.path.join(folder, os.fsdecode(name)) if name else folder, mask))
+        return events
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class FolderWatcher:
+    # Iterates over files as they appear under source_folder and have stopped changing. It never
+    # blocks: when no file is ready it yields None, so process_files keeps collecting results and
+    # asks again shortly. Iteration ends when stop_event is set. count and settling can be read
+    # from other threads for progress, like FileScanner.count.
+    def __init__(self, source_folder, output_folder=None, settle_seconds=DEFAULT_SETTLE_SECONDS,
+                 poll_interval=DEFAULT_POLL_INTERVAL, use_inotify=True, stop_event=None):
+        if output_folder is None:
+            output_folder = default_output_folder(source_folder)
+        self.source_folder = source_folder
+        self.output_folder = output_folder
+        self.settle_seconds = settle_seconds
+        self.poll_interval = poll_interval
+        self.stop_event = stop_event
+        self.count = 0
+        self.settling = 0
+        self.done = False
+        self.backend = 'polling'
+        self._inotify = None
+        if use_inotify:
+            try:
+                self._inotify = Inotify()
+                self.backend = 'inotify'
+            except OSError:
+                self._inotify = None
+        self._candidates = {}
+        self._ready = collections.deque()
+        self._emitted = collections.OrderedDict()
+        self._folders = {}
+        self._next_poll = 0.0
+        self._next_check = 0.0
+
+    def _excluded(self, folder):
+        return is_within(folder, self.output_folder)
+
+    def _note(self, path, now):
+        if not _supported(path):
+            return
+        try:
+            st = os.stat(path)
+        except OSError:
+            self._forget(path)
+            return
+        signature = (st.st_size, st.st_mtime_ns)
+        if self._emitted.get(path) == signature:
+            return
+        previous = self._candidates.get(path)
+        if previous is None or previous[0] != signature:
+            # Files last modified long ago (e.g. present at startup) are ready on the next check.
+            changed = min(now, time.monotonic() - (time.time() - st.st_mtime))
+            self._candidates[path] = (signature, changed)
+
+    def _forget(self, path):
+        self._candidates.pop(path, None)
+        self._emitted.pop(path, None)
+
+    def _remember(self, path, signature):
+        self._emitted[path] = signature
+        self._emitted.move_to_end(path)
+        while len(self._emitted) > EMITTED_MAX_FILES:
+            self._emitted.popitem(last=False)
+
+    def _scan_folder(self, folder, now):
+        # Lists one folder (polling, or a folder that just appeared) and returns its subfolders
+        # and supported files.
+        subfolders = []
+        files = []
+        try:
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if not self._excluded(entry.path):
+                                subfolders.append(entry.path)
+                        elif entry.is_file() and _supported(entry.path):
+                            files.append(entry.path)
+                            self._note(entry.path, now)
+                    except OSError:
+                        continue
+        except OSError:
+            pass
+        return subfolders, files
+
+    def _watch_tree(self, folder, now):
+        folders = [folder]
+        while folders:
+            folder = folders.pop()
+            try:
+                self._inotify.add_watch(folder)
+            except OSError:
+                continue
+            # Files created before the watch was in place would otherwise be missed.
+            folders.extend(self._scan_folder(folder, now)[0])
+
+    def _poll(self, now):
+        # Only folders whose modification time changed are listed again; the others reuse their
+        # remembered subfolders and files. Known files are still stat'ed, since rewriting a file in
+        # place does not change its folder's modification time.
+        folders = [self.source_folder]
+        seen = set()
+        seen_files = set()
+        while folders:
+            folder = folders.pop()
+            seen.add(folder)
+            try:
+                mtime_ns = os.stat(folder).st_mtime_ns
+            except OSError:
+                continue
+            known = self._folders.get(folder)
+            if known is not None and known[0] == mtime_ns:
+                subfolders, files = known[1], known[2]
+                for path in files:
+                    self._note(path, now)
+            else:
+                subfolders, files = self._scan_folder(folder, now)
+                self._folders[folder] = (mtime_ns, subfolders, files)
+            folders.extend(subfolders)
+            seen_files.update(files)
+        for folder in set(self._folders) - seen:
+            del self._folders[folder]
+        # The listing covers the whole tree, so files no longer in it are forgotten.
+        for path in set(self._emitted) - seen_files:
+            del self._emitted[path]
+
+    def _read_events(self, now):
+        for path, mask in self._inotify.read_events():
+            if path is None:
+                # Events were dropped; fall back to one full listing of the tree.
+                self._folders = {}
+                self._poll(now)
+                continue
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO) and not self._excluded(path):
+                    self._watch_tree(path, now)
+                continue
+            if mask & (IN_DELETE | IN_MOVED_FROM):
+                self._forget(path)
+                continue
+            if mask & (IN_DELETE_SELF | IN_MOVE_SELF) or path in self._candidates:
+                # Settling files are re-checked on a timer rather than on every write.
+                continue
+            self._note(path, now)
+
+    def _check_candidates(self, now):
+        for path, (signature, changed) in list(self._candidates.items()):
+            try:
+                st = os.stat(path)
+            except OSError:
+                del self._candidates[path]
+                continue
+            current = (st.st_size, st.st_mtime_ns)
+            if current != signature:
+                self._candidates[path] = (current, now)
+            elif now - changed >= self.settle_seconds:
+                del self._candidates[path]
+                self._remember(path, signature)
+                self._ready.append(path)
+        self.settling = len(self._candidates)
+
+    def _update(self):
+        now = time.monotonic()
+        if self._inotify is not None:
+            self._read_events(now)
+        elif now >= self._next_poll:
+            self._poll(now)
+            self._next_poll = now + self.poll_interval
+        if now >= self._next_check:
+            self._check_candidates(now)
+            self._next_check = now + SETTLE_CHECK_INTERVAL
+
+    def __iter__(self):
+        try:
+            now = time.monotonic()
+            if self._inotify is not None:
+                self._watch_tree(self.source_folder, now)
+            else:
+                self._poll(now)
+                self._next_poll = now + self.poll_interval
+            while self.stop_event is None or not self.stop_event.is_set():
+                if not self._ready:
+                    self._update()
+                if not self._ready:
+                    yield None
+                    continue
+                self.count += 1
+                yield self._ready.popleft()
+        finally:
+            self.done = True
+            self.close()
+
+    def close(self):
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None